@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import pickle
+import pandas as pd
+from pylorenzmie.fitting import Optimizer
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Optimizer held by each worker process for its lifetime
+_optimizer = None
+
+
+def _initialize(optimizer, threads):
+    '''Prepare a worker process to fit features'''
+    global _optimizer
+    if threads is not None:
+        try:
+            import numba
+            numba.set_num_threads(min(threads, numba.config.NUMBA_NUM_THREADS))
+        except ImportError:
+            pass
+    _optimizer = optimizer
+
+
+def _optimize(tasks, kwargs):
+    '''Fit a chunk of features with the worker's optimizer
+
+    Arguments
+    ---------
+    tasks : list
+        (data, coordinates, properties, settings, noise) for each
+        feature, where settings are the properties of the
+        feature's optimizer
+    kwargs : dict
+        Keywords for Optimizer.optimize()
+
+    Returns
+    -------
+    results : list
+        (report, result) for each feature: the pandas.Series
+        returned by Optimizer.optimize() and the OptimizeResult
+    '''
+    results = []
+    for data, coordinates, properties, settings, noise in tasks:
+        _optimizer.properties = settings
+        _optimizer.noise = noise
+        _optimizer.model.properties = properties
+        _optimizer.data = data
+        _optimizer.coordinates = coordinates
+        report = _optimizer.optimize(**kwargs)
+        results.append((report, _optimizer.result))
+    return results
+
+
+class Executor(object):
+    '''
+    Fit Features in parallel with a pool of worker processes
+
+    Each worker holds one Optimizer, and thus one LMHologram,
+    for its lifetime. Features are sent to the workers in chunks
+    and results are returned in the order of the features.
+    The pool is started on first use and is shut down by close()
+    or at the end of a with block.
+
+    ...
+
+    Properties
+    ----------
+    optimizer : Optimizer
+        Template for the workers' optimizers. Its model is copied
+        to each worker. Each feature is fit with the settings,
+        fixed properties, variables and noise estimate of its
+        own optimizer. Default: Optimizer(**kwargs)
+    workers : int
+        Number of worker processes. Default: os.cpu_count()
+    chunksize : int
+        Number of features fit by each task. Default: 1
+    backlog : int
+        Maximum number of tasks submitted to the pool and not yet
+        consumed. Limits memory use for long sequences of features.
+        Default: 2*workers
+    threads : int
+        Number of numba threads in each worker. Default:
+        os.cpu_count() // workers, so that parallel kernels in
+        the workers do not oversubscribe the cores.
+    context : str
+        Multiprocessing start method. Default: 'spawn', which is
+        safe with numba's threading layers.
+
+    Methods
+    -------
+    map(features, **kwargs) : generator
+        Fit each feature and yield the pandas.Series reporting
+        the result. The model of each feature is updated with
+        the optimized values, and its optimizer holds the result.
+    optimize(features, **kwargs) : pandas.DataFrame
+        Fit features and return results as rows of a DataFrame.
+    close()
+        Shut down the worker processes.
+    '''
+
+    def __init__(self,
+                 optimizer=None,
+                 workers=None,
+                 chunksize=1,
+                 backlog=None,
+                 threads=None,
+                 context='spawn',
+                 **kwargs):
+        self.optimizer = optimizer or Optimizer(**kwargs)
+        self.workers = workers or os.cpu_count()
+        self.chunksize = chunksize
+        self.backlog = backlog or 2 * self.workers
+        self.threads = threads or max(1, os.cpu_count() // self.workers)
+        self.context = context
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def pool(self):
+        '''Pool of worker processes'''
+        if self._pool is None:
+            context = multiprocessing.get_context(self.context)
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=context,
+                                             initializer=_initialize,
+                                             initargs=(self._template(),
+                                                       self.threads))
+        return self._pool
+
+    def close(self):
+        '''Shut down the worker processes'''
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def map(self, features, **kwargs):
+        '''Fit features in parallel
+
+        Arguments
+        ---------
+        features : iterable
+            Features to fit. May be a generator.
+
+        Keywords
+        --------
+        Accepts the keywords of Optimizer.optimize()
+
+        Returns
+        -------
+        results : generator
+            pandas.Series for each feature, in order
+        '''
+        pending = deque()
+        chunk = []
+        for feature in features:
+            chunk.append(feature)
+            if len(chunk) == self.chunksize:
+                pending.append(self._submit(chunk, kwargs))
+                chunk = []
+            while len(pending) >= self.backlog:
+                yield from self._collect(*pending.popleft())
+        if chunk:
+            pending.append(self._submit(chunk, kwargs))
+        while pending:
+            yield from self._collect(*pending.popleft())
+
+    def optimize(self, features, **kwargs):
+        '''Fit features in parallel
+
+        Arguments
+        ---------
+        features : iterable
+            Features to fit
+
+        Keywords
+        --------
+        Accepts the keywords of Optimizer.optimize()
+
+        Returns
+        -------
+        results : pandas.DataFrame
+            One row of results for each feature, in order
+        '''
+        return pd.DataFrame(list(self.map(features, **kwargs)))
+
+    def _template(self):
+        '''Return copy of optimizer without data'''
+        optimizer = self.optimizer
+        data, coordinates = optimizer.data, optimizer.coordinates
+        optimizer.data, optimizer.coordinates = None, None
+        try:
+            template = pickle.loads(pickle.dumps(optimizer))
+        finally:
+            optimizer.data, optimizer.coordinates = data, coordinates
+        return template
+
+    def _submit(self, features, kwargs):
+        tasks = []
+        for feature in features:
+            optimizer = feature.optimizer
+            tasks.append((*feature.subset(), feature.model.properties,
+                          optimizer.properties, optimizer.noise))
+        data = [task[0] for task in tasks]
+        return self.pool.submit(_optimize, tasks, kwargs), features, data
+
+    def _collect(self, future, features, data):
+        reports = []
+        for feature, subset, (report, result) in zip(features, data,
+                                                      future.result()):
+            optimizer = feature.optimizer
+            variables = {key: report[key] for key in optimizer.variables}
+            feature.model.properties = variables
+            optimizer._result = result
+            optimizer.data = subset
+            reports.append(report)
+        return reports
+
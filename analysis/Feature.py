@@ -31,6 +31,8 @@ class Feature(object):
 
     Methods
     -------
+    subset() : (numpy.ndarray, numpy.ndarray)
+        Data and coordinates of the pixels selected by the mask.
     optimize() : pandas.Series
         Optimize adjustable parameters and return a report containing
         the optimized values and their numerical uncertainties.
@@ -101,16 +103,21 @@ class Feature(object):
     def optimizer(self, optimizer):
         self._optimizer = optimizer
 
-    def optimize(self):
+    def subset(self):
+        '''Return data and coordinates of pixels selected by mask'''
         mask = self.mask.selected
-        opt = self.optimizer
-        opt.data = self.data.ravel()[mask]
+        data = self.data.ravel()[mask]
         # The following nasty hack is required for cupy because
-        # opt.coordinates = self.coordinates[:,mask]
+        # coordinates = self.coordinates[:,mask]
         # yields garbled results on GPU. Memory organization?
         ndx = np.nonzero(mask)
-        opt.coordinates = np.take(self.coordinates, ndx, axis=1).squeeze()
-        return self.optimizer.optimize()
+        coordinates = np.take(self.coordinates, ndx, axis=1).squeeze()
+        return data, coordinates
+
+    def optimize(self, **kwargs):
+        opt = self.optimizer
+        opt.data, opt.coordinates = self.subset()
+        return self.optimizer.optimize(**kwargs)
 
     def hologram(self):
         self.optimizer.model.coordinates = self.coordinates
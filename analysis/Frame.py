@@ -32,7 +32,9 @@ class Frame(object):
      ** Note: If the framenumber+path are already given, the image_path can be determined using setDefaultPath(); and vice versa. (See below)
     
     image : numpy.ndarray
-        Image from camera. If None (default), the getter tries to read from local image_path. To store image, call load(); to write to image_path, call save()
+        Image from camera. If None (default), the getter reads the image with loader, if there is one, or else from local image_path. To store image, call load(); to write to image_path, call save()
+    loader : callable
+        Called with the framenumber to read the image on demand, for example an analysis.Normalizer.Reader. Default: None
     
     instrument : Instrument
         Instrument instance used for prediction. Setters ensure all of the Frame's Features share the same instrument.
@@ -71,7 +73,7 @@ class Frame(object):
              set the image_path to frame.image_path='myexp/myimages/image0123/png'
     
     load() 
-        read image from local image_path into self._image
+        read image with loader, or from local image_path, into self._image
     
     unload()
         clear self._image 
@@ -88,9 +90,11 @@ class Frame(object):
                  framenumber=None,
                  image=None,
                  path=None,
+                 loader=None,
                  info=None):
         self._instrument = instrument
         self._image = image
+        self.loader = loader
         self.framenumber = framenumber
         self.path = None
         self.image_path = None
@@ -143,7 +147,11 @@ class Frame(object):
             
     @property
     def image(self):
-        return self._image if self._image is not None else cv2.imread(self.image_path)
+        if self._image is not None:
+            return self._image
+        if self.loader is not None:
+            return self.loader(self.framenumber)
+        return cv2.imread(self.image_path)
     
     @image.setter    
     def image(self, image):
@@ -214,9 +222,12 @@ class Frame(object):
             for i in sorted(list(index), reverse=True): 
                 self.remove(i)
         
-    def optimize(self, report=True, **kwargs):
-        for idx, feature in enumerate(self.features):
-            result = feature.optimize(**kwargs)
+    def optimize(self, report=True, executor=None, **kwargs):
+        if executor is not None:
+            results = executor.map(self.features, **kwargs)
+        else:
+            results = (feature.optimize(**kwargs) for feature in self.features)
+        for result in results:
             if report:
                 print(result)
 
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import numpy as np
+from pylorenzmie.utilities.profiling import timed
 
 def gaussian(x, mu, sig):
     '''Gaussian function for radial distribution'''
@@ -25,15 +26,30 @@ class Mask(object):
         name of the probability distribution for random sampling
     exclude : numpy.ndarray
         indexes of pixels to exclude from mask
-    mask : numpy.ndarray
- 
+    stratified : bool
+        If set, sample each annulus of unit width about the center
+        in proportion to its share of the probability distribution.
+        This reduces fluctuations in the radial coverage of the
+        sample, so that fewer pixels are needed for a given
+        fit quality. Default: False
+    rng : numpy.random.Generator
+        Random number generator for sampling. May be set with
+        a seed. By default, the generator is seeded from numpy's
+        global random state, so that np.random.seed()
+        makes samples reproducible.
+    selected : numpy.ndarray
+        [npix] boolean array of selected pixels. The sample is
+        drawn when it is first needed after a change of the
+        other properties.
     '''
-    
+
     def __init__(self,
                  coordinates=None,
                  percentpix=0.1,
                  distribution='fast',
                  exclude=None,
+                 stratified=False,
+                 seed=None,
                  **kwargs):
         
         self.d_map = {'uniform': self._uniform_distribution,
@@ -43,7 +59,10 @@ class Mask(object):
         
         self._percentpix = percentpix
         self._distribution = distribution
-        self._exclude = exclude or []
+        self._exclude = [] if exclude is None else exclude
+        self._stratified = bool(stratified)
+        self._coordinates = None
+        self.rng = seed
         self.coordinates = coordinates
 
     @property
@@ -53,11 +72,15 @@ class Mask(object):
     
     @coordinates.setter
     def coordinates(self, coordinates):
+        # distances and distributions are reused if the
+        # same coordinates are assigned again
+        if coordinates is not None and coordinates is not self._coordinates:
+            c = np.asarray(coordinates)
+            center = np.mean(c, axis=1)
+            self._distance = np.sqrt(np.sum((c.T - center)**2, axis=1))
+            self._maps = dict()
         self._coordinates = coordinates
-        if coordinates is not None:
-            center = np.mean(coordinates, axis=1)
-            self._distance = np.linalg.norm(coordinates.T - center, axis=1)
-        self._update()
+        self._stale = True
         
     @property
     def percentpix(self):
@@ -67,7 +90,7 @@ class Mask(object):
     @percentpix.setter
     def percentpix(self, value):
         self._percentpix = np.clip(float(value), 0, 1)
-        self._update()
+        self._stale = True
 
     @property
     def distribution(self):
@@ -80,7 +103,7 @@ class Mask(object):
             self._distribution = name
         else:
             self._distribution = 'fast'
-        self._update()
+        self._stale = True
 
     @property
     def exclude(self):
@@ -89,10 +112,35 @@ class Mask(object):
 
     @exclude.setter
     def exclude(self, exclude):
-        self._exclude = exclude
+        self._exclude = [] if exclude is None else exclude
+        self._stale = True
+
+    @property
+    def stratified(self):
+        '''Sample annuli in proportion to their probability'''
+        return self._stratified
+
+    @stratified.setter
+    def stratified(self, stratified):
+        self._stratified = bool(stratified)
+        self._stale = True
+
+    @property
+    def rng(self):
+        '''Random number generator for sampling pixels'''
+        return self._rng
+
+    @rng.setter
+    def rng(self, seed):
+        if seed is None:
+            seed = np.random.randint(2**31)
+        self._rng = np.random.default_rng(seed)
+        self._stale = True
 
     @property
     def selected(self):
+        if self._stale:
+            self._update()
         return self._selected
 
     # Various sampling probability distributions
@@ -120,9 +168,20 @@ class Mask(object):
         return None
 
     def _get_distribution(self):
-        return self.d_map[self.distribution]()
-
+        '''Probability distribution, cached for the current coordinates'''
+        if self.distribution not in self._maps:
+            self._maps[self.distribution] = self.d_map[self.distribution]()
+        return self._maps[self.distribution]
+
+    def _rings(self):
+        '''Index of the annulus of unit width containing each pixel'''
+        if 'rings' not in self._maps:
+            self._maps['rings'] = self._distance.astype(int)
+        return self._maps['rings']
+
+    @timed('Mask._update')
     def _update(self):
+        self._stale = False
         if self._coordinates is None:
             self._selected = None
             return
@@ -132,14 +191,48 @@ class Mask(object):
         else:
             nchosen = int(npts * self.percentpix)
             rho = self._get_distribution()
-            if rho is not None:
+            if rho is None and not self.stratified:
+                index = np.delete(np.arange(npts), self.exclude)
+                nchosen = min(nchosen, index.size)
+                index = self.rng.choice(index, nchosen, replace=False)
+            else:
+                rho = np.ones(npts) if rho is None else rho.copy()
                 rho[self.exclude] = 0.
-                rho /= np.sum(rho)
-            index = np.random.choice(npts, nchosen,
-                                     p=rho, replace=False)
+                index = self._sample(rho, nchosen)
         self._selected = np.full(npts, False)
         self._selected[index] = True
 
+    def _sample(self, rho, nchosen):
+        '''Weighted sampling without replacement
+
+        Each pixel is assigned the key u**(1/rho) for uniform
+        deviate u, and the pixels with the largest keys are selected
+        (Efraimidis and Spirakis, Inf. Process. Lett. 97, 181 (2006)).
+        '''
+        with np.errstate(divide='ignore'):
+            keys = np.log(self.rng.random(rho.size)) / rho
+        keys[rho <= 0] = -np.inf
+        nchosen = min(nchosen, np.count_nonzero(rho > 0))
+        if nchosen <= 0:
+            return np.empty(0, dtype=int)
+        if not self.stratified:
+            return np.argpartition(keys, -nchosen)[-nchosen:]
+        # allocate pixels to annuli by largest remainder
+        rings = self._rings()
+        share = np.bincount(rings, rho)
+        share *= nchosen / np.sum(share)
+        quota = np.floor(share).astype(int)
+        remainder = nchosen - np.sum(quota)
+        if remainder > 0:
+            quota[np.argsort(quota - share)[:remainder]] += 1
+        quota = np.minimum(quota, np.bincount(rings, rho > 0))
+        # pixels with the largest keys in each annulus
+        order = np.lexsort((-keys, rings))
+        counts = np.bincount(rings)
+        first = np.cumsum(counts) - counts
+        rank = np.arange(rings.size) - first[rings[order]]
+        return order[rank < quota[rings[order]]]
+
 
 if __name__ == '__main__': # pragma: no cover
     from pylorenzmie.theory.Instrument import coordinates
@@ -0,0 +1,396 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import zipfile
+import numpy as np
+from itertools import islice
+from pylorenzmie.detection.h5video import (h5video, TagArray)
+
+
+class Normalizer(object):
+
+    '''
+    Streaming normalization of video frames by their background
+
+    Each frame is divided by a background image after the dark
+    count of the camera has been subtracted from both. Unless a
+    fixed background is provided, the background is the running
+    median or percentile of the most recent frames, which are
+    kept in a ring buffer.
+
+    Recomputing the running background sorts window values at
+    every pixel, which costs far more than normalizing one frame.
+    The background therefore is recomputed only once every stride
+    frames. The default stride of window // 10 frames limits the
+    average cost to roughly ten values per pixel per frame, and
+    the background lags the most recent frames by fewer than
+    stride frames. Setting stride=1 updates the background for
+    every frame at window times the cost.
+
+    ...
+
+    Properties
+    ----------
+    window : int
+        Number of frames in the running background
+    method : str
+        'median' or 'percentile'
+    percentile : float
+        Percentile of the running background for method='percentile'
+    stride : int
+        Number of frames between updates of the running background.
+        Default: window // 10, and at least 1
+    dark_count : float
+        Dark count of camera. Default: instrument.dark_count,
+        if an instrument is provided, otherwise 0.
+    instrument : Instrument
+        Instrument that provides the dark count
+    background : numpy.ndarray
+        Fixed background image. If None (default), use the
+        running background.
+
+    Methods
+    -------
+    add(frame, update=True)
+        Add frame to the running background
+    update()
+        Recompute the running background
+    estimate(frames)
+        Fix the background to the median or percentile of frames
+    normalize(frame) : TagArray
+        Normalize frame by the current background
+    stream(frames, filename=None, chunksize=16) : generator
+        Yield normalized frames, optionally saving them to an
+        HDF5 (.h5) or numpy (.npz) file in chunks of chunksize
+        frames
+    reset()
+        Clear the running background
+
+    Frames saved by stream() are read back with load(filename),
+    or one at a time by frame number with Reader(filename).
+    '''
+
+    dtype = np.float32
+
+    def __init__(self,
+                 window=100,
+                 method='median',
+                 percentile=50.,
+                 stride=None,
+                 dark_count=None,
+                 instrument=None,
+                 background=None):
+        self.window = window
+        self.method = method
+        self.percentile = percentile
+        self.stride = stride
+        self.instrument = instrument
+        self.dark_count = dark_count
+        self.background = background
+        self.reset()
+
+    @property
+    def method(self):
+        return self._method
+
+    @method.setter
+    def method(self, method):
+        if method not in ('median', 'percentile'):
+            raise ValueError('method must be median or percentile')
+        self._method = method
+
+    @property
+    def stride(self):
+        if self._stride is not None:
+            return self._stride
+        return max(1, self.window // 10)
+
+    @stride.setter
+    def stride(self, stride):
+        self._stride = stride
+
+    @property
+    def dark_count(self):
+        if self._dark_count is not None:
+            return self._dark_count
+        if self.instrument is not None:
+            return self.instrument.dark_count
+        return 0.
+
+    @dark_count.setter
+    def dark_count(self, dark_count):
+        self._dark_count = dark_count
+
+    @property
+    def background(self):
+        return self._background
+
+    @background.setter
+    def background(self, background):
+        if background is not None:
+            background = np.asarray(background, dtype=self.dtype)
+        self._background = background
+
+    def reset(self):
+        '''Clear the running background'''
+        self._buffer = None
+        self._count = 0
+        self._running = None
+
+    def add(self, frame, update=True):
+        '''Add frame to the running background'''
+        frame = np.asarray(frame)
+        if self._buffer is None or self._buffer.shape[1:] != frame.shape:
+            self.reset()
+            self._buffer = np.empty((self.window, *frame.shape),
+                                    dtype=self.dtype)
+        self._buffer[self._count % self.window] = frame
+        self._count += 1
+        if update and (self._running is None or
+                       self._count % self.stride == 0):
+            self.update()
+
+    def update(self):
+        '''Recompute the running background'''
+        if self._count == 0:
+            return
+        frames = self._buffer[:min(self._count, self.window)]
+        if self._running is None:
+            self._running = np.empty(frames.shape[1:], dtype=self.dtype)
+        if self.method == 'median':
+            np.median(frames, axis=0, out=self._running)
+        else:
+            np.percentile(frames, self.percentile, axis=0,
+                          out=self._running)
+
+    def estimate(self, frames):
+        '''Fix the background to the median or percentile of frames'''
+        self.reset()
+        for frame in frames:
+            self.add(frame, update=False)
+        self.update()
+        self.background = self._running
+        self.reset()
+        return self.background
+
+    def normalize(self, frame, frame_no=None):
+        '''Normalize frame by the current background
+
+        If there is no background yet, frame is added to
+        the running background.
+
+        Returns
+        -------
+        norm : TagArray
+            float32 normalized frame
+        '''
+        background = self.background
+        if background is None:
+            if self._running is None:
+                self.add(frame)
+            background = self._running
+        if frame_no is None:
+            frame_no = getattr(frame, 'frame_no', None)
+        dark = self.dtype(self.dark_count)
+        norm = np.subtract(frame, dark, dtype=self.dtype)
+        denominator = background - dark
+        # pixels without signal are normalized to 1
+        np.divide(norm, denominator, out=norm, where=denominator > 0)
+        norm[denominator <= 0] = 1.
+        return TagArray(norm, frame_no=frame_no)
+
+    def stream(self, frames, filename=None, chunksize=16):
+        '''Yield normalized frames
+
+        Frames are numbered by their frame_no attribute, if
+        they have one, or else by their position in the stream.
+        The running background is filled with the first window
+        frames before any frames are normalized.
+
+        Parameters
+        ----------
+        frames : iterable
+            Video frames
+        filename : str, optional
+            If provided, normalized frames also are saved to an
+            HDF5 (.h5, .hdf5) or numpy (.npz) file
+        chunksize : int
+            Number of frames in each chunk of the output file
+        '''
+        frames = iter(frames)
+        head = []
+        if self.background is None:
+            head = list(islice(frames, self.window))
+            for frame in head:
+                self.add(frame, update=False)
+            self.update()
+        with _Writer(filename, chunksize) as writer:
+            for n, frame in enumerate(head):
+                norm = self.normalize(frame, self._number(frame, n))
+                yield writer.write(norm)
+            for n, frame in enumerate(frames, len(head)):
+                if self.background is None:
+                    self.add(frame)
+                norm = self.normalize(frame, self._number(frame, n))
+                yield writer.write(norm)
+
+    @staticmethod
+    def _number(frame, n):
+        frame_no = getattr(frame, 'frame_no', None)
+        return n if frame_no is None else frame_no
+
+
+def load(filename):
+    '''Yield normalized frames saved by Normalizer.stream()
+
+    Parameters
+    ----------
+    filename : str
+        HDF5 (.h5, .hdf5) or numpy (.npz) file
+
+    Returns
+    -------
+    frames : generator
+        float32 TagArrays numbered as they were saved
+    '''
+    ext = os.path.splitext(filename)[1].lower()
+    if ext in ('.h5', '.hdf5'):
+        with h5video(filename) as vid:
+            numbers = vid.f['frame_no'][()]
+            for frame in vid:
+                yield TagArray(frame, frame_no=int(numbers[frame.frame_no]))
+    elif ext == '.npz':
+        with np.load(filename) as data:
+            for key in sorted(k for k in data if k.startswith('images')):
+                numbers = data[key.replace('images', 'frame_no')]
+                for frame, frame_no in zip(data[key], numbers):
+                    yield TagArray(frame, frame_no=int(frame_no))
+    else:
+        raise ValueError('cannot load frames from {}'.format(filename))
+
+
+class Reader(object):
+
+    '''Reads frames saved by Normalizer.stream() by frame number
+
+    Only the frame numbers are read when the reader is created.
+    Calling the reader with a frame number reads that frame from
+    the file, so that frames can be loaded as they are needed.
+
+    Parameters
+    ----------
+    filename : str
+        HDF5 (.h5, .hdf5) or numpy (.npz) file
+
+    Attributes
+    ----------
+    numbers : list
+        Frame numbers of the saved frames, in the order saved
+    '''
+
+    def __init__(self, filename):
+        self.filename = filename
+        ext = os.path.splitext(filename)[1].lower()
+        if ext in ('.h5', '.hdf5'):
+            import h5py
+            with h5py.File(filename, 'r') as f:
+                numbers = f['frame_no'][()]
+            self._index = {int(n): i for i, n in enumerate(numbers)}
+            self._read = self._read_h5
+        elif ext == '.npz':
+            self._index = dict()
+            with np.load(filename) as data:
+                for key in sorted(k for k in data if k.startswith('images')):
+                    numbers = data[key.replace('images', 'frame_no')]
+                    for i, n in enumerate(numbers):
+                        self._index[int(n)] = (key, i)
+            self._read = self._read_npz
+        else:
+            raise ValueError('cannot load frames from {}'.format(filename))
+
+    @property
+    def numbers(self):
+        return list(self._index)
+
+    def __call__(self, frame_no):
+        return TagArray(self._read(self._index[frame_no]), frame_no=frame_no)
+
+    def _read_h5(self, index):
+        with h5video(self.filename) as vid:
+            return vid.read(index, index + 1, copy=True)[0]
+
+    def _read_npz(self, index):
+        key, i = index
+        with np.load(self.filename) as data:
+            return data[key][i]
+
+
+class _Writer(object):
+
+    '''Saves normalized frames to a file in chunks'''
+
+    def __init__(self, filename, chunksize):
+        self.filename = filename
+        self.chunksize = chunksize
+        self.frames = []
+        self.numbers = []
+        self.nchunks = 0
+        self.file = None
+
+    def __enter__(self):
+        if self.filename is None:
+            return self
+        ext = os.path.splitext(self.filename)[1].lower()
+        if ext in ('.h5', '.hdf5'):
+            import h5py
+            self.file = h5py.File(self.filename, 'w')
+            self._flush = self._flush_h5
+        elif ext == '.npz':
+            self.file = zipfile.ZipFile(self.filename, 'w')
+            self._flush = self._flush_npz
+        else:
+            raise ValueError('cannot save frames to {}'.format(self.filename))
+        return self
+
+    def __exit__(self, *args):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+
+    def write(self, frame):
+        if self.file is not None:
+            self.frames.append(frame)
+            self.numbers.append(frame.frame_no)
+            if len(self.frames) >= self.chunksize:
+                self.flush()
+        return frame
+
+    def flush(self):
+        if len(self.frames) > 0:
+            self._flush(np.stack(self.frames),
+                        np.array(self.numbers, dtype=int))
+            self.nchunks += 1
+        self.frames = []
+        self.numbers = []
+
+    def _flush_h5(self, chunk, numbers):
+        if 'images' not in self.file:
+            self.file.create_dataset('images', data=chunk,
+                                     maxshape=(None, *chunk.shape[1:]),
+                                     chunks=(self.chunksize,
+                                             *chunk.shape[1:]))
+            self.file.create_dataset('frame_no', data=numbers,
+                                     maxshape=(None,))
+            return
+        for name, data in (('images', chunk), ('frame_no', numbers)):
+            dataset = self.file[name]
+            nframes = dataset.shape[0]
+            dataset.resize(nframes + len(data), axis=0)
+            dataset[nframes:] = data
+
+    def _flush_npz(self, chunk, numbers):
+        for name, data in (('images', chunk), ('frame_no', numbers)):
+            entry = '{}{:06d}.npy'.format(name, self.nchunks)
+            with self.file.open(entry, 'w', force_zip64=True) as f:
+                np.lib.format.write_array(f, data)
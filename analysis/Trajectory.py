@@ -81,8 +81,68 @@ class Trajectory(object):
         if 'framenumbers' in info.keys():
             self._framenumbers = info['framenumbers']
 
-    def optimize(self, report=True, **kwargs):
-        for idx, feature in enumerate(self.features):
-            result = feature.optimize(**kwargs)
+    def optimize(self, report=True, executor=None,
+                 warmstart=False, extrapolate=False, tolerance=2.,
+                 **kwargs):
+        '''Fit features in the trajectory
+
+        Keywords
+        --------
+        report : bool
+            If set, print the result for each feature
+        executor : Executor, optional
+            Fit features in parallel. Ignored for warm starts,
+            which fit features in sequence.
+        warmstart : bool
+            If set, seed the fit for each feature with the values
+            obtained for the previous feature that was fit
+            successfully.
+        extrapolate : bool
+            If set, extrapolate the position of the particle from
+            the previous two features assuming constant velocity.
+        tolerance : float
+            A warm-started fit is repeated from the feature's own
+            initial estimates if it fails or if its reduced
+            chi-squared exceeds tolerance times the previous value.
+        '''
+        if warmstart:
+            results = self._warmstart(extrapolate, tolerance, **kwargs)
+        elif executor is not None:
+            results = executor.map(self.features, **kwargs)
+        else:
+            results = (feature.optimize(**kwargs) for feature in self.features)
+        for result in results:
             if report:
                 print(result)
+
+    def _warmstart(self, extrapolate, tolerance, **kwargs):
+        '''Fit features in sequence, seeding each with its predecessor'''
+        position = ['x_p', 'y_p', 'z_p']
+        history = []
+        for feature, framenumber in zip(self.features, self.framenumbers):
+            if not history:
+                result = feature.optimize(**kwargs)
+            else:
+                initial = feature.model.properties
+                last, lastframe, redchi = history[-1]
+                guess = dict(last)
+                if extrapolate and len(history) > 1:
+                    prev, prevframe, _ = history[-2]
+                    if lastframe != prevframe:
+                        scale = (framenumber - lastframe) / \
+                            (lastframe - prevframe)
+                        for key in position:
+                            if key in guess:
+                                guess[key] += scale * (last[key] - prev[key])
+                feature.model.properties = guess
+                result = feature.optimize(**kwargs)
+                if not (result['success'] and
+                        result['redchi'] <= tolerance * redchi):
+                    feature.model.properties = initial
+                    result = feature.optimize(**kwargs)
+            # failed fits neither seed nor judge later fits
+            if result['success']:
+                variables = feature.optimizer.variables
+                values = {key: result[key] for key in variables}
+                history.append((values, framenumber, result['redchi']))
+            yield result
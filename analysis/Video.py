@@ -3,12 +3,13 @@
 
 import trackpy as tp
 import pandas as pd
+import cv2
 import json
 import os
+from collections import deque
 from .Frame import Frame
-from CNNLorenzMie.experiments.normalize_image import normalize_video
-from CNNLorenzMie.experiments.running_normal import running_normalize
-
+from .Normalizer import (Normalizer, Reader)
+from pylorenzmie.detection.h5video import (h5video, TagArray)
 
 
 class Video(object):
@@ -47,12 +48,14 @@ class Video(object):
     Methods
     ------- 
     set_frames(frames=None, framenumbers=None)
-        frames : list of Frames  |  framenumbers : list of integers
+        frames : list of Frames, or filename  |  framenumbers : list of integers
         Set the video's frames. Ensures each frame has a framenumber.
          - If ONLY FRAMES are passed, the framenumbers are obtained from the frames via frame.framenumber
          - If FRAMES AND FRAMENUMBERS are BOTH passed, the passed framenumbers are used (i.e. frames[i].framenumber = framenumbers[i]
-         - If ONLY FRAMENUMBERS are passed, frames are obtained via 'path' by searching for images at 'path/norm_images/image####.png'
-         - If NEITHER are passed, frames and framenumbers obtained by reading all of the files in 'path/norm_images'
+         - If FRAMES is a FILENAME, frames are made from the normalized images saved in that HDF5 (.h5) or numpy (.npz) file by normalize()
+         - If FRAMES are NOT passed, the video is normalized with normalize() into an HDF5 file named after video_path ('myexp.avi' -> 'myexp_norm.h5'), and frames are made from that file
+         - Frames made from a file hold only their framenumbers: each frame reads its image from the file when frame.image is accessed
+         - If FRAMENUMBERS are passed with a filename or without frames, only the images with those framenumbers are used
 
     get_frames(framenumbers) : list of frames
         Return frames indexed by corresponding framenumbers
@@ -68,6 +71,18 @@ class Video(object):
         if Link=True, link the trajectories using trackpy and any relevant trackpy **kwargs.
     clear_trajectories()
         Set trajectories to an empty DataFrame
+
+    normalize(filename=None, chunksize=16, **kwargs) : generator
+        Yield float32 frames of the video at video_path normalized by a
+        running background, or by the median of the background video at
+        bg_path, if there is one. The instrument's dark count is subtracted.
+         - If filename is given, also save the normalized frames to an
+           HDF5 (.h5) or numpy (.npz) file in chunks of chunksize frames
+         - kwargs are passed to Normalizer (window, method, percentile, ...)
+         - Nothing is normalized or saved until the generator is consumed,
+           for example with list(video.normalize()) or set_frames()
+    read(path=None) : generator
+        Yield numbered grayscale frames of the video at path (default: video_path)
         
     serialize(save=False, path='', traj_path=None, omit=[], omit_frame=[], omit_feat=[])
         Convert Video object into a dict containing frames (dict to serialized frames), fps, and video_path.
@@ -138,19 +153,27 @@ class Video(object):
         return frame
     
     def set_frames(self, frames=None, framenumbers=None):
-        if frames is None and framenumbers is None: 
-            if self.path is not None:
-                print('Setting frames using contents of path {}/norm_images:'.format(self.path))
-                self.set_frames(frames=[Frame(path=self.path + '/norm_images/' + s) for s in os.listdir(self.path + '/norm_images')])
-                self.sort()
+        if isinstance(frames, dict):
+            self._frames.update(frames)
+            return
+        if frames is None:
+            if self.video_path is None:
+                print('Cannot set frames without video_path')
                 return
-        elif isinstance(frames, dict):
-             self._frames.update(frames)
-             
-        elif framenumbers is None:
+            frames = os.path.splitext(self.video_path)[0] + '_norm.h5'
+            deque(self.normalize(filename=frames), maxlen=0)
+        if isinstance(frames, str):
+            reader = Reader(frames)
+            numbers = reader.numbers
+            if framenumbers is not None:
+                wanted = set(framenumbers)
+                numbers = [n for n in numbers if n in wanted]
+            for framenumber in numbers:
+                self.set_frame(Frame(loader=reader), framenumber)
+            self.sort()
+            return
+        if framenumbers is None:
             framenumbers = [None for frame in frames]
-        elif frames is None:
-            frames = [Frame(path=self.path) for fnum in framenumbers]
         for i in range(len(frames)):
             self.set_frame(frames[i], framenumbers[i])
                            
@@ -218,21 +241,42 @@ class Video(object):
     def clear_trajectories(self):
         self._trajectories = pd.DataFrame()
 
-    def normalize(self, save_folder=None, order=None, dark=None):
-        if save_folder is None:
-            save_folder = self.path + '/norm_images/'
-        else:
-            print('not sure how to handle this yet')
-        if self.bg_path is None: #assume if no background video that this is a flow experiment
-            if order is None:
-                order = 3
-            running_normalize(self.video_path, save_folder = save_folder, order = order, dark = dark)
-        else: #use background video if there is one
-            if order is None:
-                order = 2
-            normalize_video(self.bg_path, self.video_path, save_folder = save_folder, order = order)
-        self.set_frames()
-            
+    def normalize(self, filename=None, chunksize=16, **kwargs):
+        '''Yield normalized frames of the video
+
+        Frames are normalized, and saved to filename, only as the
+        generator is consumed: calling normalize() without iterating
+        over the result does nothing.
+        '''
+        kwargs.setdefault('instrument', self.instrument)
+        normalizer = Normalizer(**kwargs)
+        if self.bg_path is not None:
+            normalizer.estimate(self.read(self.bg_path))
+        return normalizer.stream(self.read(), filename=filename,
+                                 chunksize=chunksize)
+
+    def read(self, path=None):
+        '''Yield grayscale frames of the video at path,
+        by default video_path, as numbered TagArrays'''
+        path = path or self.video_path
+        if os.path.splitext(path)[1].lower() in ('.h5', '.hdf5'):
+            with h5video(path) as vid:
+                yield from vid
+            return
+        capture = cv2.VideoCapture(path)
+        try:
+            frame_no = 0
+            while True:
+                ok, image = capture.read()
+                if not ok:
+                    break
+                if image.ndim == 3:
+                    image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+                yield TagArray(image, frame_no=frame_no)
+                frame_no += 1
+        finally:
+            capture.release()
+
     def serialize(self, save=False, framenumbers=None, path=None, traj_path=None,
                   omit=[], omit_frame=[], omit_feat=[]):
         info={}
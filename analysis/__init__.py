@@ -2,6 +2,8 @@ from .Mask import Mask
 from .Feature import Feature
 from .Frame import Frame
 from .Trajectory import Trajectory
-# from .Video import Video
+from .Executor import Executor
+from .Normalizer import Normalizer
+from .Video import Video
 
-__all__ = [Mask, Feature, Frame, Trajectory]
+__all__ = [Mask, Feature, Frame, Trajectory, Executor, Normalizer, Video]
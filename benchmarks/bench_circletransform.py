@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Benchmark for the circletransform voting engine
+
+Compares the vectorized voting() with the reference implementation
+that loops over pixels in Python, and with the orientational
+transform, for the hologram of a sphere. Also compares the
+orientational transform with the reference implementation that
+recomputes its kernel for every frame. The reference voting
+implementation is only correct for square images.
+
+Usage: python bench_circletransform.py [npix]
+'''
+
+from time import perf_counter
+import numpy as np
+from pylorenzmie.theory.spheredhm import spheredhm
+from pylorenzmie.detection.savgol2d import savgol2d
+from pylorenzmie.detection.edge_convolve import edge_convolve
+from pylorenzmie.detection.circletransform import (voting, orientTrans,
+                                                   OrientationalTransform)
+
+
+def looping_voting(dadx, dady, dx, noise=0.01):
+    '''Reference implementation that casts votes pixel by pixel'''
+    nx, ny = dadx.shape
+    grada = np.sqrt(dadx**2 + dady**2)
+    dgrada = noise * np.sqrt(2. * sum(sum(dx**2)))
+    w = np.where(grada > 2.*dgrada)
+    npts = len(w[0])
+    b = np.zeros([nx, ny], dtype=int)
+    if npts <= 0:
+        return b
+    yp, xp = np.mod(w, nx)
+    grada = grada[w[0], w[1]]
+    dgrada = dgrada/grada
+    costheta = dadx[w[0], w[1]] / grada
+    sintheta = dady[w[0], w[1]] / grada
+    rng = list(map(round, 2./np.tan(dgrada/2.)))
+    rng = np.array([i if i < nx or i == -np.inf else nx for i in rng])
+    mrange = int(max(rng))
+    r = np.arange(2*mrange+1, dtype=float) - mrange
+    nx -= 1
+    ny -= 1
+    for i in range(npts):
+        start = int(mrange-rng[i])
+        end = int(mrange+rng[i])
+        rr = r[start:end]
+        x = (xp[i] + rr * costheta[i])
+        x = [l if l > 0 else 0 for l in x]
+        x = [m if m < nx else nx for m in x]
+        y = (yp[i] + rr * sintheta[i])
+        y = [l if l > 0 else 0 for l in y]
+        y = [m if m < ny else ny for m in y]
+        b[list(map(int, y)), list(map(int, x))] += 1
+    b[0, :] = 0
+    b[:, 0] = 0
+    b[:, -1] = 0
+    b[-1, :] = 0
+    return b
+
+
+def reference_orientTrans(dadx, dady):
+    '''Reference implementation that recomputes the kernel'''
+    ny, nx = dadx.shape
+    psi = dadx + 1.0j*dady
+    psi *= psi
+    kx, ky = np.meshgrid(np.arange(nx)/float(nx) - 0.5,
+                         np.arange(ny)/float(ny) - 0.5)
+    k = np.sqrt(kx**2 + ky**2) + 0.001
+    ker = (kx - 1.0j*ky)**2 / k**3
+    psi = np.fft.ifft2(psi)
+    psi = np.fft.ifftshift(psi)
+    psi *= ker
+    psi = np.fft.fftshift(psi)
+    psi = np.fft.fft2(psi)
+    return np.real(psi*np.conj(psi))
+
+
+def gradients(npix):
+    image = spheredhm([0, 0, 100], 0.75, 1.5, 1.339, [npix, npix])
+    image += np.random.normal(0, 0.01, image.shape)
+    dx = savgol2d(7, 3, dx=1)
+    dadx = -1 * edge_convolve(image, dx)
+    dady = -1 * edge_convolve(image, np.transpose(dx))
+    return dadx, dady, dx
+
+
+def timeit(func, *args, **kwargs):
+    start = perf_counter()
+    result = func(*args, **kwargs)
+    return result, perf_counter() - start
+
+
+def per_frame(func, dadx, dady, nframes=20):
+    func(dadx, dady)
+    start = perf_counter()
+    for _ in range(nframes):
+        func(dadx, dady)
+    return (perf_counter() - start) / nframes
+
+
+def main(npix=512):
+    dadx, dady, dx = gradients(npix)
+    b, tvoting = timeit(voting, dadx, dady, dx, noise=0.1)
+    _, torient = timeit(orientTrans, dadx, dady)
+    reference, tloop = timeit(looping_voting, dadx, dady, dx, noise=0.1)
+    print('{0}x{0} pixels'.format(npix))
+    print('looping voting:    {:.3f} s'.format(tloop))
+    print('vectorized voting: {:.3f} s'.format(tvoting))
+    print('orientTrans:       {:.3f} s'.format(torient))
+    print('votes agree: {}'.format(np.array_equal(b, reference)))
+    transform = OrientationalTransform()
+    tref = per_frame(reference_orientTrans, dadx, dady)
+    tcached = per_frame(transform, dadx, dady)
+    agree = np.allclose(transform(dadx, dady),
+                        reference_orientTrans(dadx, dady))
+    print('orientational transform per frame')
+    print('reference:         {:.2f} ms'.format(1e3*tref))
+    print('cached:            {:.2f} ms'.format(1e3*tcached))
+    print('transforms agree: {}'.format(agree))
+
+
+if __name__ == '__main__':
+    import sys
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Benchmark for the workspace-based LorenzMie.compute()
+
+Compares wall time and peak memory of LorenzMie.compute(), which
+updates preallocated buffers in place, with the reference
+implementation that allocates fresh temporaries for every order
+of the partial-wave sum. Each implementation runs in its own
+process so that peak resident set sizes can be compared.
+
+Usage: python bench_compute_workspace.py [npix]
+'''
+
+import multiprocessing
+import resource
+import tracemalloc
+from time import perf_counter
+import numpy as np
+from pylorenzmie.theory.LorenzMie import LorenzMie
+from pylorenzmie.theory.Instrument import coordinates
+
+
+def allocating_compute(ab, krv, mo1n, ne1n, es, ec,
+                       cartesian=True, bohren=True):
+    '''Reference implementation that allocates temporaries for every order
+
+    Arguments
+    ----------
+    ab : numpy.ndarray
+        [norders, 2] Mie scattering coefficients
+    krv : numpy.ndarray
+        [3, npts] Coordinates at which field is evaluated
+        relative to the center of the scatterer. Coordinates
+        are assumed to be multiplied by the wavenumber of
+        light in the medium, and so are dimensionless.
+
+    Fields for a batch of particles are computed together
+    by passing ab with shape [nparticles, norders, 2] and
+    krv and the buffers with shape [nparticles, 3, npts].
+
+    Keywords
+    --------
+    cartesian : bool
+        If set, return field projected onto Cartesian coordinates.
+        Otherwise, return polar projection.
+    bohren : bool
+        If set, use sign convention from Bohren and Huffman.
+        Otherwise, use opposite sign convention.
+
+    Returns
+    -------
+    field : numpy.ndarray
+        [3, npts] array of complex vector values of the
+        scattered field at each coordinate.
+        [nparticles, 3, npts] for a batch of particles.
+    '''
+
+    norders = ab.shape[-2]  # number of partial waves in sum
+
+    # GEOMETRY
+    # 1. particle displacement [pixel]
+    # Note: The sign convention used here is appropriate
+    # for illumination propagating in the -z direction.
+    # This means that a particle forming an image in the
+    # focal plane (z = 0) is located at positive z.
+    # Accounting for this by flipping the axial coordinate
+    # is equivalent to using a mirrored (left-handed)
+    # coordinate system.
+    shape = krv.shape
+    kx = krv[..., 0, :]
+    ky = krv[..., 1, :]
+    kz = -krv[..., 2, :]
+
+    # 2. geometric factors
+    krho = np.sqrt(kx**2 + ky**2)
+    kr = np.sqrt(krho**2 + kz**2)
+
+    phi = np.arctan2(ky, kx)
+    cosphi = np.cos(phi)
+    sinphi = np.sin(phi)
+    theta = np.arctan2(krho, kz)
+    costheta = np.cos(theta)
+    sintheta = np.sin(theta)
+    sinkr = np.sin(kr)
+    coskr = np.cos(kr)
+
+    # SPECIAL FUNCTIONS
+    # starting points for recursive function evaluation ...
+    # 1. Riccati-Bessel radial functions, page 478.
+    # Particles above the focal plane create diverging waves
+    # described by Eq. (4.13) for $h_n^{(1)}(kr)$. These have z > 0.
+    # Those below the focal plane appear to be converging from the
+    # perspective of the camera. They are descrinbed by Eq. (4.14)
+    # for $h_n^{(2)}(kr)$, and have z < 0. We can select the
+    # appropriate case by applying the correct sign of the imaginary
+    # part of the starting functions...
+    if bohren:
+        factor = 1.j * np.sign(kz)
+    else:
+        factor = -1.j * np.sign(kz)
+
+    xi_nm2 = coskr + factor * sinkr  # \xi_{-1}(kr)
+    xi_nm1 = sinkr - factor * coskr  # \xi_0(kr)
+
+    # 2. Angular functions (4.47), page 95
+    # \pi_0(\cos\theta)
+    pi_nm1 = np.zeros(shape=costheta.shape)
+    # \pi_1(\cos\theta)
+    pi_n = np.ones(shape=costheta.shape)
+
+    # 3. Vector spherical harmonics: [r,theta,phi]
+    mo1n[..., 0, :] = 0.j                 # no radial component
+
+    # storage for scattered field
+    es.fill(0.j)
+
+    # COMPUTE field by summing partial waves
+    for n in range(1, norders):
+        # upward recurrences ...
+        # 4. Legendre factor (4.47)
+        # Method described by Wiscombe (1980)
+
+        swisc = pi_n * costheta
+        twisc = swisc - pi_nm1
+        tau_n = pi_nm1 - n * twisc  # -\tau_n(\cos\theta)
+
+        # ... Riccati-Bessel function, page 478
+        xi_n = (2. * n - 1.) * (xi_nm1 / kr) - xi_nm2  # \xi_n(kr)
+
+        # ... Deirmendjian's derivative
+        dn = (n * xi_n) / kr - xi_nm1
+
+        # vector spherical harmonics (4.50)
+        mo1n[..., 1, :] = pi_n * xi_n   # ... divided by cosphi/kr
+        mo1n[..., 2, :] = tau_n * xi_n  # ... divided by sinphi/kr
+
+        # ... divided by cosphi sintheta/kr^2
+        ne1n[..., 0, :] = n * (n + 1.) * pi_n * xi_n
+        ne1n[..., 1, :] = tau_n * dn    # ... divided by cosphi/kr
+        ne1n[..., 2, :] = pi_n * dn     # ... divided by sinphi/kr
+
+        # prefactor, page 93
+        en = 1.j**n * (2. * n + 1.) / n / (n + 1.)
+
+        # the scattered field in spherical coordinates (4.45)
+        an = ab[..., n, 0, None, None]
+        bn = ab[..., n, 1, None, None]
+        es += (1.j * en * an) * ne1n
+        es -= (en * bn) * mo1n
+
+        # upward recurrences ...
+        # ... angular functions (4.47)
+        # Method described by Wiscombe (1980)
+        pi_nm1 = pi_n
+        pi_n = swisc + ((n + 1.) / n) * twisc
+
+        # ... Riccati-Bessel function
+        xi_nm2 = xi_nm1
+        xi_nm1 = xi_n
+        # n: multipole sum
+
+    # geometric factors were divided out of the vector
+    # spherical harmonics for accuracy and efficiency ...
+    # ... put them back at the end.
+    radialfactor = 1. / kr
+    es[..., 0, :] *= cosphi * sintheta * radialfactor**2
+    es[..., 1, :] *= cosphi * radialfactor
+    es[..., 2, :] *= sinphi * radialfactor
+
+    # By default, the scattered wave is returned in spherical
+    # coordinates.  Project components onto Cartesian coordinates.
+    # Assumes that the incident wave propagates along z and
+    # is linearly polarized along x
+
+    if cartesian:
+        esr = es[..., 0, :]
+        est = es[..., 1, :]
+        esp = es[..., 2, :]
+        ec[..., 0, :] = esr * sintheta * cosphi
+        ec[..., 0, :] += est * costheta * cosphi
+        ec[..., 0, :] -= esp * sinphi
+
+        ec[..., 1, :] = esr * sintheta * sinphi
+        ec[..., 1, :] += est * costheta * sinphi
+        ec[..., 1, :] += esp * cosphi
+        ec[..., 2, :] = (esr * costheta -
+                         est * sintheta)
+        return ec
+    else:
+        return es
+
+
+def setup(npix):
+    model = LorenzMie(coordinates=coordinates([npix, npix]))
+    model.instrument.wavelength = 0.447
+    model.instrument.magnification = 0.048
+    model.instrument.n_m = 1.34
+    p = model.particle
+    p.r_p = [npix/2 + 0.3, npix/2 - 0.2, 200.]
+    p.a_p = 1.5
+    p.n_p = 1.45
+    k = model.instrument.wavenumber()
+    krv = k * (model.coordinates - p.r_p[:, None])
+    ab = p.ab(model.instrument.n_m, model.instrument.wavelength)
+    return model, ab, krv
+
+
+def run(name, npix, nrepeat=5):
+    model, ab, krv = setup(npix)
+    if name == 'workspace':
+        def compute():
+            return model.compute(ab, krv, *model.buffers,
+                                 workspace=model.workspace)
+    else:
+        def compute():
+            return allocating_compute(ab, krv, *model.buffers)
+    compute()
+    tracemalloc.start()
+    start = perf_counter()
+    for _ in range(nrepeat):
+        compute()
+    elapsed = (perf_counter() - start) / nrepeat
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return name, len(ab), elapsed, peak / 2**20, maxrss / 2**10
+
+
+def main(npix=400):
+    context = multiprocessing.get_context('spawn')
+    fmt = '{:>10s} {:>8d} {:>10.3f} {:>14.1f} {:>14.1f}'
+    print('{}x{} pixels'.format(npix, npix))
+    print('{:>10s} {:>8s} {:>10s} {:>14s} {:>14s}'.format(
+        'path', 'norders', 'time [s]', 'allocated [MB]', 'peak RSS [MB]'))
+    for name in ['allocating', 'workspace']:
+        with context.Pool(1) as pool:
+            print(fmt.format(*pool.apply(run, (name, npix))))
+
+
+if __name__ == '__main__':
+    import sys
+    main(*map(int, sys.argv[1:]))
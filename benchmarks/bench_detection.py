@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Benchmark for the circle transform of video frames
+
+Usage: pytest benchmarks/bench_detection.py
+'''
+
+import pytest
+from pylorenzmie.theory.spheredhm import spheredhm
+from pylorenzmie.detection.circletransform import circletransform
+
+
+@pytest.fixture(scope='module')
+def frame():
+    '''1280x1024 hologram of a sphere'''
+    return spheredhm([0, 0, 200], 0.75, 1.5, 1.339, [1280, 1024])
+
+
+@pytest.mark.benchmark(group='circletransform')
+def bench_circletransform(benchmark, frame):
+    b = circletransform(frame)
+    transform = benchmark(circletransform, frame)
+    assert transform.shape == b.shape
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Benchmarks for fitting holograms and sampling pixels
+
+Usage: pytest benchmarks/bench_fitting.py
+'''
+
+import pytest
+from pylorenzmie.analysis.Feature import Feature
+from pylorenzmie.analysis.Mask import Mask
+from pylorenzmie.theory.Instrument import coordinates
+
+
+def feature(data, instrument):
+    a = Feature(**instrument)
+    a.data = data
+    a.coordinates = coordinates(data.shape)
+    p = a.model.particle
+    p.r_p = [data.shape[0]//2, data.shape[1]//2, 330.]
+    p.a_p = 1.1
+    p.n_p = 1.4
+    return a
+
+
+@pytest.mark.benchmark(group='optimize')
+def bench_optimize(benchmark, crop_image, instrument):
+    result = benchmark.pedantic(lambda a: a.optimize(),
+                                setup=lambda: ((feature(crop_image,
+                                                        instrument),), {}),
+                                rounds=5)
+    assert result.success
+
+
+@pytest.mark.benchmark(group='mask')
+@pytest.mark.parametrize('distribution', ['fast', 'uniform', 'radial'])
+def bench_mask(benchmark, distribution):
+    mask = Mask(coordinates=coordinates([400, 400]),
+                distribution=distribution, percentpix=0.1, seed=1)
+
+    def sample():
+        mask.exclude = []
+        return mask.selected
+    selected = benchmark(sample)
+    assert selected.sum() > 0
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Accuracy and speed of single- versus double-precision holograms
+
+Computes the same hologram with LMHologram(precision='double')
+and LMHologram(precision='single') for particles of several sizes
+and reports the largest deviation of the single-precision result
+from the double-precision reference together with the time per
+hologram for each precision. Holograms are computed by
+LorenzMie.compute, which evaluates the recurrences and the
+partial-wave sum in float32 and complex64 in single precision.
+The relative error must remain below 1e-5, and single precision
+must be at least 1.2 times faster than double precision.
+
+Usage: python bench_precision.py [npix]
+'''
+
+from time import perf_counter
+import numpy as np
+from pylorenzmie.theory.LMHologram import LMHologram
+from pylorenzmie.theory.Instrument import coordinates
+
+
+def hologram(precision, npix, a_p, nrepeat=3):
+    model = LMHologram(coordinates=coordinates([npix, npix]),
+                       precision=precision, fused=False)
+    model.instrument.wavelength = 0.447
+    model.instrument.magnification = 0.048
+    model.instrument.n_m = 1.34
+    p = model.particle
+    p.r_p = [npix/2 + 0.3, npix/2 - 0.4, 200.]
+    p.a_p = a_p
+    p.n_p = 1.45
+    model.hologram()
+    start = perf_counter()
+    for _ in range(nrepeat):
+        holo = model.hologram()
+    elapsed = (perf_counter() - start) / nrepeat
+    return holo.astype(float), elapsed
+
+
+def main(npix=400, speedup=1.2):
+    print('{:>6} {:>12} {:>12} {:>10} {:>10} {:>8}'.format(
+        'a_p', 'max rel err', 'rms err', 'double [s]', 'single [s]',
+        'speedup'))
+    for a_p in (0.5, 1., 1.5, 2.5):
+        ref, tdouble = hologram('double', npix, a_p)
+        holo, tsingle = hologram('single', npix, a_p)
+        err = (holo - ref) / np.max(np.abs(ref))
+        maxerr = np.max(np.abs(err))
+        print('{:6.2f} {:12.2e} {:12.2e} {:10.3f} {:10.3f} {:8.2f}'.format(
+            a_p, maxerr, np.sqrt(np.mean(err**2)),
+            tdouble, tsingle, tdouble/tsingle))
+        assert maxerr < 1e-5, \
+            'single-precision error {:.2e} exceeds 1e-5'.format(maxerr)
+        assert tdouble > speedup * tsingle, \
+            'single precision is only {:.2f} times faster'.format(
+                tdouble/tsingle)
+
+
+if __name__ == '__main__':
+    import sys
+    main(*[int(arg) for arg in sys.argv[1:]])
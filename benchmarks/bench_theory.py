@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Benchmarks for Lorenz-Mie holograms and scattering coefficients
+
+Usage: pytest benchmarks/bench_theory.py
+'''
+
+import numpy as np
+import pytest
+from pylorenzmie.theory.LMHologram import LMHologram
+from pylorenzmie.theory.LorenzMie import LorenzMie
+from pylorenzmie.theory.Sphere import (Sphere, mie_coefficients,
+                                       batch_mie_coefficients)
+from pylorenzmie.theory.Instrument import coordinates
+from pylorenzmie.theory.CoefficientTable import CoefficientTable
+
+
+def sphere(x_p, y_p, z_p=200., a_p=1., n_p=1.45):
+    p = Sphere(a_p=a_p, n_p=n_p)
+    p.r_p = [x_p, y_p, z_p]
+    return p
+
+
+@pytest.mark.benchmark(group='hologram')
+@pytest.mark.parametrize('npix', [100, 400, 1000])
+def bench_hologram(benchmark, instrument, npix):
+    model = LMHologram(coordinates=coordinates([npix, npix]), **instrument)
+    model.particle = sphere(npix/2 + 0.3, npix/2 - 0.4)
+    holo = benchmark(model.hologram)
+    assert holo.size == npix**2
+
+
+@pytest.mark.benchmark(group='field')
+@pytest.mark.parametrize('nparticles', [1, 10, 50])
+def bench_field(benchmark, instrument, nparticles):
+    npix = 200
+    rng = np.random.default_rng(1)
+    model = LorenzMie(coordinates=coordinates([npix, npix]), **instrument)
+    model.particle = [sphere(*rng.uniform(0, npix, 2),
+                             z_p=rng.uniform(100., 300.),
+                             a_p=rng.uniform(0.5, 1.5))
+                      for _ in range(nparticles)]
+    field = benchmark(model.field)
+    assert field.shape == (3, npix**2)
+
+
+@pytest.mark.benchmark(group='mie_coefficients')
+@pytest.mark.parametrize('a_p', [0.2, 1., 3., 10.])
+def bench_mie_coefficients(benchmark, instrument, a_p):
+    n_m, wavelength = instrument['n_m'], instrument['wavelength']
+    mie_coefficients(a_p, 1.45, 0., n_m, wavelength)
+    ab = benchmark(mie_coefficients, a_p, 1.45, 0., n_m, wavelength)
+    assert np.all(np.isfinite(ab))
+
+
+@pytest.mark.benchmark(group='mie_coefficients')
+@pytest.mark.parametrize('nlayers', [2, 5])
+def bench_mie_coefficients_multilayer(benchmark, instrument, nlayers):
+    n_m, wavelength = instrument['n_m'], instrument['wavelength']
+    a_p = np.linspace(0.5, 2., nlayers)
+    n_p = np.linspace(1.6, 1.4, nlayers)
+    k_p = np.zeros(nlayers)
+    mie_coefficients(a_p, n_p, k_p, n_m, wavelength)
+    ab = benchmark(mie_coefficients, a_p, n_p, k_p, n_m, wavelength)
+    assert np.all(np.isfinite(ab))
+
+
+@pytest.mark.benchmark(group='batch_mie_coefficients')
+@pytest.mark.parametrize('nspheres', [100, 10000])
+def bench_batch_mie_coefficients(benchmark, instrument, nspheres):
+    n_m, wavelength = instrument['n_m'], instrument['wavelength']
+    a_p = np.linspace(0.2, 10., nspheres)
+    n_p = np.linspace(1.38, 1.6, nspheres)
+    batch_mie_coefficients(a_p[:2], n_p[:2], 0., n_m, wavelength)
+    ab, nmax = benchmark(batch_mie_coefficients, a_p, n_p, 0.,
+                         n_m, wavelength)
+    assert len(nmax) == nspheres
+
+
+@pytest.mark.benchmark(group='coefficient_table')
+def bench_coefficient_table(benchmark, instrument):
+    n_m, wavelength = instrument['n_m'], instrument['wavelength']
+    table = CoefficientTable(n_m=n_m, wavelength=wavelength)
+    ab = benchmark(table, 1.2345, 1.4567, 0., n_m, wavelength)
+    assert table.misses == 0
+    assert len(ab) == len(mie_coefficients(1.2345, 1.4567, 0.,
+                                           n_m, wavelength))
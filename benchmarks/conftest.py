@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+'''Configuration of the pytest-benchmark suite
+
+Timings are saved as JSON baselines in benchmarks/baselines.
+
+Usage:
+    pytest benchmarks                   run the benchmarks
+    pytest benchmarks --save-baseline   run and save a new baseline
+    pytest benchmarks --regression      compare with the latest baseline
+                                        and fail if any mean time has
+                                        increased by more than 10%
+    pytest benchmarks --regression=25   ... by more than 25%
+'''
+
+import os
+import pytest
+from pytest_benchmark.utils import (get_tag, parse_compare_fail)
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINES = os.path.join(THIS_DIR, 'baselines')
+CROP_IMAGE = os.path.join(THIS_DIR, '..', 'docs', 'tutorials', 'crop.png')
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('pylorenzmie benchmarks')
+    group.addoption('--save-baseline', action='store_true',
+                    help='Save timings as a JSON baseline')
+    group.addoption('--regression', nargs='?', const=10, type=int,
+                    default=None, metavar='PERCENT',
+                    help='Fail if mean times exceed the latest '
+                    'baseline by PERCENT. Default: 10')
+
+
+def pytest_configure(config):
+    option = config.option
+    if option.benchmark_storage == 'file://./.benchmarks':
+        option.benchmark_storage = 'file://' + BASELINES
+    if option.save_baseline:
+        option.benchmark_autosave = get_tag()
+    if option.regression is not None:
+        threshold = 'mean:{:d}%'.format(option.regression)
+        option.benchmark_compare = True
+        option.benchmark_compare_fail = [parse_compare_fail(threshold)]
+
+
+@pytest.fixture(scope='session')
+def instrument():
+    '''Properties of the instrument used in the tutorials'''
+    return dict(wavelength=0.447, magnification=0.048, n_m=1.34)
+
+
+@pytest.fixture(scope='session')
+def crop_image():
+    '''Normalized hologram from the tutorials'''
+    import cv2
+    import numpy as np
+    img = cv2.imread(CROP_IMAGE)
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY).astype(float)
+    return img / np.mean(img)
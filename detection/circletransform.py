@@ -2,83 +2,150 @@
 Author: Mark Hannel
 """
 
+import os
+import threading
 import numpy as np
-from pylorenzmie.detection.savgol2d import savgol2d
-from pylorenzmie.detection.edge_convolve import edge_convolve
-import random
+import scipy.fft
+from pylorenzmie.detection.savgol2d import savgol2d, savgol2d_factors
+from pylorenzmie.detection.edge_convolve import edge_gradient
+from pylorenzmie.utilities.profiling import timed
 from builtins import range
 
+try:
+   from numba import njit
+except ImportError:
+   njit = None
+
+try:
+   import pyfftw
+except ImportError:
+   pyfftw = None
+
+
+def rasterize(b, xp, yp, costheta, sintheta, rng, maxvotes):
+   """
+   Accumulate votes into b with vectorized numpy operations
+
+   Pixel i votes once for each pixel on the line
+   (xp + r costheta, yp + r sintheta) with -rng <= r < rng,
+   clipped to the edges of b.
+   """
+   ny, nx = b.shape
+   b = b.reshape(-1)
+   nvotes = 2*rng
+   last = np.cumsum(nvotes)
+   first = last - nvotes
+   start = 0
+   while start < len(rng):
+      # Batch of pixels whose votes fit in maxvotes
+      end = np.searchsorted(last, first[start] + maxvotes, side='right')
+      end = max(end, start + 1)
+      owner = np.repeat(np.arange(start, end), nvotes[start:end])
+      r = np.arange(first[start], last[end-1]) - first[owner] - rng[owner]
+      x = np.clip(xp[owner] + r * costheta[owner], 0, nx-1).astype(int)
+      y = np.clip(yp[owner] + r * sintheta[owner], 0, ny-1).astype(int)
+      ndx = y * nx + x
+      # Lines are monotonic, so repeated pixels are consecutive
+      vote = np.ones(len(ndx), dtype=bool)
+      vote[1:] = (ndx[1:] != ndx[:-1]) | (owner[1:] != owner[:-1])
+      b += np.bincount(ndx[vote], minlength=ny*nx)
+      start = end
+
+
+if njit is not None:
+   @njit(cache=True)
+   def cast(b, xp, yp, costheta, sintheta, rng):
+      """
+      Accumulate votes into b with a compiled loop over pixels
+
+      See rasterize.
+      """
+      ny, nx = b.shape
+      for i in range(len(xp)):
+         lastx = -1
+         lasty = -1
+         for r in range(-rng[i], rng[i]):
+            x = xp[i] + r * costheta[i]
+            x = int(min(max(x, 0.), nx - 1.))
+            y = yp[i] + r * sintheta[i]
+            y = int(min(max(y, 0.), ny - 1.))
+            if x != lastx or y != lasty:
+               b[y, x] += 1
+               lastx = x
+               lasty = y
+else:
+   cast = None
+
 def voting(dadx, dady, dx, noise = 0.01, deinterlace=False,
-               sample=1):
+               sample=1, maxvotes=2**22):
    """
    voting performs a voting algorithm based on low-noise gradients.
+
+   Each pixel with a significant gradient casts one vote for each
+   pixel on a line through the pixel in the direction of the
+   gradient. The length of the line is set by the angular
+   uncertainty of the gradient. Votes are cast by a compiled
+   kernel if numba is available. Otherwise, they are rasterized
+   for all pixels at once in batches of at most maxvotes votes.
+
+   Inputs:
+   dadx, dady: [ny, nx] gradients of the image
+   dx: derivative kernel used to compute the gradients
+
+   Keyword Parameters:
+   noise: estimate for additive pixel noise. Default: 0.01
+   deinterlace: if set, the gradients were computed for one field
+        of an interlaced image, with rows separated by two pixels.
+        Votes are cast in the coordinates of the field.
+   sample: fraction of pixels with significant gradients that
+        are selected at random to vote. Default: 1 (all pixels)
+   maxvotes: largest number of votes rasterized in one batch
+
+   Outputs:
+   b: [ny, nx] accumulator array with number of votes at each pixel
    """
 
    # Get the shape of the image.
-   nx, ny = dadx.shape
-   
+   ny, nx = dadx.shape
+
    if noise is None:
-      noise = mad(a)
+      noise = 0.01
 
    # Calculate the magnitude of the gradients.
    grada = np.sqrt(dadx**2 + dady**2)             # magnitude of the gradient
-   dgrada = noise * np.sqrt(2. * sum(sum(dx**2))) # error in gradient 
+   dgrada = noise * np.sqrt(2. * np.sum(dx**2))   # error in gradient
                                                    # magnitude due to noise
 
    # Calculate where the gradient is significant.
-   w = np.where(grada > 2.*dgrada)      # only consider votes with small 
-                                        # angular uncertainty
+   yp, xp = np.nonzero(grada > 2.*dgrada)  # only consider votes with small
+                                           # angular uncertainty
 
-   npts = len(w[0])
-   b = np.zeros([nx, ny], dtype=int)      # accumulator array for the result
+   npts = len(xp)
+   b = np.zeros([ny, nx], dtype=int)      # accumulator array for the result
 
-   if npts <= 0 : 
+   if npts <= 0 :
       return b
 
-   yp, xp = np.mod(w,nx)         # coordinates of pixels with strong gradients
-
-   if deinterlace: 
-      yp = 2*yp + n0
-
-   grada = grada[w[0],w[1]]      # gradient direction at each pixel
-  
-   dgrada = dgrada/grada
-   costheta = dadx[w[0],w[1]] / grada
-   sintheta = dady[w[0],w[1]] / grada
-
-   rng = list(map(round,2./np.tan(dgrada/2.)))
-   rng = np.array([ i if i < nx or i == -np.inf else nx for i in rng])
-   mrange = int(max(rng))
-   r = np.arange(2*mrange+1,dtype=float) - mrange
-
-   nx -= 1
-   ny -= 1
-
    if sample != 1:
-      randInts = [random.randint(0,npts-1) for i in range(int(sample*npts))]
-      xp = xp[randInts]
-      yp = yp[randInts]
-      rng = rng[randInts]
-      costheta = costheta[randInts]
-      sintheta = sintheta[randInts]
-
-   npts = int(sample*npts)
-
-   for i in range(npts):
-      start = int(mrange-rng[i])
-      end = int(mrange+rng[i])
-      rr = r[start:end]
-      x = (xp[i] + rr * costheta[i])
-      x = [l if l > 0 else 0 for l in x]
-      x = [m if m < nx else nx for m in x]
-
-      y = (yp[i] + rr * sintheta[i])
-      y = [l if l > 0 else 0 for l in y]
-      y = [m if m < ny else ny for m in y]
-      
-      b[list(map(int,y)),list(map(int,x))] += 1
-
-   # borders are over-counted because of > and <
+      ndx = np.random.randint(0, npts, int(sample*npts))
+      yp = yp[ndx]
+      xp = xp[ndx]
+
+   grada = grada[yp, xp]         # gradient direction at each pixel
+   costheta = dadx[yp, xp] / grada
+   sintheta = dady[yp, xp] / grada
+   if deinterlace:
+      sintheta /= 2.             # rows of a field are two pixels apart
+
+   # Each pixel casts 2*rng votes at distances -rng <= r < rng
+   rng = np.round(2./np.tan(dgrada/grada/2.))
+   rng = np.minimum(rng, max(nx, ny)).astype(int)
+   if cast is not None:
+      cast(b, xp, yp, costheta, sintheta, rng)
+   else:
+      rasterize(b, xp, yp, costheta, sintheta, rng, maxvotes)
+
+   # borders are over-counted because of clipping
    b[0, :] = 0
    b[:, 0] = 0
    b[:, -1] = 0
@@ -86,46 +153,186 @@ def voting(dadx, dady, dx, noise = 0.01, deinterlace=False,
 
    return b
 
-def orientTrans(dadx, dady, deinterlace=False):
+class OrientationalTransform(object):
    """
-   The orientational transform
+   The orientational transform with cached kernel and FFT workspaces
+
+   The Fourier-space orientational alignment kernel depends only on
+   the shape of the frame. It is computed once per shape, with the
+   shifts that center it and the normalization of the inverse
+   transform folded in. The order parameter is built in a reusable
+   complex workspace and transformed in place with pyFFTW plans if
+   pyFFTW is installed, and with scipy.fft otherwise.
+
+   ...
+
+   Properties
+   ----------
+   shape : tuple
+       (ny, nx) shape of the most recent frame
+   deinterlace : bool
+       If set, account for gradients computed from one field of
+       an interlaced frame.
+   workers : int
+       Number of threads used for FFTs. Negative values count
+       back from the number of cores. Default: -1 (all cores)
+   kernel : numpy.ndarray
+       Shifted and normalized alignment kernel for shape.
+
+   Methods
+   -------
+   transform(dadx, dady) : numpy.ndarray
+       Returns the orientational transform of the image gradients.
+       Instances also may be called directly.
    """
 
-   ny, nx = dadx.shape
-
-   # orientational order parameter
-   # psi = |\nabla a|**2 \exp(i 2 \theta)
-   psi = dadx + 1.0j*dady ### FIX: May need to swap dadx, dady.
-                          ### May also be faster not to use addition
-   psi *= psi
-
-   # Fourier transform of the orientational alignment kernel:
-   # K(k) = e**(-2 i \theta) / k
-   x_row = np.arange(nx)/float(nx) - 0.5
-   y_col = np.arange(ny)/float(ny) - 0.5
+   def __init__(self, shape=None, deinterlace=False, workers=-1):
+      self._shape = None
+      self._deinterlace = bool(deinterlace)
+      self.workers = workers
+      self.shape = shape
+
+   @property
+   def shape(self):
+      return self._shape
+
+   @shape.setter
+   def shape(self, shape):
+      shape = None if shape is None else tuple(shape)
+      if shape != self._shape:
+         self._shape = shape
+         self._allocate()
+
+   @property
+   def deinterlace(self):
+      return self._deinterlace
+
+   @deinterlace.setter
+   def deinterlace(self, deinterlace):
+      deinterlace = bool(deinterlace)
+      if deinterlace != self._deinterlace:
+         self._deinterlace = deinterlace
+         self._allocate()
+
+   @property
+   def workers(self):
+      return self._workers
+
+   @workers.setter
+   def workers(self, workers):
+      if workers < 0:
+         workers = max(1, os.cpu_count() + 1 + workers)
+      self._workers = int(workers)
+      if self._shape is not None:
+         self._allocate()
+
+   @property
+   def kernel(self):
+      return self._kernel
+
+   def _allocate(self):
+      '''Compute kernel and plan FFTs for the current shape'''
+      self._kernel = None
+      self._psi = None
+      if self._shape is None:
+         return
+      ny, nx = self._shape
+
+      # Fourier transform of the orientational alignment kernel:
+      # K(k) = e**(-2 i \theta) / k
+      kx = np.arange(nx)/float(nx) - 0.5
+      ky = np.arange(ny)/float(ny) - 0.5
+      if self._deinterlace:
+         ky /= 2.
+      kx, ky = np.meshgrid(kx, ky)
+      k = np.sqrt(kx**2 + ky**2) + 0.001
+      ker = (kx - 1.0j*ky)**2 / k**3
+
+      # Shifting the transform to center the kernel, and shifting
+      # back, is equivalent to shifting the kernel. The kernel
+      # also normalizes the inverse transform.
+      self._kernel = np.fft.fftshift(ker) / (nx * ny)
+
+      if pyfftw is None:
+         self._psi = np.empty(self._shape, dtype=complex)
+         return
+      self._psi = pyfftw.empty_aligned(self._shape, dtype=complex)
+      work = pyfftw.empty_aligned(self._shape, dtype=complex)
+      flags = ('FFTW_MEASURE', 'FFTW_DESTROY_INPUT')
+      self._ifft = pyfftw.FFTW(self._psi, work, axes=(0, 1),
+                               direction='FFTW_BACKWARD',
+                               flags=flags, threads=self._workers)
+      self._fft = pyfftw.FFTW(work, self._psi, axes=(0, 1),
+                              direction='FFTW_FORWARD',
+                              flags=flags, threads=self._workers)
+
+   def _convolve(self):
+      '''Convolve order parameter with kernel'''
+      if pyfftw is not None:
+         self._ifft.execute()
+         self._ifft.output_array *= self._kernel
+         self._fft.execute()
+         return self._psi
+      psi = scipy.fft.ifft2(self._psi, norm='forward',
+                            workers=self._workers, overwrite_x=True)
+      psi *= self._kernel
+      return scipy.fft.fft2(psi, workers=self._workers, overwrite_x=True)
+
+   def transform(self, dadx, dady):
+      '''Orientational transform of image gradients
+
+      Arguments
+      ---------
+      dadx, dady : numpy.ndarray
+          [ny, nx] components of the intensity gradient
+
+      Returns
+      -------
+      b : numpy.ndarray
+          [ny, nx] orientational transform
+      '''
+      self.shape = dadx.shape
+
+      # orientational order parameter
+      # psi = |\nabla a|**2 \exp(i 2 \theta)
+      psi = self._psi
+      psi.real[...] = dadx ### FIX: May need to swap dadx, dady.
+      psi.imag[...] = dady
+      np.square(psi, out=psi)
+
+      # convolve orientational order parameter with
+      # orientational alignment kernel using
+      # Fourier convolution theorem
+      psi = self._convolve()
+
+      # intensity of convolution identifies rotationally
+      # symmetric centers
+      b = np.square(psi.real)
+      b += np.square(psi.imag)
+      return b
 
-   kx, ky = np.meshgrid(x_row,y_col)
+   __call__ = transform
 
-   if deinterlace : 
-      ky /= 2.
 
-   k   = np.sqrt(kx**2 + ky**2) + 0.001
-   ker = (kx - 1.0j*ky)**2 / k**3
+_local = threading.local()
 
-   # convolve orientational order parameter with
-   # orientational alignment kernel using
-   # Fourier convolution theorem
-   psi = np.fft.ifft2(psi)
-   psi = np.fft.ifftshift(psi)
-   psi *= ker
-   psi = np.fft.fftshift(psi)
-   psi = np.fft.fft2(psi)
+def orientTrans(dadx, dady, deinterlace=False):
+   """
+   The orientational transform
 
-   # intensity of convolution identifies rotationally
-   # symmetric centers
+   Reuses the kernel and FFT workspaces of an
+   OrientationalTransform for frames of the same shape.
+   Each thread has its own OrientationalTransform.
+   """
 
-   return np.real(psi*np.conj(psi))
+   transform = getattr(_local, 'transform', None)
+   if transform is None:
+      transform = OrientationalTransform()
+      _local.transform = transform
+   transform.deinterlace = deinterlace
+   return transform(dadx, dady)
 
+@timed('circletransform')
 def circletransform(a_, theory='orientTrans', noise=None, mrange=0, 
                     deinterlace=False, sample=1):
    """
@@ -174,18 +381,18 @@ def circletransform(a_, theory='orientTrans', noise=None, mrange=0,
    else:
       a = a_
 
+   # convolution reverses the kernel, and thus the sign of the gradient
    dx = savgol2d(7, 3, dx = 1)
-   
-   dadx = -1 * edge_convolve(a, dx)       #FIXME:  Figure out why edge_convolve 
-                                          #returns negative answer.
-   dady = -1 * edge_convolve(a, np.transpose(dx))
-   
+   factors = [(-column, row)
+              for column, row in savgol2d_factors(7, 3, dx = 1)]
+   dadx, dady = edge_gradient(a, -dx, factors=factors)
+
    if dodeinterlace : 
       dady /= 2.    
 
    if theory == 'voting':
-      return voting(dadx, dady, dx, noise=0.1, 
-                        deinterlace=False, sample=0.8)
+      return voting(dadx, dady, dx, noise=noise or 0.1,
+                    deinterlace=dodeinterlace, sample=sample)
 
    if theory == 'orientTrans':
       return orientTrans(dadx, dady)
@@ -7,13 +7,15 @@
 #
 # PURPOSE:
 #    Convolves an array with a kernel and returns the result.  The array
-#    is manipulated so that the edges
+#    is manipulated so that the edges are extended by repeating the
+#    values of the edge pixels.
 #
 # CATEGORY:
 #    Math routine
 #
 # CALLING SEQUENCE:
 #    result = edge_convolve(a,k)
+#    dadx, dady = edge_gradient(a,k)
 #
 # INPUTS:
 #    a: [nx, ny] image data
@@ -28,7 +30,11 @@
 
 import numpy as nmp
 from scipy import ndimage
-from builtins import range
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
 
 def extend_array(a,n,m=0):
     """
@@ -38,39 +44,59 @@ def extend_array(a,n,m=0):
         print('a must be an numpy array')
         return -1
 
-    new = nmp.empty([a.shape[0]+2*n,a.shape[1]+2*m])
-    new[n:-n,m:-m] = a
-
-    #Grab the corner values
-    top_left  = a[ 0, 0]*nmp.ones(n)
-    top_right = a[ 0,-1]*nmp.ones(n)
-    bot_left  = a[ -1,0]*nmp.ones(n)
-    bot_right = a[-1,-1]*nmp.ones(n)
+    return nmp.pad(nmp.asarray(a, dtype=float), ((n, n), (m, m)),
+                   mode='edge')
 
-    #Grab sides
-    top_side   = a[ 0, :]
-    bot_side   = a[-1, :]
-    left_side  = a[ :, 0]
-    right_side = a[ :,-1]
+def _check(a, k):
+    """
+    Returns a and k as float arrays, or None if they are invalid
+    """
+    try: 
+        a = nmp.asarray(a, dtype=float)
+    except (TypeError, ValueError):
+        print('a must be array-like')
+        return None
+
+    try: 
+        k = nmp.asarray(k, dtype=float)
+    except (TypeError, ValueError):
+        print('k must be array-like')
+        return None
     
-    for i in range(0,n):
-        new[ i,m:-m] = top_side      #Repeat the top side of a
-        new[-i-1,m:-m] = bot_side    #Repeat the bottom side of a
-        
-    for j in range(0,m):
-        new[n:-n, j]   = left_side   #Repeat the left side of a
-        new[n:-n,-j-1] = right_side  #Repeat the right side of a
-        new[ j,0:n]    = top_left    #Fill the top left corner
-        new[-j-1,0:n]  = bot_left    #Fill the bottom left corner
-        new[ j,-n:]    = top_right   #Fill the top right corner
-        new[-j-1,-n:]  = bot_right   #Fill the bottom right corner
-
-    return new
+    if a.ndim != 2:
+        print('a must be a 2D array of floats or ints')
+        return None
+
+    if k.ndim != 2:
+        print('k must be a 1D or 2D array of floats or ints')
+        return None
+
+    if a.shape[0] < k.shape[0] or a.shape[1] < k.shape[1]:
+        print('k must have smaller dimensions than a')
+        return None
+
+    return a, k
+
+def _separable_convolve(a, factors):
+    """
+    Sums convolutions of a with separable factors
+    """
+    result = None
+    for column, row in factors:
+        # filters are correlations: reverse the factors to convolve
+        term = cv2.sepFilter2D(a, cv2.CV_64F, row[::-1], column[::-1],
+                               borderType=cv2.BORDER_REPLICATE)
+        if result is None:
+            result = term
+        else:
+            result += term
+    return result
 
 def edge_convolve(a,k):
     """
     Convolves an array with a kernel and returns the result.  The array
-    is manipulated so that the edges
+    is manipulated so that the edges are extended by repeating the
+    values of the edge pixels as far as the kernel reaches.
 
     Inputs:
     a: [nx, ny] image data
@@ -83,45 +109,49 @@ def edge_convolve(a,k):
     >>> result = edge_convolve(a,k)
     """
 
-    if type(a) != nmp.ndarray:
-        try: 
-            a = nmp.array(a)
-        except ValueError:
-            print('a must be array-like')
-            return -1
-
-    if type(k) != nmp.ndarray:
-        try: 
-            k = nmp.array(k)
-        except ValueError:
-            print('k must be array-like')
-            return -1
-    
-    if a.ndim != 2:
-        print('a must be a 2D array of floats or ints')
+    args = _check(a, k)
+    if args is None:
         return -1
+    a, k = args
 
-    if k.ndim != 2:
-        print('k must be a 1D or 2D array of floats or ints')
-        return -1
-    
-    a_x = a.shape[0]
-    a_y = a.shape[1]
+    return ndimage.convolve(a, k, mode='nearest')
 
-    k_x = k.shape[0]
-    k_y = k.shape[1]
+def edge_gradient(a,k,factors=None):
+    """
+    Convolves an array with a derivative kernel and with its transpose.
+    Edges are handled as in edge_convolve. If the separable factors of
+    an odd-sized kernel are provided and OpenCV is installed, the
+    convolutions are computed as sums of separable convolutions, which
+    requires fewer operations for kernels of low rank, such as
+    Savitzky-Golay derivative kernels.
 
-    if a_x < k_x or a_y < k_y:
-        print('k must have smaller dimensions than a')
-        return -1
+    Inputs:
+    a: [nx, ny] image data
+    k: [kx, ky] kernel (dimensions must be less than that of a
 
-    #Extend the edges of a
-    #x_repeat = a.shape[0]/2
-    #y_repeat = a.shape[1]/2
-    x_repeat = 1
-    y_repeat = 1
+    Keywords:
+    factors: list of (column, row) pairs whose outer products
+        sum to k, such as computed by savgol2d_factors
+        Default: None (two-dimensional convolutions)
 
-    
-    a = extend_array(a,x_repeat,y_repeat)
+    Outputs:
+    dadx: [nx, ny] convolution of a with k
+    dady: [nx, ny] convolution of a with the transpose of k
 
-    return ndimage.convolve(a,k)[x_repeat:-x_repeat,y_repeat:-y_repeat]
+    Example:
+    >>> dx = savgol2d(7, 3, dx=1)
+    >>> factors = savgol2d_factors(7, 3, dx=1)
+    >>> dadx, dady = edge_gradient(a, dx, factors=factors)
+    """
+
+    args = _check(a, k)
+    if args is None:
+        return -1
+    a, k = args
+
+    if factors is None or cv2 is None or not all(nmp.mod(k.shape, 2)):
+        return (ndimage.convolve(a, k, mode='nearest'),
+                ndimage.convolve(a, k.T, mode='nearest'))
+    dadx = _separable_convolve(a, factors)
+    dady = _separable_convolve(a, [(row, column) for column, row in factors])
+    return dadx, dady
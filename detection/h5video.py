@@ -4,6 +4,9 @@ Author: Mark Hannel
 
 import numpy as np
 import h5py
+from concurrent.futures import ThreadPoolExecutor
+from collections import (deque, OrderedDict)
+from threading import Lock
 
 class TagArray(np.ndarray):
 
@@ -22,9 +25,47 @@ class TagArray(np.ndarray):
         self.frame_no = getattr(obj, 'frame_no', None)
 
 class h5video(object):
-    def __init__(self, filename, mode='r'):
+    '''
+    Random-access reader for videos stored in HDF5 files
+
+    Frames are stored either as a group of two-dimensional
+    datasets named by timestamp, 'images/<timestamp>', or as a
+    single three-dimensional dataset, 'images'. The video is a
+    lazily indexed sequence of frames: indexing reads frames from
+    the file and returns them as TagArrays whose frame_no is the
+    index of the frame. Uncompressed contiguous datasets are
+    memory-mapped, so that frames are views into the file.
+    Datasets in a group are opened when their frames are first
+    read, and the most recently used of them are kept open.
+
+    Iterating over the video reads blocks of consecutive frames
+    in bulk on a background thread, reading ahead of the frames
+    that have been returned. Frames of memory-mapped datasets are
+    copied into memory by the background thread, so that reading
+    from the file does not block the consumer.
+
+    Keywords:
+        mode: mode for opening the file. Default: 'r'
+        blocksize: number of frames read in bulk. Default: the
+            chunk length of a chunked three-dimensional dataset,
+            otherwise 16
+        prefetch: number of frames read ahead while iterating.
+            Default: 4 blocks
+        cachesize: number of datasets in a group that are kept
+            open. Default: 64
+
+    Example:
+    >>> with h5video('example.h5') as vid:
+    ...     for frame in vid:
+    ...         process(frame, frame.frame_no)
+    '''
+    def __init__(self, filename, mode='r', blocksize=None, prefetch=None,
+                 cachesize=64):
         self.filename = filename
         self.mode = mode
+        self.blocksize = blocksize
+        self.prefetch = prefetch
+        self.cachesize = cachesize
         self.image = None
         self.index = None
         self.dim = None
@@ -33,31 +74,137 @@ class h5video(object):
 
     def __enter__(self):
         self.f = h5py.File(self.filename, self.mode)
-        self.keys = self.f['images/'].keys()
-        self.frames = self.f['images/'].values()
-        self.nframes = len(self.frames)
+        images = self.f['images']
+        if isinstance(images, h5py.Dataset):
+            self.keys = list(range(images.shape[0]))
+            self._datasets = None
+            self._stack = self._memmap(images)
+            self.dim = images.shape[1:]
+            if self.blocksize is None and images.chunks is not None:
+                self.blocksize = images.chunks[0]
+        else:
+            self.keys = list(images.keys())
+            self._group = images
+            self._datasets = OrderedDict()
+            self._lock = Lock()
+            self._stack = None
+            self.dim = images[self.keys[0]].shape if self.keys else None
+        self.blocksize = self.blocksize or 16
+        self.prefetch = self.prefetch or 4 * self.blocksize
+        self.frames = self
+        self.nframes = len(self.keys)
         self.image = self.rewind()
-        self.dim = self.f['images/' + self.keys[0]].shape
         return self
 
     def __exit__(self, *args):
+        self._datasets = self._stack = self._group = None
         self.f.close()
 
+    def _memmap(self, dataset):
+        '''Memory map of an uncompressed contiguous dataset.
+        Other datasets are returned unchanged.'''
+        if self.mode != 'r' or dataset.chunks is not None:
+            return dataset
+        offset = dataset.id.get_offset()
+        if offset is None or dataset.dtype.hasobject:
+            return dataset
+        return np.memmap(self.filename, dtype=dataset.dtype, mode='r',
+                         offset=offset, shape=dataset.shape)
+
+    def _dataset(self, n):
+        '''Dataset of frame n in a group, opened on demand'''
+        with self._lock:
+            dataset = self._datasets.get(n)
+            if dataset is not None:
+                self._datasets.move_to_end(n)
+                return dataset
+            dataset = self._memmap(self._group[self.keys[n]])
+            self._datasets[n] = dataset
+            if len(self._datasets) > self.cachesize:
+                self._datasets.popitem(last=False)
+            return dataset
+
+    def __len__(self):
+        return self.nframes
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.nframes)
+            if step != 1:
+                return [self[n] for n in range(start, stop, step)]
+            return self.read(start, stop)
+        if index < 0:
+            index += self.nframes
+        if index < 0 or index >= self.nframes:
+            raise IndexError('frame index out of range')
+        return self.read(index, index + 1)[0]
+
+    def __iter__(self):
+        return self.iterate()
+
+    def read(self, start, stop, copy=False):
+        '''
+        Reads consecutive frames in bulk
+
+        Keywords:
+            copy: if set, frames of memory-mapped datasets are
+                read into memory. Otherwise they are views into
+                the file, which are read when they are accessed.
+                Default: False
+
+        Returns:
+            frames: list of TagArrays for frames start to stop-1.
+                Frames of a three-dimensional dataset are views
+                into one array.
+        '''
+        if self._stack is not None:
+            block = self._load(self._stack[start:stop], copy)
+            return [TagArray(frame, frame_no=n)
+                    for n, frame in zip(range(start, stop), block)]
+        return [TagArray(self._load(self._dataset(n)[()], copy), frame_no=n)
+                for n in range(start, stop)]
+
+    @staticmethod
+    def _load(array, copy):
+        '''Returns array as an ndarray, read into memory if copy is set'''
+        if copy and isinstance(array, np.memmap):
+            return np.array(array)
+        return np.asarray(array)
+
+    def iterate(self, start=0, stop=None):
+        '''
+        Yields frames start to stop-1, reading blocks of
+        frames on a background thread
+        '''
+        stop = self.nframes if stop is None else min(stop, self.nframes)
+        nblocks = max(1, -(-self.prefetch // self.blocksize))
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            for first in range(start, stop, self.blocksize):
+                last = min(first + self.blocksize, stop)
+                pending.append(pool.submit(self.read, first, last, True))
+                if len(pending) > nblocks:
+                    for frame in pending.popleft().result():
+                        yield frame
+            while pending:
+                for frame in pending.popleft().result():
+                    yield frame
+
     def get_image(self):
         try:
-            self.image = self.frames[self.index]
+            self.image = self[self.index]
             return self.image
         except IndexError:
             print("Index is out of range.")
             raise IndexError
-            
+
     def get_time(self):
         return self.keys[self.index]
 
     def rewind(self):
         self.index = 0
         self.eof = False
-        return self.get_image()
+        return self.get_image() if self.nframes > 0 else None
 
     def next(self):
         if self.eof:
@@ -87,14 +234,14 @@ def example():
         plt.show()
 
         vid.goto(220)
-        
+
         plt.imshow(vid.get_image()/bg)
         plt.gray()
         plt.show()
-        
+
         print('Example timestamp: {}'.format(vid.get_time()))
         print('Dimension of image: {}'.format(vid.dim))
         print('Number of frames: {}'.format(vid.nframes))
-    
+
 if __name__ == '__main__':
     example()
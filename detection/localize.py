@@ -2,10 +2,18 @@
 
 from pylorenzmie.detection.h5video import TagArray
 from pylorenzmie.detection.circletransform import circletransform
+from pylorenzmie.utilities.radial import fringe_extent
+from pylorenzmie.utilities.profiling import timed
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from functools import lru_cache
+from itertools import count
+import os
 import trackpy as tp
 import numpy as np
 
 
+@timed('localize')
 def localize(image,
              locate_params={'diameter': 31,
                             'minmass': 30.},
@@ -33,17 +41,62 @@ def localize(image,
     feats['w'] = 400.
     feats['h'] = 400.
     features = np.array(feats[['x', 'y', 'w', 'h']])
-    for idx, feature in enumerate(features):
-        s = feature_extent(image, (feature[0], feature[1]),
-                           nfringes=nfringes,
-                           maxrange=maxrange)
-        if crop_threshold is not None and s > crop_threshold:
-            s = crop_threshold
-        features[idx][2] = s
-        features[idx][3] = s
+    if len(features) > 0:
+        s = feature_extents(image, features[:, 0:2],
+                            nfringes=nfringes,
+                            maxrange=maxrange)
+        if crop_threshold is not None:
+            s = np.minimum(s, crop_threshold)
+        features[:, 2] = s
+        features[:, 3] = s
     return features, circ
 
 
+def detect_stream(frames,
+                  workers=None,
+                  backlog=None,
+                  **kwargs):
+    '''
+    Localize features in a stream of frames.
+
+    Frames are read from the iterator while earlier frames are
+    being localized by a pool of worker threads. At most backlog
+    frames are held in memory at any time, so that frames can be
+    streamed from an h5video or an OpenCV reader without loading
+    the whole video.
+
+    Args:
+        frames: iterable of normalized images with median near 1.
+            Frames that have a frame_no attribute, such as TagArray,
+            are numbered by that attribute. Other frames are
+            numbered by their position in the stream.
+    Keywords:
+        workers: number of worker threads. Default: os.cpu_count()
+        backlog: maximum number of frames read and not yet
+            yielded. Default: 2*workers
+        kwargs: keywords for localize
+    Yields:
+        frame_no: frame number
+        features: [x, y, w, h] bounding box of each feature
+    '''
+    workers = workers or os.cpu_count()
+    backlog = backlog or 2 * workers
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for n, frame in zip(count(), frames):
+            frame_no = getattr(frame, 'frame_no', None)
+            frame_no = n if frame_no is None else frame_no
+            future = pool.submit(localize, np.asarray(frame),
+                                 frame_no=frame_no, **kwargs)
+            pending.append((frame_no, future))
+            while len(pending) >= backlog:
+                frame_no, future = pending.popleft()
+                yield frame_no, future.result()[0]
+        while pending:
+            frame_no, future = pending.popleft()
+            yield frame_no, future.result()[0]
+
+
 def feature_extent(norm, center, nfringes=20, maxrange=400.):
     '''
     Computes a side length for a holograms bounding box
@@ -57,26 +110,66 @@ def feature_extent(norm, center, nfringes=20, maxrange=400.):
                   overestimating due to noise
         maxrange: default value if we don't count enough fringes
     '''
-    ravg, rstd = aziavg(norm, center)
-    b = ravg - 1.
-    ndx = np.where(np.diff(np.sign(b)))[0] + 1.
-    if len(ndx) <= nfringes:
-        return maxrange
-    else:
-        s = float(ndx[nfringes])
-        return s
-
-
-def aziavg(data, center):
-    x_p, y_p = center
-    y, x = np.indices((data.shape))
-    d = data.ravel()
-    r = np.hypot(x - x_p, y - y_p).astype(np.int).ravel()
-    nr = np.bincount(r)
-    ravg = np.bincount(r, d) / nr
-    avg = ravg[r]
-    rstd = np.sqrt(np.bincount(r, (d - avg)**2) / nr)
-    return ravg, rstd
+    return feature_extents(norm, [center],
+                           nfringes=nfringes, maxrange=maxrange)[0]
+
+
+def feature_extents(norm, centers, nfringes=20, maxrange=400.,
+                    batchsize=2**22):
+    '''
+    Computes side lengths for the bounding boxes of all features
+    in an image by counting fringes in their radial profiles.
+
+    Profiles are averaged over the pixels within maxrange of
+    the pixel nearest to each center. Pixels of all features are
+    binned together.
+
+    Args:
+        norm: normalized image
+        centers: [nfeatures, 2] (x, y) centers of features
+    Keywords:
+        nfringes: number of fringes to count
+        maxrange: default value if we don't count enough fringes
+        batchsize: maximum number of pixels binned in one pass
+    Returns:
+        extents: [nfeatures] side lengths [pixels]
+    '''
+    centers = np.rint(np.reshape(centers, (-1, 2))).astype(int)
+    rmax = int(maxrange)
+    window = _window(rmax)
+    nbins = rmax + 2
+    ny, nx = norm.shape
+    profiles = np.empty((len(centers), nbins))
+    labels, values, first, npts = [], [], 0, 0
+    for n, (x, y) in enumerate(centers):
+        rows = slice(max(y - rmax, 0), min(y + rmax + 1, ny))
+        cols = slice(max(x - rmax, 0), min(x + rmax + 1, nx))
+        bins = window[rows.start - y + rmax:rows.stop - y + rmax,
+                      cols.start - x + rmax:cols.stop - x + rmax]
+        labels.append(bins.ravel() + (n - first) * nbins)
+        values.append(norm[rows, cols].ravel())
+        npts += bins.size
+        if npts >= batchsize or n == len(centers) - 1:
+            labels = np.concatenate(labels)
+            size = (n + 1 - first) * nbins
+            counts = np.bincount(labels, minlength=size)
+            sums = np.bincount(labels, np.concatenate(values), size)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                profiles[first:n+1] = (sums / counts).reshape(-1, nbins)
+            labels, values, first, npts = [], [], n + 1, 0
+    return fringe_extent(profiles[:, :-1], nfringes=nfringes,
+                         maxrange=maxrange)
+
+
+@lru_cache(maxsize=4)
+def _window(rmax):
+    '''Radial bin of each pixel in a window of radius rmax.
+    Pixels outside the inscribed circle fall into bin rmax+1.'''
+    r = np.arange(-rmax, rmax + 1)
+    ndx = np.hypot.outer(r, r).astype(int)
+    ndx = np.minimum(ndx, rmax + 1)
+    ndx.flags.writeable = False
+    return ndx
 
 
 if __name__ == '__main__':
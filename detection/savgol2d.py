@@ -31,16 +31,21 @@
 #
 #  02/06/2013 Written by David G. Grier, New York University
 #  09/2013 Translated to Python by Mark D. Hannel, New York University
+#  Kernels are cached and computed directly from the pseudo-inverse.
+#  Coordinates are centered on the central pixel, as in the original.
 #  Copyright (c) 2013 David G. Grier
 #-
 
 import numpy as nmp
-from itertools import count
+from functools import lru_cache
 
 def savgol2d(dim, order, dx = 0, dy = 0):
    """
    Generates two-dimensional Savitzky-Golay smoothing and derivative kernels
 
+   Kernels are computed once for each combination of arguments
+   and cached.
+
    Inputs:
    dim: width of the filter [pixels]
    order: The degree of the polynomial
@@ -56,11 +61,6 @@ def savgol2d(dim, order, dx = 0, dy = 0):
    """
    umsg = 'USAGE: filter = dgsavgol2d(dim, order)'
 
-#   if n_params() != 2 :    ### Python checks for correct number of 
-#                           ### necessary arguments
-#      print umsg
-#      return -1
-
    if type(dim) != int:
       print(umsg)
       print('DIM should be the integer width of the filter')
@@ -86,32 +86,62 @@ def savgol2d(dim, order, dx = 0, dy = 0):
       print('DX + DY should not be greater than ORDER')
       return -1
 
-   npts = dim**2
-
-   temparr = nmp.arange(0,dim,dtype=float)-dim/2.
-
-   x = nmp.tile(temparr,dim)
-   y = nmp.repeat(temparr,dim)
+   return _savgol2d(dim, order, dx, dy).copy()
 
-   temp = int( (order+1)*(order+2)/2 )
-   Q = nmp.arange(temp*npts,dtype = float).reshape(npts,temp)
-   n = 0
-   for nu in range(0, order+1):
-      ynu =  y**nu
-      for mu in range(0, order-nu+1):
-         Q[:, n] = x**mu * ynu
-         n += 1
+def savgol2d_factors(dim, order, dx = 0, dy = 0):
+   """
+   Separable factors of a two-dimensional Savitzky-Golay kernel
 
-   a = nmp.linalg.inv(nmp.dot(Q.transpose(),Q))
-   a = nmp.dot(Q,a).transpose()
+   The kernel is the sum of outer products of one-dimensional
+   factors, so that convolving with the kernel is equivalent to
+   a sum of pairs of one-dimensional convolutions. The number
+   of pairs is the rank of the kernel, which is one for kernels
+   that are separable, and small for the others.
 
-   Filter = nmp.zeros(npts)
-   b = nmp.zeros(npts)
-   b[0] = 1.
-   ndx = dx +(order + 1) * dy
+   Inputs and parameters are the same as for savgol2d.
 
-   for i in range(0, npts):
-      Filter[i] = nmp.dot(a,b)[ndx]
-      b = nmp.roll(b, 1)
+   Outputs:
+   factors: list of (column, row) pairs of [dim] arrays such that
+        filter = sum(nmp.outer(column, row) for column, row in factors)
 
-   return Filter.reshape(dim, dim)
+   Example:
+   factors = savgol2d_factors(7, 3, dx=1)
+   """
+   if type(savgol2d(dim, order, dx=dx, dy=dy)) != nmp.ndarray:
+      return -1
+   return [(column.copy(), row.copy())
+           for column, row in _factors(dim, order, dx, dy)]
+
+@lru_cache(maxsize=None)
+def _savgol2d(dim, order, dx, dy):
+   # coordinates relative to the central pixel
+   temparr = nmp.arange(dim, dtype=float) - dim//2
+
+   x = nmp.tile(temparr, dim)
+   y = nmp.repeat(temparr, dim)
+
+   # basis of monomials x**mu y**nu with mu + nu <= order
+   Q = [x**mu * y**nu for nu in range(order+1) for mu in range(order-nu+1)]
+   Q = nmp.array(Q).transpose()
+   ndx = sum(order-nu+1 for nu in range(dy)) + dx
+
+   # the filter is the row of the pseudo-inverse that
+   # yields the coefficient of x**dx y**dy
+   Filter = nmp.linalg.pinv(Q)[ndx].reshape(dim, dim)
+   Filter.flags.writeable = False
+   return Filter
+
+@lru_cache(maxsize=None)
+def _factors(dim, order, dx, dy):
+   u, s, vh = nmp.linalg.svd(_savgol2d(dim, order, dx, dy))
+   # singular values of a rank-deficient kernel are at the level
+   # of the rounding errors accumulated by the pseudo-inverse
+   rank = nmp.sum(s > s[0] * nmp.sqrt(nmp.finfo(float).eps))
+   factors = []
+   for n in range(rank):
+      column = u[:, n] * s[n]
+      row = vh[n, :]
+      column.flags.writeable = False
+      row.flags.writeable = False
+      factors.append((column, row))
+   return tuple(factors)
@@ -2,10 +2,13 @@
 # -*- coding: utf-8 -*-
 
 from pylorenzmie.theory import LMHologram
+from pylorenzmie.theory.LorenzMie import LorenzMie
+from pylorenzmie.utilities.profiling import timed
 import numpy as np
 import json
+import copy
 
-from scipy.optimize import (least_squares, minimize)
+from scipy.optimize import (least_squares, minimize, OptimizeResult)
 
 from scipy.linalg import svd
 import pandas as pd
@@ -39,6 +42,16 @@ class Optimizer(object):
         'lm': scipy.least_squares
         'amoeba' : Nelder-Mead optimization from pylorenzmie.fitting
         'amoeba-lm': Nelder-Mead/Levenberg-Marquardt hybrid
+    jacobian : str
+        Method for computing the Jacobian in Levenberg-Marquardt fits.
+        'analytic': derivatives computed by the model, if available.
+            Derivatives with respect to position are analytic.
+            Derivatives with respect to a_p, n_p and k_p are
+            central differences of the Mie coefficients, which
+            require no additional field evaluations.
+        '2-point', '3-point': finite differences from
+        scipy.optimize.least_squares
+        Default: 'analytic'
     fixed : list
         List of properties of the model that should not vary during fitting.
         Default: ['k_p', 'n_m', 'alpha', 'wavelength', 'magnification']
@@ -57,6 +70,9 @@ class Optimizer(object):
     -------
     optimize() : pandas.Series
         Parameters that optimize model to fit the data.
+    optimize_batch(features, chunksize=256) : list
+        Fit many features together with a vectorized
+        Levenberg-Marquardt algorithm.
     '''
 
     def __init__(self,
@@ -65,11 +81,13 @@ class Optimizer(object):
                  coordinates=None,
                  noise=0.05,
                  method=None,
+                 jacobian='analytic',
                  **kwargs):
         self.model = model or LMHologram(**kwargs)
         self.data = data
         self.noise = noise
         self.method = method or 'lm'
+        self.jacobian = jacobian
         self._result = None
         self._default_settings()
 
@@ -133,6 +151,7 @@ class Optimizer(object):
     def properties(self):
         p = dict()
         p['method'] = self.method
+        p['jacobian'] = self.jacobian
         p['lm'] = self.lm_settings
         p['nm'] = self.nm_settings
         p['fixed'] = self.fixed
@@ -142,6 +161,8 @@ class Optimizer(object):
     @properties.setter
     def properties(self, p):
         self.method = p['method']
+        if 'jacobian' in p:
+            self.jacobian = p['jacobian']
         self.lm_settings = p['lm']
         self.nm_settings = p['nm']
         self.fixed = p['fixed']
@@ -180,7 +201,14 @@ class Optimizer(object):
             if converged:
                 p0 = result.x
         if 'lm' in self.method:
-            result = least_squares(self._residuals, p0, **self.lm_settings)
+            if self._analytic():
+                jac = self._jacobian
+            elif self.jacobian == 'analytic':
+                jac = '2-point'
+            else:
+                jac = self.jacobian
+            result = least_squares(self._residuals, p0, jac=jac,
+                                   **self.lm_settings)
 
         self._result = result
         
@@ -195,6 +223,54 @@ class Optimizer(object):
 
         return self.report
   
+    def optimize_batch(self, features, chunksize=256):
+        '''
+        Fit many features together
+
+        Features are fit in chunks of up to chunksize problems.
+        The holograms of all of the problems in a chunk are
+        computed with one batched call of LorenzMie.compute. If
+        jacobian is 'analytic' and the model differentiates all of
+        the variables, the Jacobians are computed analytically by
+        the model for each problem. Otherwise they are computed by
+        forward differences with one more batched call per
+        variable. Levenberg-Marquardt iterations for all
+        of the problems proceed together, each problem with its own
+        damping parameter, until each one has converged.
+        This is much faster than fitting features one at a time
+        when the features are small.
+
+        The instrument is described by this optimizer's model, and
+        its properties cannot be variables. Each feature's pixels
+        are selected by its mask, its residuals are weighted by the
+        noise of its own optimizer, and the fits start from the
+        properties of each feature's model. Convergence criteria
+        ftol, xtol, gtol, max_nfev and diff_step are taken from
+        lm_settings.
+
+        Arguments
+        ---------
+        features : list of Feature
+            Features to fit
+
+        Returns
+        -------
+        results : list of pandas.Series
+            Values, uncertainties and statistics from each fit.
+            The optimized values are set in each feature's model,
+            and each feature's optimizer holds its result.
+        '''
+        fixed = self.model.instrument.properties
+        varying = [v for v in self.variables if v in fixed]
+        if varying:
+            msg = 'Cannot optimize instrument properties {} in batches'
+            raise ValueError(msg.format(varying))
+        results = []
+        for start in range(0, len(features), chunksize):
+            chunk = features[start:start+chunksize]
+            results.extend(self._optimize_chunk(chunk))
+        return results
+
     def dumps(self, **kwargs):
         return json.dumps(self.properties, **kwargs)
 
@@ -244,10 +320,24 @@ class Optimizer(object):
         p0 = [self.model.properties[p] for p in self.variables]
         return np.array(p0)
     
+    @timed('Optimizer._residuals')
     def _residuals(self, values):
         '''Updates properties and returns residuals'''
         self.model.properties = dict(zip(self.variables, values))
-        return (self.model.hologram() - self._data) / self.noise
+        return self.model.residuals(self._data, self.noise)
+
+    @timed('Optimizer._jacobian')
+    def _jacobian(self, values):
+        '''Updates properties and returns Jacobian of residuals'''
+        self.model.properties = dict(zip(self.variables, values))
+        return self.model.jacobian(self.variables) / self.noise
+
+    def _analytic(self):
+        '''Returns True if model provides derivatives for all variables'''
+        if self.jacobian != 'analytic':
+            return False
+        differentiable = getattr(self.model, 'differentiable', [])
+        return all(v in differentiable for v in self.variables)
 
     def _chisq(self, x):
         delta = self._residuals(x)
@@ -258,6 +348,85 @@ class Optimizer(object):
         delta = self._residuals(x)
         return np.absolute(delta).sum()
 
+    def _optimize_chunk(self, features):
+        '''Vectorized Levenberg-Marquardt fit of a chunk of features'''
+        settings = self.lm_settings
+        ftol, xtol, gtol = (settings[k] for k in ('ftol', 'xtol', 'gtol'))
+        problems = _BatchProblems(self, features)
+        nproblems, nvariables = problems.x.shape
+
+        x = problems.x
+        r = problems.residuals(x)
+        chisq = np.sum(r**2, axis=1)
+        jac = problems.jacobian(x, r)
+        nfev = np.full(nproblems, 1 + nvariables)
+        damping = np.full(nproblems, 1e-3)
+        success = np.full(nproblems, False)
+        active = np.full(nproblems, True)
+        while np.any(active):
+            ndx = np.nonzero(active)[0]
+            j = jac[ndx]
+            alpha = np.einsum('knp,knq->kpq', j, j)
+            beta = np.einsum('knp,kn->kp', j, r[ndx])
+            # gradient test: cosines of the angles between the
+            # residuals and the columns of the Jacobian
+            curvature = np.einsum('kpp->kp', alpha)
+            norm = np.sqrt(curvature * chisq[ndx, None])
+            cosine = np.divide(np.abs(beta), norm,
+                               out=np.zeros_like(beta), where=norm > 0)
+            done = np.max(cosine, axis=1) <= gtol
+            # Marquardt step with per-problem damping
+            scale = np.maximum(curvature, 1e-12 * curvature.max(axis=1,
+                                                               keepdims=True))
+            scale = np.maximum(scale, np.finfo(float).tiny)
+            matrix = alpha + (damping[ndx, None] * scale)[..., None] * \
+                np.eye(nvariables)
+            step = -np.linalg.solve(matrix, beta[..., None])[..., 0]
+            trial = x[ndx] + step
+            rtrial = problems.residuals(trial, ndx)
+            ctrial = np.sum(rtrial**2, axis=1)
+            nfev[ndx] += 1
+            better = (ctrial < chisq[ndx]) & ~done
+            small = (np.linalg.norm(step, axis=1) <=
+                     xtol * (xtol + np.linalg.norm(x[ndx], axis=1)))
+            reduction = (chisq[ndx] - ctrial) / np.maximum(chisq[ndx],
+                                                           np.finfo(float).tiny)
+            accepted = ndx[better]
+            x[accepted] = trial[better]
+            r[accepted] = rtrial[better]
+            chisq[accepted] = ctrial[better]
+            damping[accepted] /= 10.
+            damping[ndx[~better]] *= 10.
+            done |= better & ((reduction < ftol) | small)
+            done |= ~better & small
+            success[ndx[done]] = True
+            active[ndx[done]] = False
+            failed = (damping > 1e10) | (nfev >= settings['max_nfev'])
+            active &= ~failed
+            update = accepted[active[accepted]]
+            if update.size > 0:
+                jac[update] = problems.jacobian(x[update], r[update], update)
+                nfev[update] += nvariables
+
+        saved = (self._result, self._data)
+        results = []
+        for n, feature in enumerate(features):
+            npts = problems.npts[n]
+            result = OptimizeResult(x=x[n].copy(),
+                                    fun=r[n, :npts].copy(),
+                                    jac=jac[n, :npts].copy(),
+                                    cost=0.5 * chisq[n],
+                                    nfev=int(nfev[n]),
+                                    success=bool(success[n]))
+            feature.model.properties = dict(zip(self.variables, x[n]))
+            feature.optimizer._result = result
+            feature.optimizer.data = problems.data[n, :npts]
+            self._result = result
+            self._data = feature.optimizer.data
+            results.append(self.report)
+        self._result, self._data = saved
+        return results
+
     def _statistics(self):
         '''return standard uncertainties in fit parameters'''
         res = self.result
@@ -276,3 +445,142 @@ class Optimizer(object):
             pcov = np.dot(VT.T / s**2, VT)
             uncertainty = np.sqrt(redchi * np.diag(pcov))
         return redchi, uncertainty
+
+
+class _BatchProblems(object):
+    '''
+    Data and models for a batch of fitting problems
+
+    Problems with fewer selected pixels than the largest are
+    padded with pixels whose residuals are zero. The residuals
+    of each problem are weighted by the noise of its feature's
+    own optimizer.
+    '''
+
+    def __init__(self, optimizer, features):
+        subsets = [feature.subset() for feature in features]
+        self.npts = [data.size for data, _ in subsets]
+        nproblems, npts = len(subsets), max(self.npts)
+        self.data = np.ones((nproblems, npts))
+        self.weight = np.zeros((nproblems, npts))
+        self.coordinates = np.zeros((nproblems, 3, npts))
+        for n, (data, coordinates) in enumerate(subsets):
+            m = data.size
+            coordinates = np.asarray(coordinates).reshape(-1, m)
+            self.data[n, :m] = data
+            self.weight[n, :m] = 1. / features[n].optimizer.noise
+            self.coordinates[n, :coordinates.shape[0], :m] = coordinates
+            self.coordinates[n, :, m:] = self.coordinates[n, :, :1]
+        self.variables = optimizer.variables
+        self.diff_step = optimizer.lm_settings.get('diff_step') or 1e-8
+        self.analytic = optimizer._analytic()
+        # private model for the particles of the problems
+        model = optimizer.model
+        instrument = model.instrument
+        self.model = type(model)(particle=copy.deepcopy(model.particle),
+                                 instrument=copy.deepcopy(instrument))
+        fixed = instrument.properties
+        self.properties = [{k: v for k, v in feature.model.properties.items()
+                            if k not in fixed}
+                           for feature in features]
+        self.x = np.array([[p[v] for v in self.variables]
+                           for p in self.properties], dtype=float)
+        self.k = instrument.wavenumber()
+        self.n_m = instrument.n_m
+        self.wavelength = instrument.wavelength
+        shape = self.coordinates.shape
+        self.krv = np.empty(shape)
+        self.buffers = [np.empty(shape, dtype=complex) for _ in range(4)]
+        self.workspace = LorenzMie.allocate_workspace((nproblems, npts))
+
+    def holograms(self, x, ndx=None):
+        '''Holograms of problems ndx with variables x'''
+        ndx = np.arange(len(x)) if ndx is None else ndx
+        nbatch = len(ndx)
+        p = [dict(self.properties[n], **dict(zip(self.variables, v)))
+             for n, v in zip(ndx, x)]
+        particle = self.model.particle
+        coefficients = []
+        for q in p:
+            particle.properties = q
+            coefficients.append(particle.ab(self.n_m, self.wavelength))
+        norders = max(len(c) for c in coefficients)
+        ab = np.zeros((nbatch, norders, 2), dtype=complex)
+        for n, c in enumerate(coefficients):
+            ab[n, :len(c)] = c
+        r_p = np.array([[q['x_p'], q['y_p'], q['z_p']] for q in p])
+        alpha = np.array([q['alpha'] for q in p])
+        krv = self.krv[:nbatch]
+        np.multiply(self.k, self.coordinates[ndx] - r_p[:, :, None],
+                    out=krv)
+        buffers = [b[:nbatch] for b in self.buffers]
+        workspace = {k: w[:nbatch] for k, w in self.workspace.items()}
+        field = LorenzMie.compute(ab, krv, *buffers, workspace=workspace)
+        field *= (alpha * np.exp(-1j * self.k * r_p[:, 2]))[:, None, None]
+        field[:, 0, :] += 1.
+        return np.sum(field.real**2 + field.imag**2, axis=1)
+
+    def residuals(self, x, ndx=None):
+        '''Residuals of problems ndx with variables x'''
+        ndx = np.arange(len(x)) if ndx is None else ndx
+        residuals = self.holograms(x, ndx) - self.data[ndx]
+        return residuals * self.weight[ndx]
+
+    def jacobian(self, x, r, ndx=None):
+        '''Jacobians of the residuals of problems ndx
+
+        Derivatives are analytic if the optimizer uses analytic
+        derivatives, and are computed by forward differences
+        otherwise.'''
+        ndx = np.arange(len(x)) if ndx is None else ndx
+        if not self.analytic:
+            return self.differences(x, r, ndx)
+        nbatch = len(ndx)
+        p = [dict(self.properties[n], **dict(zip(self.variables, v)))
+             for n, v in zip(ndx, x)]
+        particle = self.model.particle
+        coefficients, derivatives = [], []
+        for q in p:
+            particle.properties = q
+            coefficients.append(particle.ab(self.n_m, self.wavelength))
+            derivatives.append(particle.dab(self.n_m, self.wavelength))
+        names = list(derivatives[0].keys())
+        norders = max(len(c) for c in coefficients)
+        ab = np.zeros((nbatch, norders, 2), dtype=complex)
+        dab = np.zeros((nbatch, len(names), norders, 2), dtype=complex)
+        for n, (c, d) in enumerate(zip(coefficients, derivatives)):
+            ab[n, :len(c)] = c
+            for m, name in enumerate(names):
+                dab[n, m, :len(c)] = d[name]
+        r_p = np.array([[q['x_p'], q['y_p'], q['z_p']] for q in p])
+        alpha = np.array([q['alpha'] for q in p])[:, None, None]
+        krv = self.k * (self.coordinates[ndx] - r_p[:, :, None])
+        field, dfield, gradient = LorenzMie.compute_derivatives(ab, dab, krv)
+        # as in LorenzMie.derivatives and LMHologram.jacobian
+        k = self.k
+        phase = np.exp(-1j * k * r_p[:, 2])[:, None, None]
+        field *= phase
+        dfields = {'x_p': -k * phase * gradient[:, 0],
+                   'y_p': -k * phase * gradient[:, 1],
+                   'z_p': -k * phase * gradient[:, 2] - 1j * k * field}
+        dfields.update(zip(names, (phase[:, None] * dfield).swapaxes(0, 1)))
+        total = alpha * field
+        total[:, 0, :] += 1.
+        jac = np.empty((*r.shape, x.shape[1]))
+        for n, variable in enumerate(self.variables):
+            if variable == 'alpha':
+                d = field
+            else:
+                d = alpha * dfields[variable]
+            jac[..., n] = 2. * np.sum(np.real(np.conj(total) * d), axis=1)
+        return jac * self.weight[ndx][..., None]
+
+    def differences(self, x, r, ndx):
+        '''Jacobians of the residuals by forward differences'''
+        jac = np.empty((*r.shape, x.shape[1]))
+        for n in range(x.shape[1]):
+            h = self.diff_step * np.maximum(1., np.abs(x[:, n]))
+            xh = x.copy()
+            xh[:, n] += h
+            jac[..., n] = (self.residuals(xh, ndx) - r) / h[:, None]
+        return jac
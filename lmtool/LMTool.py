@@ -12,6 +12,7 @@ import pylorenzmie as pylm
 
 from pylorenzmie.theory import LMHologram, coordinates
 from pylorenzmie.analysis import Feature
+from pylorenzmie.utilities.radial import aziavg
 
 from LMTool_Ui import Ui_MainWindow
 from PyQt5.QtCore import pyqtSlot
@@ -21,18 +22,6 @@ logger = logging.getLogger('LMTool')
 logger.setLevel(logging.INFO)
 
 
-def aziavg(data, center):
-    x_p, y_p = center
-    y, x = np.indices((data.shape))
-    d = data.ravel()
-    r = np.hypot(x - x_p, y - y_p).astype(np.int).ravel()
-    nr = np.bincount(r)
-    ravg = np.bincount(r, d) / nr
-    avg = ravg[r]
-    rstd = np.sqrt(np.bincount(r, (d - avg)**2) / nr)
-    return ravg, rstd
-
-
 class LMTool(QtWidgets.QMainWindow):
 
     def __init__(self,
@@ -0,0 +1,72 @@
+import unittest
+from unittest import mock
+
+import os
+import pickle
+import numpy as np
+from theory import (backends, coordinates)
+from theory.LorenzMie import LorenzMie
+from theory.LMHologram import LMHologram
+
+
+class TestBackends(unittest.TestCase):
+
+    def setUp(self):
+        self.coordinates = coordinates([32, 32])
+
+    def configure(self, model):
+        model.coordinates = self.coordinates
+        model.particle.r_p = [15, 17, 100]
+        model.particle.a_p = 1.
+        model.particle.n_p = 1.45
+        return model
+
+    def test_available(self):
+        self.assertIn('numpy', backends.available())
+
+    def test_default(self):
+        self.assertIn(backends.default(), backends.available())
+
+    def test_default_numpy(self):
+        saved = backends._default
+        try:
+            backends._default = None
+            with mock.patch.dict(os.environ):
+                os.environ.pop(backends.environment, None)
+                with mock.patch.object(backends, 'benchmark') as timer:
+                    self.assertEqual(backends.default(), 'numpy')
+                timer.assert_not_called()
+        finally:
+            backends._default = saved
+
+    def test_get_numpy(self):
+        self.assertIs(backends.get('numpy'), LorenzMie)
+        self.assertIs(backends.get('numpy', hologram=True), LMHologram)
+
+    def test_get_unknown(self):
+        with self.assertRaises(ValueError):
+            backends.get('fortran')
+
+    def test_benchmark(self):
+        times = backends.benchmark(['numpy'], shape=(16, 16), nrepeat=1)
+        self.assertIn('numpy', times)
+
+    def test_backends(self):
+        expected = self.configure(LorenzMie()).field()
+        holo = self.configure(LMHologram()).hologram()
+        for name in backends.available():
+            model = self.configure(backends.get(name)())
+            self.assertEqual(model.method, name)
+            self.assertTrue(np.allclose(model.field(), expected))
+            model = self.configure(backends.get(name, hologram=True)())
+            self.assertTrue(np.allclose(model.hologram(), holo))
+
+    def test_pickle(self):
+        for name in set(backends.available()) & {'numpy', 'numba'}:
+            model = self.configure(backends.get(name, hologram=True)())
+            other = pickle.loads(pickle.dumps(model))
+            self.assertIs(type(other), type(model))
+
+
+if __name__ == '__main__':
+    unittest.main()
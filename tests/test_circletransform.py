@@ -0,0 +1,58 @@
+import unittest
+
+from detection import circletransform as ct
+from detection.savgol2d import savgol2d
+from theory.spheredhm import spheredhm
+import numpy as np
+
+
+class TestCircleTransform(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(1)
+        image = spheredhm([10, -5, 100], 0.75, 1.5, 1.339, [160, 120])
+        image += np.random.normal(0, 0.01, image.shape)
+        self.dx = savgol2d(7, 3, dx=1)
+        self.dady, self.dadx = np.gradient(image)
+
+    def test_voting_shape(self):
+        b = ct.voting(self.dadx, self.dady, self.dx, noise=0.1)
+        self.assertEqual(b.shape, self.dadx.shape)
+        y, x = np.unravel_index(b.argmax(), b.shape)
+        self.assertLessEqual(abs(x - (80 + 10)), 1)
+        self.assertLessEqual(abs(y - (60 - 5)), 1)
+
+    def test_voting_fallback(self):
+        if ct.cast is None:
+            self.skipTest('numba not available')
+        expected = ct.voting(self.dadx, self.dady, self.dx, noise=0.1)
+        cast = ct.cast
+        ct.cast = None
+        try:
+            b = ct.voting(self.dadx, self.dady, self.dx, noise=0.1)
+        finally:
+            ct.cast = cast
+        self.assertTrue(np.array_equal(b, expected))
+
+    def test_orientational_transform(self):
+        ny, nx = self.dadx.shape
+        kx, ky = np.meshgrid(np.arange(nx)/nx - 0.5, np.arange(ny)/ny - 0.5)
+        k = np.sqrt(kx**2 + ky**2) + 0.001
+        ker = (kx - 1.j*ky)**2 / k**3
+        psi = np.fft.ifft2((self.dadx + 1.j*self.dady)**2)
+        psi = np.fft.fft2(np.fft.fftshift(np.fft.ifftshift(psi) * ker))
+        expected = np.abs(psi)**2
+        transform = ct.OrientationalTransform()
+        b = transform(self.dadx, self.dady)
+        self.assertTrue(np.allclose(b, expected))
+        kernel = transform.kernel
+        b = transform(self.dadx[1:, 1:], self.dady[1:, 1:])
+        self.assertEqual(b.shape, (ny-1, nx-1))
+        self.assertIsNot(transform.kernel, kernel)
+        kernel = transform.kernel
+        transform(self.dadx[1:, 1:], self.dady[1:, 1:])
+        self.assertIs(transform.kernel, kernel)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+
+import os
+import tempfile
+import numpy as np
+from theory.CoefficientTable import CoefficientTable
+from theory.Sphere import (Sphere, mie_coefficients)
+
+
+class TestCoefficientTable(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.n_m = 1.34
+        cls.wavelength = 0.447
+        cls.table = CoefficientTable((0.8, 1.2), (1.4, 1.5),
+                                     n_m=cls.n_m,
+                                     wavelength=cls.wavelength,
+                                     spacing=(0.004, 0.002))
+
+    def setUp(self):
+        self.table.clear()
+
+    def test_interpolation(self):
+        a_p, n_p = 1.0123, 1.4567
+        ab = self.table(a_p, n_p, 0., self.n_m, self.wavelength)
+        expected = mie_coefficients(a_p, n_p, 0., self.n_m, self.wavelength)
+        self.assertEqual(ab.shape, expected.shape)
+        self.assertLess(np.max(np.abs(ab - expected)), self.table.error.max)
+        self.assertFalse(ab.flags.writeable)
+        self.assertEqual(self.table.info().hits, 1)
+
+    def test_grid_points(self):
+        a_p, n_p = self.table.a_p[10], self.table.n_p[10]
+        ab = self.table.interpolate(a_p, n_p)[0]
+        self.assertTrue(np.allclose(ab, self.table.table[10, 10]))
+
+    def test_error(self):
+        error = self.table.estimate_error(nsamples=50, seed=1)
+        self.assertLess(error.rms, error.max)
+        self.assertLess(error.max, 1e-2)
+
+    def test_norders(self):
+        a_p = np.linspace(0.8, 1.2, 97)
+        n_p = np.linspace(1.4, 1.5, 97)
+        for a, n in zip(a_p, n_p[::-1]):
+            ab = self.table(a, n, 0., self.n_m, self.wavelength)
+            self.assertEqual(len(ab), self.table.norders(a, n))
+
+    def test_default(self):
+        table = CoefficientTable()
+        self.assertLess(table.error.max, 1e-5)
+
+    def test_fallback(self):
+        args = (self.n_m, self.wavelength)
+        layered = (np.array([1., 1.1]), np.array([1.5, 1.4]), np.zeros(2))
+        for a_p, n_p, k_p in [(2., 1.45, 0.), (1., 1.6, 0.),
+                              (1., 1.45, 0.01), layered]:
+            ab = self.table(a_p, n_p, k_p, *args)
+            self.assertTrue(np.allclose(ab, mie_coefficients(a_p, n_p, k_p,
+                                                             *args)))
+        self.table(1., 1.45, 0., 1.33, self.wavelength)
+        info = self.table.info()
+        self.assertEqual((info.hits, info.misses), (0, 5))
+
+    def test_sphere(self):
+        sphere = Sphere(a_p=1.05, n_p=1.42)
+        expected = sphere.ab(self.n_m, self.wavelength)
+        sphere.cache = self.table
+        ab = sphere.ab(self.n_m, self.wavelength)
+        self.assertEqual(self.table.hits, 1)
+        self.assertLess(np.max(np.abs(ab - expected)), self.table.error.max)
+
+    def test_save_load(self):
+        for ext in ('.npz', '.h5'):
+            with tempfile.TemporaryDirectory() as tmp:
+                filename = os.path.join(tmp, 'table' + ext)
+                self.table.save(filename)
+                table = CoefficientTable.load(filename)
+            self.assertTrue(np.array_equal(table.table, self.table.table))
+            self.assertEqual(table.error, self.table.error)
+            self.assertEqual(table.n_m, self.table.n_m)
+            a = table(1.01, 1.43, 0., self.n_m, self.wavelength)
+            b = self.table(1.01, 1.43, 0., self.n_m, self.wavelength)
+            self.assertTrue(np.array_equal(a, b))
+        with self.assertRaises(ValueError):
+            self.table.save('table.txt')
+
+
+if __name__ == '__main__':
+    unittest.main()
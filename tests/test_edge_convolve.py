@@ -0,0 +1,47 @@
+import unittest
+
+from detection.edge_convolve import (edge_convolve, edge_gradient,
+                                     extend_array)
+from detection.savgol2d import (savgol2d, savgol2d_factors)
+from scipy import ndimage
+import numpy as np
+
+
+class TestEdgeConvolve(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(2)
+        self.a = np.random.rand(40, 50)
+        self.k = savgol2d(7, 3, dx=1)
+
+    def expected(self, k):
+        n = k.shape[0]//2
+        a = np.pad(self.a, n, mode='edge')
+        return ndimage.convolve(a, k)[n:-n, n:-n]
+
+    def test_extend_array(self):
+        a = extend_array(self.a, 2, 3)
+        self.assertEqual(a.shape, (44, 56))
+        self.assertTrue(np.all(a[:3, :4] == self.a[0, 0]))
+        self.assertTrue(np.all(a[-2:, 3:-3] == self.a[-1, :]))
+
+    def test_edge_convolve(self):
+        result = edge_convolve(self.a, self.k)
+        self.assertTrue(np.allclose(result, self.expected(self.k)))
+        result = edge_convolve((255*self.a).astype(np.uint8), self.k)
+        self.assertEqual(result.dtype, float)
+
+    def test_edge_gradient(self):
+        factors = savgol2d_factors(7, 3, dx=1)
+        for f in (None, factors):
+            dadx, dady = edge_gradient(self.a, self.k, factors=f)
+            self.assertTrue(np.allclose(dadx, self.expected(self.k)))
+            self.assertTrue(np.allclose(dady, self.expected(self.k.T)))
+
+    def test_invalid(self):
+        self.assertEqual(edge_convolve(self.a[0], self.k), -1)
+        self.assertEqual(edge_gradient(self.a[:5, :5], self.k), -1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+
+from analysis import (Feature, Executor)
+from theory import (LMHologram, coordinates)
+
+import os
+import cv2
+import numpy as np
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+TEST_IMAGE = os.path.join(THIS_DIR, 'data/crop.png')
+
+
+class TestExecutor(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.executor = Executor(workers=2, chunksize=1, backlog=2,
+                                wavelength=0.447, magnification=0.048,
+                                n_m=1.34)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.executor.close()
+
+    def setUp(self):
+        data = cv2.imread(TEST_IMAGE)
+        data = cv2.cvtColor(data, cv2.COLOR_BGR2GRAY).astype(float)
+        data /= np.mean(data)
+        self.data = data
+        self.coords = coordinates(data.shape)
+
+    def feature(self, z_p):
+        data = self.data
+        model = LMHologram(wavelength=0.447, magnification=0.048, n_m=1.34)
+        # seeded masks select the same pixels for every feature
+        feature = Feature(data=data, coordinates=self.coords,
+                          model=model, percentpix=0.1, seed=42)
+        model.particle.r_p = [data.shape[0]//2, data.shape[1]//2, z_p]
+        model.particle.a_p = 1.1
+        model.particle.n_p = 1.4
+        return feature
+
+    def test_optimize(self):
+        features = [self.feature(z_p) for z_p in (320, 330, 340)]
+        results = self.executor.optimize(features)
+        self.assertEqual(len(results), len(features))
+        self.assertTrue(all(results['success']))
+        for feature, (_, result) in zip(features, results.iterrows()):
+            self.assertEqual(feature.model.particle.z_p, result['z_p'])
+        expected = self.feature(330).optimize()
+        for key in ('z_p', 'a_p', 'n_p'):
+            self.assertTrue(np.allclose(results[key], expected[key],
+                                        rtol=1e-2))
+
+    def test_map_generator(self):
+        features = (self.feature(330) for _ in range(3))
+        results = list(self.executor.map(features))
+        self.assertEqual(len(results), 3)
+
+    def test_feature_settings(self):
+        def feature():
+            feature = self.feature(330)
+            optimizer = feature.optimizer
+            optimizer.noise = 0.1
+            optimizer.fixed = optimizer.fixed + ['n_p']
+            optimizer.variables = [v for v in optimizer.variables
+                                   if v != 'n_p']
+            return feature
+        this = feature()
+        result = list(self.executor.map([this]))[0]
+        self.assertNotIn('n_p', result)
+        self.assertEqual(this.model.particle.n_p, 1.4)
+        self.assertIsNotNone(this.optimizer.result)
+        self.assertTrue(this.optimizer.report.equals(result))
+        expected = feature().optimize()
+        self.assertTrue(np.isclose(result['redchi'], expected['redchi'],
+                                   rtol=1e-2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+
+from detection.h5video import (h5video, TagArray)
+import os
+import tempfile
+import h5py
+import numpy as np
+
+
+class TestH5Video(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dir = tempfile.TemporaryDirectory()
+        cls.data = np.random.randint(0, 255, (40, 12, 16), dtype=np.uint8)
+        cls.files = {}
+        for name, kwargs in (('group', None),
+                             ('contiguous', {}),
+                             ('chunked', {'chunks': (8, 12, 16),
+                                          'compression': 'gzip'})):
+            filename = os.path.join(cls.dir.name, name + '.h5')
+            with h5py.File(filename, 'w') as f:
+                if kwargs is None:
+                    for n, frame in enumerate(cls.data):
+                        f['images/{:06d}'.format(1000 + n)] = frame
+                else:
+                    f.create_dataset('images', data=cls.data, **kwargs)
+            cls.files[name] = filename
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.dir.cleanup()
+
+    def test_indexing(self):
+        for filename in self.files.values():
+            with h5video(filename) as vid:
+                self.assertEqual(len(vid), 40)
+                self.assertEqual(vid.dim, (12, 16))
+                frame = vid[-3]
+                self.assertIsInstance(frame, TagArray)
+                self.assertEqual(frame.frame_no, 37)
+                self.assertTrue(np.array_equal(frame, self.data[37]))
+                frames = vid[5:9]
+                self.assertEqual([f.frame_no for f in frames],
+                                 [5, 6, 7, 8])
+                self.assertTrue(np.array_equal(frames, self.data[5:9]))
+                with self.assertRaises(IndexError):
+                    vid[40]
+
+    def test_iterate(self):
+        for filename in self.files.values():
+            with h5video(filename, blocksize=3, prefetch=7) as vid:
+                frames = list(vid)
+                self.assertEqual([f.frame_no for f in frames],
+                                 list(range(40)))
+                self.assertTrue(np.array_equal(frames, self.data))
+                frames = list(vid.iterate(10, 15))
+                self.assertEqual(frames[0].frame_no, 10)
+                self.assertEqual(len(frames), 5)
+
+    def test_memmap(self):
+        with h5video(self.files['contiguous']) as vid:
+            self.assertIsInstance(vid._stack, np.memmap)
+        with h5video(self.files['chunked']) as vid:
+            self.assertEqual(vid.blocksize, 8)
+
+    def test_prefetch_reads(self):
+        def mapped(array):
+            while array is not None:
+                if isinstance(array, np.memmap):
+                    return True
+                array = array.base
+            return False
+        for name in ('contiguous', 'group'):
+            with h5video(self.files[name], blocksize=4) as vid:
+                self.assertTrue(mapped(vid[3]))
+                for frame in vid.iterate(0, 8):
+                    self.assertFalse(mapped(frame))
+
+    def test_open_on_demand(self):
+        with h5video(self.files['group'], cachesize=5) as vid:
+            self.assertLessEqual(len(vid._datasets), 1)
+            frames = list(vid)
+            self.assertTrue(np.array_equal(frames, self.data))
+            self.assertEqual(len(vid._datasets), 5)
+            self.assertEqual(list(vid._datasets), list(range(35, 40)))
+
+    def test_navigation(self):
+        with h5video(self.files['group']) as vid:
+            self.assertTrue(np.array_equal(vid.image, self.data[0]))
+            self.assertEqual(vid.get_time(), '001000')
+            vid.goto(20)
+            self.assertTrue(np.array_equal(vid.get_image(), self.data[20]))
+            self.assertTrue(np.array_equal(vid.next(), self.data[21]))
+
+
+if __name__ == '__main__':
+    unittest.main()
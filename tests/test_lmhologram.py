@@ -39,6 +39,74 @@ class TestLorenzMie(unittest.TestCase):
         hologram = self.method.hologram()
         self.assertEqual(hologram.shape[0], c.shape[1])
 
+    def test_jacobian(self):
+        self.test_hologram()
+        variables = ['y_p', 'n_p', 'alpha']
+        jacobian = self.method.jacobian(variables)
+        self.assertEqual(jacobian.shape, (128*128, 3))
+        delta = 1e-5
+        properties = self.method.properties
+        for n, name in enumerate(variables):
+            value = properties[name]
+            self.method.properties = {name: value + delta}
+            plus = self.method.hologram()
+            self.method.properties = {name: value - delta}
+            minus = self.method.hologram()
+            self.method.properties = {name: value}
+            numerical = (plus - minus) / (2. * delta)
+            error = np.abs(jacobian[:, n] - numerical).max()
+            self.assertLess(error, 1e-4 * np.abs(numerical).max())
+
+    def test_differentiable(self):
+        cache = self.method.cache
+        misses = cache.info().misses
+        names = self.method.differentiable
+        self.assertEqual(names, ['x_p', 'y_p', 'z_p',
+                                 'a_p', 'n_p', 'k_p', 'alpha'])
+        self.assertEqual(cache.info().misses, misses)
+
+    def test_fused(self):
+        self.test_hologram()
+        self.assertFalse(self.method.fused)
+        self.method.fused = True
+        if not self.method.fused:
+            self.skipTest('fused kernel not available')
+        fused = self.method.hologram()
+        self.method.fused = False
+        self.assertFalse(self.method.fused)
+        expected = self.method.hologram()
+        self.assertTrue(np.allclose(fused, expected))
+
+    def test_residuals(self):
+        self.test_hologram()
+        data = self.method.hologram() + 0.1
+        for fused in (True, False):
+            self.method.fused = fused
+            residuals = self.method.residuals(data, 0.05)
+            self.assertTrue(np.allclose(residuals, -2.))
+
+    def test_lut(self):
+        self.test_hologram()
+        self.method.particle.r_p = [60.3, 70.6, 120]
+        expected = self.method.hologram()
+        self.method.lut = True
+        for fused in (True, False):
+            self.method.fused = fused
+            hologram = self.method.hologram()
+            self.assertLess(np.abs(hologram - expected).max(), 1e-4)
+
+    def test_lut_nonplanar(self):
+        self.test_hologram()
+        self.method.coordinates[2, :] = np.linspace(0, 1, 128*128)
+        expected = self.method.hologram()
+        self.method.lut = True
+        self.assertIs(self.method._radial_hologram(), None)
+        self.assertTrue(np.allclose(self.method.hologram(), expected))
+
+    def test_jacobian_unsupported(self):
+        self.test_hologram()
+        self.assertIs(self.method.jacobian(['wavelength']), None)
+
     def test_hologram_singleprecision(self):
         if self.method.method != 'cupy':
             self.skipTest('not using cupy acceleration')
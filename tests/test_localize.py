@@ -0,0 +1,68 @@
+import unittest
+
+from detection.localize import (localize, detect_stream,
+                                feature_extent, feature_extents)
+from utilities.radial import (aziavg, fringe_extent)
+from detection.h5video import TagArray
+from theory import (LMHologram, coordinates)
+import numpy as np
+
+
+class TestLocalize(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        shape = [201, 251]
+        model = LMHologram(coordinates=coordinates(shape))
+        model.particle.r_p = [125, 75, 100]
+        model.particle.a_p = 0.9
+        model.particle.n_p = 1.45
+        model.instrument.wavelength = 0.447
+        cls.image = model.hologram().reshape(shape)
+
+    def frames(self, nframes):
+        for n in range(nframes):
+            yield self.image
+
+    def test_localize(self):
+        features, circ = localize(self.image, nfringes=30)
+        self.assertEqual(circ.shape, self.image.shape)
+        self.assertEqual(len(features), 1)
+        x, y, w, h = features[0]
+        self.assertAlmostEqual(x, 125, delta=1)
+        self.assertAlmostEqual(y, 75, delta=1)
+
+    def test_feature_extent(self):
+        center = (125, 75)
+        avg, _ = aziavg(self.image, center, rad=150)
+        expected = fringe_extent(avg, nfringes=10, maxrange=150)
+        s = feature_extent(self.image, center, nfringes=10, maxrange=150)
+        self.assertEqual(s, expected)
+        s = feature_extent(self.image, center, nfringes=100, maxrange=150)
+        self.assertEqual(s, 150)
+
+    def test_feature_extents(self):
+        centers = [(125, 75), (20, 190), (250, 0)]
+        expected = [feature_extent(self.image, c, nfringes=5,
+                                   maxrange=100) for c in centers]
+        for batchsize in (1, 2**22):
+            s = feature_extents(self.image, centers, nfringes=5,
+                                maxrange=100, batchsize=batchsize)
+            self.assertTrue(np.allclose(s, expected))
+
+    def test_detect_stream(self):
+        expected, _ = localize(self.image, nfringes=30)
+        results = list(detect_stream(self.frames(5), workers=2, backlog=2,
+                                     nfringes=30))
+        self.assertEqual([n for n, _ in results], list(range(5)))
+        for _, features in results:
+            self.assertTrue(np.allclose(features, expected))
+
+    def test_detect_stream_frame_no(self):
+        frames = [TagArray(self.image, frame_no=n) for n in (10, 12)]
+        results = detect_stream(iter(frames), workers=2, nfringes=30)
+        self.assertEqual([n for n, _ in results], [10, 12])
+
+
+if __name__ == '__main__':
+    unittest.main()
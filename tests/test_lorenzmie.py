@@ -2,7 +2,7 @@ import unittest
 
 import numpy as np
 from theory.LorenzMie import LorenzMie
-from theory import coordinates
+from theory import (coordinates, Sphere)
 
 
 class TestLorenzMie(unittest.TestCase):
@@ -48,6 +48,14 @@ class TestLorenzMie(unittest.TestCase):
         self.method.loads(s)
         self.assertEqual(self.method.particle.n_p, n_0)
 
+    def test_cache(self):
+        self.method.coordinates = coordinates([32, 32])
+        self.method.field()
+        info = self.method.cache.info()
+        self.method.particle.x_p += 1.
+        self.method.field()
+        self.assertEqual(self.method.cache.info().hits, info.hits + 1)
+
     def test_field_nocoordinates(self):
         self.method.coordinates = None
         field = self.method.field()
@@ -63,6 +71,108 @@ class TestLorenzMie(unittest.TestCase):
         field = self.method.field(bohren=bohren, cartesian=cartesian)
         self.assertEqual(field.shape[1], c.shape[1])
 
+    def test_derivatives(self):
+        p = self.method.particle
+        p.a_p = 1.
+        p.n_p = 1.4
+        p.r_p = [16.3, 15.8, 100]
+        self.method.coordinates = coordinates([32, 32])
+        field, derivatives = self.method.derivatives()
+        self.assertTrue(np.allclose(field, self.method.field()))
+        delta = 1e-4
+        for name in ['x_p', 'z_p', 'a_p']:
+            value = getattr(p, name)
+            setattr(p, name, value + delta)
+            plus = self.method.field().copy()
+            setattr(p, name, value - delta)
+            minus = self.method.field().copy()
+            setattr(p, name, value)
+            numerical = (plus - minus) / (2. * delta)
+            error = np.abs(derivatives[name] - numerical).max()
+            self.assertLess(error, 1e-5 * np.abs(numerical).max())
+
+    def test_derivatives_batch(self):
+        c = np.vstack([coordinates([16, 16]), np.zeros(256)])
+        particles = [Sphere(r_p=[8.3, 7.8, 100], a_p=0.5, n_p=1.4),
+                     Sphere(r_p=[5.1, 9.6, 150], a_p=1.2, n_p=1.5)]
+        k = self.method.instrument.wavenumber()
+        n_m = self.method.instrument.n_m
+        wavelength = self.method.instrument.wavelength
+        ab = [p.ab(n_m, wavelength) for p in particles]
+        dab = [np.array(list(p.dab(n_m, wavelength).values()))
+               for p in particles]
+        krv = [k * (c - p.r_p[:, None]) for p in particles]
+        expected = [LorenzMie.compute_derivatives(*args)
+                    for args in zip(ab, dab, krv)]
+        norders = max(len(a) for a in ab)
+        ab_batch = np.zeros((2, norders, 2), dtype=complex)
+        dab_batch = np.zeros((2, 3, norders, 2), dtype=complex)
+        for n in range(2):
+            ab_batch[n, :len(ab[n])] = ab[n]
+            dab_batch[n, :, :len(ab[n])] = dab[n]
+        result = LorenzMie.compute_derivatives(ab_batch, dab_batch,
+                                               np.array(krv))
+        for n in range(2):
+            for this, that in zip(result, expected[n]):
+                self.assertTrue(np.allclose(this[n], that))
+
+    def test_derivatives_nocoordinates(self):
+        self.method.coordinates = None
+        self.assertIs(self.method.derivatives(), None)
+
+    def test_field_multiple(self):
+        self.method.coordinates = coordinates([32, 32])
+        particles = [Sphere(r_p=[10, 10, 100], a_p=0.5, n_p=1.4),
+                     Sphere(r_p=[20, 25, 150], a_p=1.5, n_p=1.5),
+                     Sphere(r_p=[5, 20, 200], a_p=1., n_p=1.45)]
+        expected = np.zeros((3, 32*32), dtype=complex)
+        for p in particles:
+            self.method.particle = p
+            expected += self.method.field()
+        self.method.particle = particles
+        self.method.maxbatch = 2
+        field = self.method.field()
+        self.assertTrue(np.allclose(field, expected))
+
+    def test_batch(self):
+        self.method.coordinates = coordinates([32, 32])
+        self.assertEqual(self.method.batch(3), 3)
+        self.method.maxbatch = 2
+        self.assertEqual(self.method.batch(3), 2)
+        self.method.batchmemory = 1
+        self.assertEqual(self.method.batch(3), 1)
+
+    def test_precision(self):
+        self.method.coordinates = coordinates([64, 64])
+        for a_p in (1., 2.5):
+            self.method.precision = 'double'
+            self.method.particle = Sphere(r_p=[30, 35, 100],
+                                          a_p=a_p, n_p=1.45)
+            expected = self.method.field().copy()
+            self.method.precision = 'single'
+            self.assertEqual(self.method.coordinates.dtype, np.float32)
+            self.assertEqual(self.method.workspace['pi_n'].dtype,
+                             np.float32)
+            field = self.method.field()
+            self.assertEqual(field.dtype, np.complex64)
+            scale = np.max(np.abs(expected))
+            self.assertLess(np.max(np.abs(field - expected)),
+                            1e-5 * scale)
+
+    def test_precision_overflow(self):
+        self.method.coordinates = coordinates([64, 64])
+        self.method.particle = Sphere(r_p=[30.3, 35.6, 3], a_p=2.5, n_p=1.45)
+        expected = self.method.field().copy()
+        self.method.precision = 'single'
+        field = self.method.field()
+        self.assertTrue(np.all(np.isfinite(field)))
+        scale = np.max(np.abs(expected))
+        self.assertLess(np.max(np.abs(field - expected)), 1e-5 * scale)
+
+    def test_precision_invalid(self):
+        with self.assertRaises(AssertionError):
+            self.method.precision = 'half'
+
     def test_field_bohren(self):
         self.test_field(bohren=True)
 
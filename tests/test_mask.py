@@ -35,6 +35,41 @@ class TestMask(unittest.TestCase):
         self.assertTrue(np.array_equal(self.coordinates.shape,
                                        self.mask.coordinates.shape))
 
+    def test_sample_size(self):
+        npts = np.prod(self.shape)
+        for stratified in (False, True):
+            for d in ['fast', 'uniform', 'radial', 'donut']:
+                mask = Mask(self.coordinates, percentpix=0.1,
+                            distribution=d, stratified=stratified)
+                self.assertEqual(np.sum(mask.selected), int(0.1 * npts))
+
+    def test_exclude(self):
+        exclude = np.arange(1000, 9000)
+        for d in ['fast', 'radial']:
+            mask = Mask(self.coordinates, distribution=d, exclude=exclude)
+            self.assertFalse(np.any(mask.selected[exclude]))
+        self.mask.exclude = exclude
+        self.assertFalse(np.any(self.mask.selected[exclude]))
+
+    def test_seed(self):
+        a = Mask(self.coordinates, distribution='radial', seed=5)
+        b = Mask(self.coordinates, distribution='radial', seed=5)
+        self.assertTrue(np.array_equal(a.selected, b.selected))
+        np.random.seed(5)
+        a = Mask(self.coordinates)
+        np.random.seed(5)
+        b = Mask(self.coordinates)
+        self.assertTrue(np.array_equal(a.selected, b.selected))
+
+    def test_stratified(self):
+        mask = Mask(self.coordinates, percentpix=0.05,
+                    distribution='radial', stratified=True)
+        rings = mask._rings()
+        rho = mask._get_distribution()
+        expected = 0.05 * rings.size * np.bincount(rings, rho) / np.sum(rho)
+        counts = np.bincount(rings[mask.selected], minlength=expected.size)
+        self.assertTrue(np.all(np.abs(counts - expected) <= 1.))
+
     def test_update_nocoordinates(self):
         self.mask.coordinates = None
         self.assertIs(self.mask.selected, None)
@@ -0,0 +1,128 @@
+import unittest
+
+from analysis import (Normalizer, Video)
+from analysis.Normalizer import (load, Reader)
+from detection.h5video import (h5video, TagArray)
+from theory import Instrument
+import os
+import tempfile
+import cv2
+import numpy as np
+
+
+class TestNormalizer(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(4)
+        self.background = 50. + 100. * np.random.rand(24, 32)
+        self.dark = 10.
+        self.frames = []
+        for n in range(20):
+            frame = self.background.copy()
+            frame[n % 24, :] *= 2.
+            self.frames.append(frame + self.dark)
+        self.instrument = Instrument(dark_count=self.dark)
+
+    def test_median(self):
+        normalizer = Normalizer(window=9, instrument=self.instrument)
+        frames = list(normalizer.stream(self.frames))
+        self.assertEqual([f.frame_no for f in frames], list(range(20)))
+        for n, frame in enumerate(frames):
+            self.assertEqual(frame.dtype, np.float32)
+            expected = np.ones_like(frame)
+            expected[n % 24, :] = 2.
+            self.assertTrue(np.allclose(frame, expected, rtol=1e-5))
+
+    def test_percentile(self):
+        normalizer = Normalizer(window=5, method='percentile',
+                                percentile=100., stride=2)
+        frame = next(normalizer.stream(self.frames))
+        self.assertTrue(np.all(frame <= 1.))
+        with self.assertRaises(ValueError):
+            Normalizer(method='mean')
+
+    def test_stride(self):
+        self.assertEqual(Normalizer(window=40).stride, 4)
+        self.assertEqual(Normalizer(window=5).stride, 1)
+        normalizer = Normalizer(window=40)
+        frames = [np.full((4, 6), float(n)) for n in range(12)]
+        for frame in frames[:8]:
+            normalizer.add(frame)
+        first = normalizer._running.copy()
+        for frame in frames[8:11]:
+            normalizer.add(frame)
+        self.assertTrue(np.array_equal(normalizer._running, first))
+        normalizer.add(frames[11])
+        self.assertFalse(np.array_equal(normalizer._running, first))
+        normalizer.stride = 1
+        self.assertEqual(normalizer.stride, 1)
+
+    def test_background(self):
+        normalizer = Normalizer(dark_count=self.dark)
+        normalizer.estimate(self.frames)
+        self.assertTrue(np.allclose(normalizer.background,
+                                    self.background + self.dark))
+        frames = [TagArray(f, frame_no=n+5)
+                  for n, f in enumerate(self.frames[:3])]
+        frames = list(normalizer.stream(frames))
+        self.assertEqual([f.frame_no for f in frames], [5, 6, 7])
+        self.assertAlmostEqual(float(np.median(frames[0])), 1., places=5)
+
+    def test_save(self):
+        with tempfile.TemporaryDirectory() as dir:
+            for ext in ('h5', 'npz'):
+                filename = os.path.join(dir, 'norm.' + ext)
+                normalizer = Normalizer(window=9, dark_count=self.dark)
+                frames = np.array(list(normalizer.stream(
+                    self.frames, filename=filename, chunksize=8)))
+                if ext == 'h5':
+                    with h5video(filename) as vid:
+                        saved = np.array(vid[:])
+                        self.assertEqual(vid.blocksize, 8)
+                else:
+                    with np.load(filename) as data:
+                        keys = sorted(k for k in data if 'images' in k)
+                        saved = np.concatenate([data[k] for k in keys])
+                self.assertTrue(np.array_equal(saved, frames))
+                loaded = list(load(filename))
+                self.assertEqual([f.frame_no for f in loaded],
+                                 list(range(20)))
+                self.assertTrue(np.array_equal(loaded, frames))
+                reader = Reader(filename)
+                self.assertEqual(reader.numbers, list(range(20)))
+                self.assertTrue(np.array_equal(reader(11), frames[11]))
+                self.assertEqual(reader(11).frame_no, 11)
+                video = Video()
+                video.set_frames(filename, framenumbers=[4, 2])
+                self.assertEqual(video.framenumbers, [2, 4])
+                self.assertIsNone(video.get_frame(4)._image)
+                self.assertTrue(np.array_equal(video.get_frame(4).image,
+                                               frames[4]))
+
+    def test_video(self):
+        with tempfile.TemporaryDirectory() as dir:
+            filename = os.path.join(dir, 'video.avi')
+            fourcc = cv2.VideoWriter_fourcc(*'FFV1')
+            writer = cv2.VideoWriter(filename, fourcc, 30, (32, 24), False)
+            for frame in self.frames:
+                writer.write(np.clip(frame, 0, 255).astype(np.uint8))
+            writer.release()
+            video = Video(instrument=self.instrument)
+            video.video_path = filename
+            frames = list(video.normalize(window=5))
+            if len(frames) == 0:
+                self.skipTest('cannot write test video')
+            self.assertEqual(len(frames), 20)
+            self.assertEqual(frames[3].frame_no, 3)
+            self.assertEqual(frames[3].shape, (24, 32))
+            video.set_frames(framenumbers=[3, 7])
+            self.assertEqual(video.framenumbers, [3, 7])
+            self.assertTrue(os.path.exists(
+                os.path.join(dir, 'video_norm.h5')))
+            self.assertIsNone(video.get_frame(3)._image)
+            self.assertTrue(np.array_equal(video.get_frame(3).image,
+                                           frames[3]))
+
+
+if __name__ == '__main__':
+    unittest.main()
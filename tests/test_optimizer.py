@@ -1,6 +1,7 @@
 import unittest
 
 from fitting import Optimizer
+from analysis import Feature
 from theory import (LMHologram, coordinates)
 import os
 import cv2
@@ -53,6 +54,10 @@ class TestOptimizer(unittest.TestCase):
             print(result)
         self.assertTrue(result.success)
 
+    def test_optimize_numerical(self):
+        self.optimizer.jacobian = '2-point'
+        self.test_optimize()
+
     def test_optimize_amoeba(self):
         self.test_optimize(method='amoeba')
 
@@ -69,6 +74,86 @@ class TestOptimizer(unittest.TestCase):
         failure = not result.success or (result.redchi > 100.)
         self.assertTrue(failure)
 
+    def test_optimize_batch(self):
+        shape = (41, 41)
+        model = self.optimizer.model
+        truth = [dict(x_p=20.3, y_p=19.8, z_p=150., a_p=0.75, n_p=1.45),
+                 dict(x_p=19.6, y_p=20.4, z_p=180., a_p=0.9, n_p=1.42),
+                 dict(x_p=20.1, y_p=20.2, z_p=120., a_p=0.6, n_p=1.5)]
+        features = []
+        for n, p in enumerate(truth):
+            feature = Feature(percentpix=0.5, seed=n,
+                              wavelength=0.447, magnification=0.048,
+                              n_m=1.34)
+            feature.model.coordinates = coordinates(shape)
+            feature.model.properties = p
+            data = feature.model.hologram().reshape(shape)
+            feature.data = data + 0.01 * np.random.randn(*shape)
+            feature.coordinates = coordinates(shape)
+            guess = dict(p, z_p=p['z_p'] + 5., a_p=p['a_p'] + 0.02)
+            feature.model.properties = guess
+            features.append(feature)
+        model.properties = features[0].model.properties
+        results = self.optimizer.optimize_batch(features, chunksize=2)
+        self.assertEqual(len(results), len(truth))
+        self.assertIsNone(self.optimizer.result)
+        for feature, result, p in zip(features, results, truth):
+            self.assertTrue(result.success)
+            self.assertAlmostEqual(result.z_p, p['z_p'], delta=1.)
+            self.assertAlmostEqual(result.a_p, p['a_p'], delta=0.01)
+            fitted = feature.model.properties
+            self.assertAlmostEqual(fitted['z_p'], result.z_p)
+            self.assertIs(feature.optimizer.result.success, True)
+
+    def test_batch_jacobian(self):
+        from fitting.Optimizer import _BatchProblems
+        shape = (31, 31)
+        feature = Feature(percentpix=0.5, seed=1, wavelength=0.447,
+                          magnification=0.048, n_m=1.34)
+        feature.model.coordinates = coordinates(shape)
+        feature.model.properties = dict(x_p=15.3, y_p=14.8, z_p=150.,
+                                        a_p=0.75, n_p=1.45)
+        feature.data = feature.model.hologram().reshape(shape)
+        feature.coordinates = coordinates(shape)
+        problems = _BatchProblems(self.optimizer, [feature])
+        self.assertTrue(problems.analytic)
+        x = problems.x
+        r = problems.residuals(x)
+        analytic = problems.jacobian(x, r)
+        differences = problems.differences(x, r, np.arange(1))
+        scale = np.max(np.abs(differences), axis=1)
+        error = np.max(np.abs(analytic - differences), axis=1)
+        self.assertTrue(np.all(error < 1e-3 * scale))
+
+    def test_batch_noise(self):
+        from fitting.Optimizer import _BatchProblems
+        shape = (21, 21)
+        features = []
+        for noise in (0.05, 0.1):
+            feature = Feature(percentpix=0.5, seed=1, wavelength=0.447,
+                              magnification=0.048, n_m=1.34)
+            feature.optimizer.noise = noise
+            feature.model.coordinates = coordinates(shape)
+            feature.model.properties = dict(x_p=10.3, y_p=9.8, z_p=150.,
+                                            a_p=0.75, n_p=1.45)
+            data = feature.model.hologram().reshape(shape)
+            feature.data = data + 0.01 * np.random.randn(*shape)
+            feature.coordinates = coordinates(shape)
+            features.append(feature)
+        features[1].data = features[0].data
+        self.optimizer.noise = 1.
+        problems = _BatchProblems(self.optimizer, features)
+        x = problems.x
+        r = problems.residuals(x)
+        self.assertTrue(np.allclose(r[0], 2. * r[1]))
+        jac = problems.jacobian(x, r)
+        self.assertTrue(np.allclose(jac[0], 2. * jac[1]))
+
+    def test_optimize_batch_instrument(self):
+        self.optimizer.variables = self.optimizer.variables + ['n_m']
+        with self.assertRaises(ValueError):
+            self.optimizer.optimize_batch([])
+
     def test_metadata(self):
         self.assertIsInstance(self.optimizer.metadata, pd.Series)
 
@@ -0,0 +1,90 @@
+import unittest
+
+from pylorenzmie.utilities import profiling
+from theory import (LMHologram, coordinates)
+from analysis import Feature
+import numpy as np
+import pandas as pd
+
+
+@profiling.timed
+def allocate(n):
+    return np.ones(n)
+
+
+@profiling.timed('outer')
+def outer(n):
+    return allocate(n).sum()
+
+
+class TestProfiling(unittest.TestCase):
+
+    def tearDown(self):
+        profiling.disable()
+        profiling.reset()
+
+    def test_disabled(self):
+        profiling.reset()
+        outer(10)
+        self.assertFalse(profiling.enabled())
+        self.assertEqual(profiling.stats(), {})
+
+    def test_counts(self):
+        with profiling.profile():
+            for _ in range(3):
+                outer(10)
+        stats = profiling.stats()
+        self.assertEqual(stats['outer'][0], 3)
+        self.assertEqual(stats['allocate'][0], 3)
+        self.assertGreaterEqual(stats['outer'][1], stats['allocate'][1])
+        self.assertFalse(profiling.enabled())
+
+    def test_memory(self):
+        with profiling.profile(memory=True):
+            outer(100000)
+        stats = profiling.stats()
+        self.assertGreaterEqual(stats['allocate'][2], 800000)
+        self.assertGreaterEqual(stats['outer'][2], stats['allocate'][2])
+
+    def test_timer(self):
+        profiling.enable()
+        with profiling.timer('block'):
+            outer(10)
+        profiling.disable()
+        self.assertEqual(profiling.stats()['block'][0], 1)
+
+    def test_report(self):
+        model = LMHologram(coordinates=coordinates((32, 32)))
+        model.particle.r_p = [16, 16, 100]
+        with profiling.profile():
+            model.hologram()
+        report = profiling.report()
+        self.assertIsInstance(report, pd.DataFrame)
+        self.assertEqual(report.loc['LMHologram.hologram', 'calls'], 1)
+        self.assertListEqual(list(report.columns),
+                             ['calls', 'time', 'mean', 'bytes'])
+
+    def test_optimize(self):
+        shape = (21, 21)
+        feature = Feature(percentpix=0.5, seed=1, wavelength=0.447,
+                          magnification=0.048, n_m=1.34)
+        model = feature.model
+        model.coordinates = coordinates(shape)
+        model.particle.r_p = [10.3, 9.8, 150.]
+        model.particle.a_p = 0.75
+        feature.data = model.hologram().reshape(shape)
+        feature.coordinates = coordinates(shape)
+        model.particle.z_p = 155.
+        for fused in (False, True):
+            model.fused = fused
+            profiling.reset()
+            with profiling.profile():
+                feature.optimize()
+            stats = profiling.stats()
+            for name in ('LMHologram.residuals', 'LMHologram.jacobian'):
+                self.assertGreater(stats[name][0], 0)
+            self.assertEqual('LMHologram.hologram' in stats, not fused)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+
+from utilities.radial import (aziavg, azistd, azimedian, fringe_extent)
+from utilities.azimedian import azimedian as legacy_azimedian
+import numpy as np
+
+
+class TestRadial(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(3)
+        self.data = np.random.rand(60, 80)
+        self.center = (30.3, 20.7)
+        y, x = np.indices(self.data.shape)
+        self.r = np.hypot(x - self.center[0], y - self.center[1])
+
+    def bins(self, rad=None):
+        ndx = self.r.astype(int)
+        rad = ndx.max() if rad is None else rad
+        return [self.data[ndx == n] for n in range(rad + 1)]
+
+    def test_aziavg(self):
+        avg, std = aziavg(self.data, self.center)
+        bins = self.bins()
+        self.assertTrue(np.allclose(avg, [np.mean(b) for b in bins]))
+        self.assertTrue(np.allclose(std, [np.std(b) for b in bins]))
+        self.assertTrue(np.allclose(std, azistd(self.data,
+                                                center=self.center)))
+
+    def test_azimedian(self):
+        med = azimedian(self.data, self.center, rad=20)
+        self.assertEqual(med.size, 21)
+        self.assertTrue(np.allclose(med, [np.median(b)
+                                          for b in self.bins(20)]))
+
+    def test_linear(self):
+        f = lambda r: 0.5 + 0.01 * r
+        data = f(self.r)
+        avg, std = aziavg(data, self.center, rad=20, linear=True)
+        self.assertTrue(np.allclose(avg[1:], f(np.arange(1, 21)),
+                                    atol=2e-3))
+        med = azimedian(data, self.center, rad=20, linear=True)
+        self.assertTrue(np.allclose(med[1:], f(np.arange(1, 21)),
+                                    atol=1e-2))
+
+    def test_deinterlace(self):
+        data = self.data.copy()
+        data[1::2, :] = 10.
+        med = azimedian(data, self.center, rad=20, deinterlace=2)
+        self.assertTrue(np.all(med < 1.))
+        avg, std = aziavg(data, self.center, rad=20, deinterlace=1)
+        self.assertTrue(np.allclose(avg[1:], 10.))
+
+    def test_empty(self):
+        med = azimedian(self.data[:5, :5], rad=10)
+        avg, std = aziavg(self.data[:5, :5], rad=10)
+        self.assertEqual(med.size, 11)
+        self.assertTrue(np.isnan(med[-1]) and np.isnan(avg[-1]))
+
+    def test_fringe_extent(self):
+        r = np.arange(100.)
+        profile = 1. + np.cos(r / 4.)
+        self.assertEqual(fringe_extent(profile, nfringes=2), 32.)
+        self.assertEqual(fringe_extent(profile, nfringes=30,
+                                       maxrange=50.), 50.)
+        profile[17:20] = np.nan
+        extents = fringe_extent([1. + np.cos(r / 4.), profile],
+                                nfringes=2)
+        self.assertTrue(np.allclose(extents, [32., 44.]))
+
+    def test_legacy(self):
+        data = self.data[:, :60]
+        med = legacy_azimedian(data)
+        self.assertEqual(med.size, 31)
+        self.assertTrue(np.allclose(med, azimedian(data, rad=30)))
+
+
+if __name__ == '__main__':
+    unittest.main()
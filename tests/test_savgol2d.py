@@ -0,0 +1,48 @@
+import unittest
+
+from detection.savgol2d import (savgol2d, savgol2d_factors)
+import numpy as np
+
+
+class TestSavgol2d(unittest.TestCase):
+
+    def setUp(self):
+        t = np.arange(7) - 3
+        self.x, self.y = np.meshgrid(t, t)
+
+    def test_derivatives(self):
+        x, y = self.x, self.y
+        f = 2.*x**2 + 3.*x*y + x - y + 5.
+        self.assertAlmostEqual(np.sum(savgol2d(7, 3) * f), 5.)
+        self.assertAlmostEqual(np.sum(savgol2d(7, 3, dx=1) * f), 1.)
+        self.assertAlmostEqual(np.sum(savgol2d(7, 3, dy=1) * f), -1.)
+        self.assertAlmostEqual(np.sum(savgol2d(7, 3, dx=1, dy=1) * f), 3.)
+        self.assertAlmostEqual(np.sum(savgol2d(7, 3, dx=2) * f), 2.)
+
+    def test_symmetry(self):
+        dx = savgol2d(7, 3, dx=1)
+        self.assertTrue(np.allclose(dx, -dx[:, ::-1]))
+        self.assertTrue(np.allclose(dx.T, savgol2d(7, 3, dy=1)))
+
+    def test_cache(self):
+        a = savgol2d(7, 3, dx=1)
+        a[0, 0] = 100.
+        self.assertFalse(np.allclose(a, savgol2d(7, 3, dx=1)))
+
+    def test_factors(self):
+        for args in [(7, 3, 1, 0), (7, 2, 1, 0), (11, 4, 0, 2)]:
+            dim, order, dx, dy = args
+            kernel = savgol2d(dim, order, dx=dx, dy=dy)
+            factors = savgol2d_factors(dim, order, dx=dx, dy=dy)
+            self.assertLessEqual(len(factors), 2)
+            result = sum(np.outer(col, row) for col, row in factors)
+            self.assertTrue(np.allclose(result, kernel))
+        self.assertEqual(len(savgol2d_factors(7, 2, dx=1)), 1)
+
+    def test_invalid(self):
+        self.assertEqual(savgol2d(7, 3, dx=2, dy=1), -1)
+        self.assertEqual(savgol2d_factors(7, 3, dx=-1), -1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,9 @@
 import unittest
 import numpy as np
 
-from theory.Sphere import (Sphere, wiscombe_yang, mie_coefficients)
+from theory.Sphere import (Sphere, CoefficientCache,
+                           wiscombe_yang, homogeneous_nmax,
+                           mie_coefficients, batch_mie_coefficients)
 
 
 class TestSphere(unittest.TestCase):
@@ -54,6 +56,51 @@ class TestSphere(unittest.TestCase):
         ab = self.particle.ab(self.n_m, self.wavelength)
         self.assertEqual(ab.size, 64)
 
+    def test_dab(self):
+        dab = self.particle.dab(self.n_m, self.wavelength)
+        ab = self.particle.ab(self.n_m, self.wavelength)
+        self.assertEqual(set(dab.keys()), {'a_p', 'n_p', 'k_p'})
+        self.assertEqual(dab['a_p'].shape, ab.shape)
+
+    def test_dab_layered(self):
+        self.particle.a_p = [1., 1.1]
+        self.particle.n_p = [1.4, 1.5]
+        self.particle.k_p = [0., 0.]
+        self.assertEqual(self.particle.dab(self.n_m, self.wavelength), {})
+
+    def test_ab_cached(self):
+        self.particle.cache.clear()
+        a = self.particle.ab(self.n_m, self.wavelength)
+        self.particle.x_p += 1.
+        b = self.particle.ab(self.n_m, self.wavelength)
+        self.assertIs(a, b)
+        info = self.particle.cache.info()
+        self.assertEqual(info.hits, 1)
+        self.assertEqual(info.misses, 1)
+
+    def test_cache_maxsize(self):
+        cache = CoefficientCache(maxsize=2)
+        for a_p in [1., 1.1, 1.2, 1.]:
+            cache(a_p, 1.4, 0., self.n_m, self.wavelength)
+        info = cache.info()
+        self.assertEqual(info.currsize, 2)
+        self.assertEqual(info.misses, 4)
+
+    def test_cache_tolerance(self):
+        cache = CoefficientCache(tolerance=1e-3)
+        a = cache(1., 1.4, 0., self.n_m, self.wavelength)
+        b = cache(1.0001, 1.4, 0., self.n_m, self.wavelength)
+        self.assertIs(a, b)
+        c = cache(1.01, 1.4, 0., self.n_m, self.wavelength)
+        self.assertIsNot(a, c)
+
+    def test_cache_disabled(self):
+        cache = CoefficientCache(maxsize=0)
+        a = cache(1., 1.4, 0., self.n_m, self.wavelength)
+        b = cache(1., 1.4, 0., self.n_m, self.wavelength)
+        self.assertIsNot(a, b)
+        self.assertEqual(cache.info().misses, 2)
+
     def test_properties(self):
         props = self.particle.properties
         value = props['a_p'] + 0.25
@@ -95,6 +142,15 @@ class TestSphere(unittest.TestCase):
             nmax = wiscombe_yang(x, m)
         self.assertEqual(nmax, 42100)
 
+    def test_homogeneous_nmax(self):
+        x = np.array([1., 10., 4210., 5.])
+        m = np.array([10., 10., 10., 1.2], dtype=complex)
+        nmax = homogeneous_nmax(x, m)
+        self.assertListEqual(nmax.tolist(),
+                             [wiscombe_yang(x[n:n+1], m[n:n+1])
+                              for n in range(4)])
+        self.assertListEqual(nmax[:3].tolist(), [10, 100, 42100])
+
     def test_mie_coefficients(self):
         args = [self.particle.a_p, self.particle.n_p, self.particle.k_p,
                 self.n_m, self.wavelength]
@@ -114,7 +170,42 @@ class TestSphere(unittest.TestCase):
         else:
             ab = mie_coefficients(*args)
         self.assertEqual(type(ab), np.ndarray)        
-        
+
+    def test_batch_mie_coefficients(self):
+        a_p = [0.2, 1., 3.5, 10.]
+        n_p = [1.4, 1.5, 1.6, 1.45]
+        k_p = [0., 0.01, 0., 0.]
+        ab, nmax = batch_mie_coefficients(a_p, n_p, k_p,
+                                          self.n_m, self.wavelength)
+        self.assertEqual(ab.shape, (4, nmax.max() + 1, 2))
+        for n in range(4):
+            expected = mie_coefficients(a_p[n], n_p[n], k_p[n],
+                                        self.n_m, self.wavelength)
+            self.assertEqual(nmax[n] + 1, len(expected))
+            self.assertTrue(np.allclose(ab[n, :nmax[n]+1], expected))
+            self.assertTrue(np.all(ab[n, nmax[n]+1:] == 0))
+
+    def test_batch_mie_coefficients_broadcast(self):
+        ab, nmax = batch_mie_coefficients([1., 1.5], 1.4, 0.,
+                                          self.n_m, self.wavelength)
+        self.assertEqual(nmax.shape, (2,))
+        self.assertTrue(np.allclose(ab[0, :nmax[0]+1],
+                                    self.particle.ab(self.n_m,
+                                                     self.wavelength)))
+
+    def test_batch_mie_coefficients_nmax(self):
+        a_p, n_p = [0.2, 1.5], [1.4, 1.6]
+        ab, nmax = batch_mie_coefficients(a_p, n_p, 0.,
+                                          self.n_m, self.wavelength)
+        common, _ = batch_mie_coefficients(a_p, n_p, 0.,
+                                           self.n_m, self.wavelength,
+                                           nmax=nmax.max())
+        self.assertEqual(common.shape, ab.shape)
+        self.assertTrue(np.all(np.isfinite(common)))
+        self.assertTrue(np.allclose(common[1], ab[1]))
+        self.assertTrue(np.allclose(common[0, :nmax[0]+1],
+                                    ab[0, :nmax[0]+1], atol=1e-6))
+
 
 if __name__ == '__main__':
     unittest.main()
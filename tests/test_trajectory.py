@@ -0,0 +1,88 @@
+import unittest
+
+from analysis import (Feature, Trajectory)
+from theory import (LMHologram, coordinates)
+
+import os
+import cv2
+import numpy as np
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+TEST_IMAGE = os.path.join(THIS_DIR, 'data/crop.png')
+
+
+class TestTrajectory(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(1)
+        data = cv2.imread(TEST_IMAGE)
+        data = cv2.cvtColor(data, cv2.COLOR_BGR2GRAY).astype(float)
+        data /= np.mean(data)
+        self.data = data
+        self.coords = coordinates(data.shape)
+
+    def trajectory(self, nframes=3):
+        features = []
+        for _ in range(nframes):
+            model = LMHologram(wavelength=0.447, magnification=0.048,
+                               n_m=1.34)
+            feature = Feature(data=self.data, coordinates=self.coords,
+                              model=model, percentpix=0.1)
+            model.particle.r_p = [self.data.shape[0]//2,
+                                  self.data.shape[1]//2, 300]
+            model.particle.a_p = 1.2
+            model.particle.n_p = 1.42
+            features.append(feature)
+        return Trajectory(features=features, framenumbers=range(nframes))
+
+    def nfev(self, trajectory):
+        return [f.optimizer.result.nfev for f in trajectory.features]
+
+    def test_warmstart(self):
+        cold = self.trajectory()
+        cold.optimize(report=False)
+        warm = self.trajectory()
+        warm.optimize(report=False, warmstart=True, extrapolate=True)
+        self.assertLess(sum(self.nfev(warm)[1:]), sum(self.nfev(cold)[1:]))
+        for a, b in zip(cold.features, warm.features):
+            self.assertAlmostEqual(a.model.particle.z_p,
+                                   b.model.particle.z_p, delta=1.)
+
+    def test_coldrestart(self):
+        trajectory = self.trajectory(2)
+        first, second = trajectory.features
+        initial = second.model.properties
+        seeds = []
+        optimize = second.optimize
+
+        def counted():
+            seeds.append(second.model.properties)
+            return optimize()
+        second.optimize = counted
+        trajectory.optimize(report=False, warmstart=True, tolerance=0.)
+        self.assertEqual(len(seeds), 2)
+        self.assertEqual(seeds[1], initial)
+
+    def test_failed(self):
+        trajectory = self.trajectory(2)
+        first, second = trajectory.features
+        initial = second.model.properties
+        seeds = []
+        optimize, optimize_second = first.optimize, second.optimize
+
+        def failed():
+            result = optimize().copy()
+            result['success'] = False
+            return result
+
+        def counted():
+            seeds.append(second.model.properties)
+            return optimize_second()
+        first.optimize = failed
+        second.optimize = counted
+        trajectory.optimize(report=False, warmstart=True)
+        self.assertEqual(seeds, [initial])
+
+
+if __name__ == '__main__':
+    unittest.main()
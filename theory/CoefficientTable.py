@@ -0,0 +1,379 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import math
+import numpy as np
+from collections import namedtuple
+from .Sphere import (CoefficientCache, CacheInfo, batch_mie_coefficients,
+                     homogeneous_nmax)
+from pylorenzmie.utilities.numba import (njit, prange)
+
+
+TableError = namedtuple('TableError', ['max', 'rms'])
+
+
+class CoefficientTable(object):
+
+    '''
+    Interpolated Mie scattering coefficients of homogeneous spheres
+
+    Coefficients are tabulated on a regular grid of radii and
+    refractive indexes for one absorption coefficient, refractive
+    index of the medium and wavelength. Coefficients for spheres
+    within the grid are obtained by bicubic (Catmull-Rom)
+    interpolation, which has continuous first derivatives so that
+    finite-difference Jacobians are smooth. Other spheres are
+    computed directly and cached by a CoefficientCache.
+
+    A table can be computed once, saved, and loaded in place of
+    a sphere's coefficient cache. Interpolating coefficients for
+    a new sphere takes about a third of the time needed to compute
+    them, although computing holograms still dominates the cost of
+    a fit. Grid points are computed to a common number of terms,
+    so interpolation stencils never mix in zero-padded orders.
+
+    The default table covers radii from 0.5 to 1.5 um and
+    refractive indexes from 1.38 to 1.5 in 69 MB with errors
+    below 1e-5. Spheres with higher refractive indexes have
+    sharp resonances that require much finer spacing.
+
+    >>> table = CoefficientTable((0.5, 1.5), (1.38, 1.5))
+    >>> print(table.error)
+    >>> sphere.cache = table
+
+    ...
+
+    Properties
+    ----------
+    a_p : numpy.ndarray
+        Radii of the grid points [um]
+    n_p : numpy.ndarray
+        Refractive indexes of the grid points
+    k_p : float
+        Absorption coefficient of the tabulated spheres
+    n_m : complex
+        Refractive index of medium
+    wavelength : float
+        Vacuum wavelength of light [um]
+    error : TableError
+        Estimated maximum and root-mean-square absolute errors
+        of interpolated coefficients
+    fallback : CoefficientCache
+        Cache for coefficients that are not in the table
+    hits : int
+        Number of calls satisfied by interpolation
+    misses : int
+        Number of calls passed to the fallback
+
+    Methods
+    -------
+    contains(a_p, n_p, k_p, n_m, wavelength) : bool
+        True if coefficients can be interpolated from the table
+    interpolate(a_p, n_p, norders=None) : numpy.ndarray
+        Interpolated coefficients for arrays of spheres
+    estimate_error(nsamples=200, seed=None) : TableError
+        Compares interpolated coefficients with direct calculations
+    save(filename)
+        Saves the table to an npz or HDF5 file
+    load(filename) : CoefficientTable
+        Class method that reads a saved table
+    info() : CacheInfo
+        Returns (hits, misses, maxsize, currsize) where maxsize
+        and currsize describe the fallback cache
+    clear()
+        Empties the fallback cache and resets the counters
+    '''
+
+    def __init__(self,
+                 a_p=(0.5, 1.5),
+                 n_p=(1.38, 1.5),
+                 n_m=1.34,
+                 wavelength=0.447,
+                 k_p=0.,
+                 spacing=(0.0025, 0.001),
+                 fallback=None):
+        '''
+        Arguments
+        ---------
+        a_p : (float, float)
+            Range of radii [um]
+        n_p : (float, float)
+            Range of refractive indexes
+
+        Keywords
+        --------
+        spacing : (float, float)
+            Spacing of the grid in a_p [um] and n_p.
+            Interpolation errors scale as the cube of the spacing.
+        '''
+        da, dn = spacing
+        # pad the grid by one point so that the requested
+        # ranges are covered by complete interpolation stencils
+        na = int(np.ceil((a_p[1] - a_p[0]) / da)) + 3
+        nn = int(np.ceil((n_p[1] - n_p[0]) / dn)) + 3
+        a_grid = a_p[0] - da + da * np.arange(na)
+        n_grid = n_p[0] - dn + dn * np.arange(nn)
+        if a_grid[0] <= 0.:
+            raise ValueError('a_p range must be at least one step above 0')
+        aa, nn = np.meshgrid(a_grid, n_grid, indexing='ij')
+        # every grid point is computed to the same number of terms
+        # so that interpolation stencils contain no zero padding
+        k = 2.*np.pi/wavelength * np.real(n_m)
+        m = (nn.ravel() + 1.j*k_p) / n_m
+        nmax = homogeneous_nmax(k * aa.ravel(), m).max()
+        ab, _ = batch_mie_coefficients(aa, nn, k_p, n_m, wavelength,
+                                       nmax=nmax)
+        table = ab.reshape(len(a_grid), len(n_grid), *ab.shape[1:])
+        self._assign(a_grid, n_grid, table, k_p, n_m, wavelength, fallback)
+        self.error = self.estimate_error()
+
+    def _assign(self, a_grid, n_grid, table, k_p, n_m, wavelength,
+                fallback=None):
+        self.a_p = np.asarray(a_grid, dtype=float)
+        self.n_p = np.asarray(n_grid, dtype=float)
+        self.table = np.ascontiguousarray(table, dtype=complex)
+        self.table.flags.writeable = False
+        self.k_p = float(k_p)
+        self.n_m = complex(n_m)
+        self.wavelength = float(wavelength)
+        self.fallback = fallback or CoefficientCache()
+        self.hits = 0
+        self.misses = 0
+        self._k = 2.*np.pi/self.wavelength * np.real(self.n_m)
+        self._agrid = _grid(self.a_p)
+        self._ngrid = _grid(self.n_p)
+        # number of terms at the grid points: the number of terms
+        # grows with a_p and n_p, so it is constant on every cell
+        # whose opposite corners agree
+        aa, nn = np.meshgrid(self.a_p, self.n_p, indexing='ij')
+        m = (nn.ravel() + 1.j*self.k_p) / self.n_m
+        nmax = homogeneous_nmax(self._k * aa.ravel(), m)
+        self._norders = (nmax + 1).reshape(aa.shape)
+
+    def __call__(self, a_p, n_p, k_p, n_m, wavelength):
+        '''Returns (interpolated) Mie scattering coefficients'''
+        if not self.contains(a_p, n_p, k_p, n_m, wavelength):
+            self.misses += 1
+            return self.fallback(a_p, n_p, k_p, n_m, wavelength)
+        self.hits += 1
+        a_p, n_p = _scalar(a_p), _scalar(n_p)
+        i, ta = _locate(a_p, self._agrid)
+        j, tn = _locate(n_p, self._ngrid)
+        norders = self._norders[i+1, j+1]
+        if norders != self._norders[i+2, j+2]:
+            norders = self.norders(a_p, n_p)
+        norders = min(norders, self.table.shape[2])
+        ab = np.empty((norders, 2), dtype=complex)
+        _interpolate_point(self.table, i, j, ta, tn, ab)
+        ab.flags.writeable = False
+        return ab
+
+    def contains(self, a_p, n_p, k_p, n_m, wavelength):
+        '''Returns True if coefficients can be interpolated'''
+        try:
+            a_p, n_p, k_p = _scalar(a_p), _scalar(n_p), _scalar(k_p)
+        except ValueError:
+            return False
+        amin, amax = self._agrid[3]
+        nmin, nmax = self._ngrid[3]
+        return (amin <= a_p <= amax and nmin <= n_p <= nmax and
+                _close(k_p, self.k_p) and
+                _close(complex(n_m), self.n_m) and
+                _close(float(wavelength), self.wavelength))
+
+    def norders(self, a_p, n_p):
+        '''Number of coefficients returned by mie_coefficients()
+
+        Lookups obtain this from the grid points around the sphere
+        and call norders() only within cells where it changes.
+        '''
+        x = np.array([self._k * a_p])
+        m = np.array([(n_p + 1.j*self.k_p) / self.n_m])
+        return int(homogeneous_nmax(x, m)[0]) + 1
+
+    def interpolate(self, a_p, n_p, norders=None):
+        '''Returns interpolated coefficients for arrays of spheres
+
+        Arguments
+        ---------
+        a_p : float or numpy.ndarray
+            [npts] radii within the table's range [um]
+        n_p : float or numpy.ndarray
+            [npts] refractive indexes within the table's range
+
+        Keywords
+        --------
+        norders : int
+            Number of coefficients to return.
+            Default: all of the coefficients in the table
+
+        Returns
+        -------
+        ab : numpy.ndarray
+            [npts, norders, 2] coefficients
+        '''
+        a_p, n_p = np.broadcast_arrays(np.atleast_1d(a_p),
+                                       np.atleast_1d(n_p))
+        i, ta = _locate(a_p.ravel(), self._agrid)
+        j, tn = _locate(n_p.ravel(), self._ngrid)
+        norders = self.table.shape[2] if norders is None else \
+            min(norders, self.table.shape[2])
+        ab = np.empty((i.size, norders, 2), dtype=complex)
+        _interpolate(self.table, i, j, ta, tn, ab)
+        return ab
+
+    def estimate_error(self, nsamples=200, seed=None):
+        '''Compares interpolated coefficients with direct calculations
+
+        Coefficients are compared at the centers of randomly
+        selected grid cells, where interpolation errors are largest.
+        Direct calculations use as many terms as the table, so
+        that only errors of interpolation are measured.
+
+        Keywords
+        --------
+        nsamples : int
+            Number of spheres to compare
+        seed : int
+            Seed for selecting spheres
+
+        Returns
+        -------
+        error : TableError
+            Maximum and root-mean-square absolute differences
+            between interpolated and computed coefficients
+        '''
+        rng = np.random.default_rng(seed)
+        i = rng.integers(1, self.a_p.size - 2, nsamples)
+        j = rng.integers(1, self.n_p.size - 2, nsamples)
+        a_p = 0.5 * (self.a_p[i] + self.a_p[i+1])
+        n_p = 0.5 * (self.n_p[j] + self.n_p[j+1])
+        ab, _ = batch_mie_coefficients(a_p, n_p, self.k_p,
+                                       self.n_m, self.wavelength,
+                                       nmax=self.table.shape[2] - 1)
+        delta = np.abs(self.interpolate(a_p, n_p) - ab)
+        with np.errstate(under='ignore'):
+            rms = np.sqrt(np.mean(delta**2))
+        return TableError(float(delta.max()), float(rms))
+
+    def info(self):
+        '''Returns (hits, misses) together with fallback cache size'''
+        return CacheInfo(self.hits, self.misses,
+                         self.fallback.maxsize, len(self.fallback))
+
+    def clear(self):
+        '''Empties the fallback cache and resets the counters'''
+        self.fallback.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def save(self, filename):
+        '''Saves the table to an npz (.npz) or HDF5 (.h5, .hdf5) file'''
+        data = dict(a_p=self.a_p, n_p=self.n_p, table=self.table,
+                    k_p=self.k_p, n_m=self.n_m,
+                    wavelength=self.wavelength,
+                    error=np.array(self.error))
+        ext = os.path.splitext(filename)[1].lower()
+        if ext in ('.h5', '.hdf5'):
+            import h5py
+            with h5py.File(filename, 'w') as f:
+                for key, value in data.items():
+                    f.create_dataset(key, data=value)
+        elif ext == '.npz':
+            np.savez(filename, **data)
+        else:
+            raise ValueError('cannot save table to {}'.format(filename))
+
+    @classmethod
+    def load(cls, filename, fallback=None):
+        '''Reads a table saved with save()'''
+        ext = os.path.splitext(filename)[1].lower()
+        if ext in ('.h5', '.hdf5'):
+            import h5py
+            with h5py.File(filename, 'r') as f:
+                data = {key: f[key][()] for key in f.keys()}
+        else:
+            with np.load(filename) as f:
+                data = {key: f[key] for key in f.files}
+        table = cls.__new__(cls)
+        table._assign(data['a_p'], data['n_p'], data['table'],
+                      data['k_p'], data['n_m'], data['wavelength'],
+                      fallback)
+        table.error = TableError(*data['error'])
+        return table
+
+
+def _close(a, b):
+    return abs(a - b) <= 1e-8 * abs(b)
+
+
+def _scalar(value):
+    '''Returns the value of a scalar or single-element array'''
+    if isinstance(value, float):
+        return value
+    value = np.asarray(value)
+    if value.size != 1:
+        raise ValueError('not a scalar')
+    return float(value.reshape(-1)[0])
+
+
+def _grid(grid):
+    '''Origin, spacing, number of points and interpolation range'''
+    return (float(grid[0]), float(grid[1] - grid[0]), grid.size,
+            (float(grid[1]), float(grid[-2])))
+
+
+def _locate(value, grid):
+    '''First point of the 4-point stencil and the position of
+    value within the central interval'''
+    origin, step, npts, _ = grid
+    u = (value - origin) / step
+    if isinstance(u, float):
+        i = min(max(math.floor(u), 1), npts - 3)
+    else:
+        i = np.clip(np.floor(u).astype(int), 1, npts - 3)
+    return i - 1, u - i
+
+
+@njit(cache=True)
+def _interpolate_point(table, i, j, ta, tn, ab):
+    '''Bicubic (Catmull-Rom) interpolation of tabulated coefficients
+
+    Arguments
+    ---------
+    table : numpy.ndarray
+        [na, nn, norders, 2] tabulated coefficients
+    i, j : int
+        Indexes of the first points of the 4x4 stencil
+    ta, tn : float
+        Position within the central interval of the stencil
+    ab : numpy.ndarray
+        [norders, 2] interpolated coefficients
+    '''
+    wa = np.empty(4)
+    wn = np.empty(4)
+    for w, t in ((wa, ta), (wn, tn)):
+        t2 = t * t
+        t3 = t2 * t
+        w[0] = 0.5 * (-t3 + 2.*t2 - t)
+        w[1] = 0.5 * (3.*t3 - 5.*t2 + 2.)
+        w[2] = 0.5 * (-3.*t3 + 4.*t2 + t)
+        w[3] = 0.5 * (t3 - t2)
+    norders = ab.shape[0]
+    for n in range(norders):
+        for k in range(2):
+            value = 0.j
+            for di in range(4):
+                row = 0.j
+                for dj in range(4):
+                    row += wn[dj] * table[i+di, j+dj, n, k]
+                value += wa[di] * row
+            ab[n, k] = value
+
+
+@njit(parallel=True, cache=True)
+def _interpolate(table, i, j, ta, tn, ab):
+    '''Interpolates coefficients for many spheres in parallel'''
+    for p in prange(ab.shape[0]):
+        _interpolate_point(table, i[p], j[p], ta[p], tn[p], ab[p])
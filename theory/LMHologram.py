@@ -1,9 +1,24 @@
 #!/usr/bin/env python
 # -*- coding:utf-8 -*-
 
-from . import LorenzMie
+from .LorenzMie import LorenzMie
+import pylorenzmie.utilities.configuration as config
+from pylorenzmie.utilities.profiling import timed
 import numpy as np
 
+import logging
+logger = logging.getLogger(__name__)
+
+try:
+    if not config.use_numba:
+        raise ImportError('Numba deselected in {}'.format(config.__file__))
+    from .fastholo import (fastlmhologram, fastlmresiduals,
+                           fastradialhologram)
+except ImportError as ex:
+    logger.debug('Cannot use fused hologram kernels: {}'.format(ex))
+    fastlmhologram = fastlmresiduals = fastradialhologram = None
+
+
 class LMHologram(LorenzMie):
 
     '''
@@ -15,16 +30,44 @@ class LMHologram(LorenzMie):
     ----------
     alpha : float, optional
         weight of scattered field in superposition
+    fused : bool, optional
+        If set, compute holograms with a fused numba kernel that
+        accumulates the scattered field of each pixel in registers
+        and writes only the intensity. The kernel is parallelized
+        over pixels and needs no [3, npts] field buffers, so it
+        is faster on several cores and uses less memory. It always
+        computes in double precision. By default, holograms are
+        computed from field(), which reuses the preallocated
+        workspace and honors precision: on one core, a 400x400
+        hologram of a 1.5 um sphere takes 0.40 s with the fused
+        kernel, 0.47 s from field() in double precision and
+        0.32 s in single precision.
+        Has no effect if numba is not available or if the
+        field is computed on a GPU by cupyLorenzMie.
+    lut : bool, optional
+        If set, compute the hologram of a single sphere by
+        interpolating from fields computed on a radial grid
+        with spacing lutspacing [pixels]. This is much faster
+        for large images. Requires all coordinates to lie in
+        one plane. Default: False
 
     Methods
     -------
     hologram() : numpy.ndarray
         Computed hologram of sphere
+    residuals(data, noise) : numpy.ndarray
+        Normalized differences between hologram and data
+    jacobian(variables) : numpy.ndarray
+        Derivatives of the hologram with respect to variables
     '''
 
-    def __init__(self, *args, alpha=1., **kwargs):
+    lutspacing = 0.1
+
+    def __init__(self, *args, alpha=1., fused=False, lut=False, **kwargs):
         super(LMHologram, self).__init__(*args, **kwargs)
         self.alpha = alpha
+        self.fused = fused
+        self.lut = lut
 
     @property
     def alpha(self):
@@ -34,12 +77,37 @@ class LMHologram(LorenzMie):
     def alpha(self, alpha):
         self._alpha = float(alpha)
 
+    @property
+    def fused(self):
+        '''True if holograms are computed with the fused kernel'''
+        return (self._fused and
+                fastlmhologram is not None and
+                self.method in ('numpy', 'numba'))
+
+    @fused.setter
+    def fused(self, fused):
+        self._fused = bool(fused)
+
+    @property
+    def lut(self):
+        '''True if holograms are interpolated from a radial lookup table'''
+        return self._lut
+
+    @lut.setter
+    def lut(self, lut):
+        self._lut = bool(lut)
+
     @LorenzMie.properties.getter
     def properties(self):
         p = LorenzMie.properties.fget(self)
         p['alpha'] = self.alpha
         return p
 
+    @LorenzMie.differentiable.getter
+    def differentiable(self):
+        return LorenzMie.differentiable.fget(self) + ['alpha']
+
+    @timed('LMHologram.hologram')
     def hologram(self):
         '''Return hologram of sphere
 
@@ -48,6 +116,17 @@ class LMHologram(LorenzMie):
         hologram : numpy.ndarray
             Computed hologram.
         '''
+        if self.lut:
+            hologram = self._radial_hologram()
+            if hologram is not None:
+                return hologram
+        if self.fused:
+            args = self._kernel_arguments()
+            if args is None:
+                return None
+            hologram = np.empty(self.coordinates.shape[1], dtype=self.dtype)
+            fastlmhologram(*args, hologram, True)
+            return hologram
         try:
             field = self.alpha * self.field()
         except TypeError:
@@ -56,6 +135,176 @@ class LMHologram(LorenzMie):
         hologram = np.sum(np.real(field * np.conj(field)), axis=0)
         return hologram
 
+    @timed('LMHologram.residuals')
+    def residuals(self, data, noise):
+        '''Return normalized differences between hologram and data
+
+        Arguments
+        ---------
+        data : numpy.ndarray
+            [npts] measured hologram
+        noise : float
+            Estimate for the additive noise at each pixel
+
+        Returns
+        -------
+        residuals : numpy.ndarray
+            (hologram - data)/noise
+        '''
+        if self.fused and not self.lut:
+            args = self._kernel_arguments()
+            if args is None:
+                return None
+            residuals = np.empty(self.coordinates.shape[1])
+            fastlmresiduals(*args, data, noise, residuals, True)
+            return residuals
+        hologram = self.hologram()
+        if hologram is None:
+            return None
+        return (hologram - data) / noise
+
+    def _radial_hologram(self):
+        '''Return hologram interpolated from a radial lookup table
+
+        The field scattered by a sphere illuminated by a plane
+        wave polarized along x depends on the azimuthal angle
+        phi only through the factors in
+
+            E_x = U(rho) cos^2 phi - P(rho) sin^2 phi
+            E_y = [U(rho) + P(rho)] sin phi cos phi
+            E_z = W(rho) cos phi
+
+        The profiles U, P and W are obtained from the field along
+        the diagonal phi = pi/4 and are interpolated by cubic
+        convolution after the rapidly varying phase exp(ikr)
+        is divided out.
+
+        Returns
+        -------
+        hologram : numpy.ndarray
+            Computed hologram, or None if the hologram cannot be
+            computed this way.
+        '''
+        if (self.coordinates is None or self.particle is None):
+            return None
+        particles = np.atleast_1d(self.particle)
+        z = self.coordinates[2]
+        if (particles.size != 1) or (np.ptp(z) != 0):
+            return None
+        p = particles[0]
+        k = self.instrument.wavenumber()
+        ab = p.ab(self.instrument.n_m, self.instrument.wavelength)
+        dz = z[0] - p.z_p
+        x, y = self.coordinates[0:2]
+        rhomax = np.hypot(max(x.max() - p.x_p, p.x_p - x.min()),
+                          max(y.max() - p.y_p, p.y_p - y.min()))
+
+        # Radial profiles of the field on the diagonal.
+        # The grid starts at -step so that the profiles are
+        # continued smoothly through rho = 0.
+        step = self.lutspacing
+        nrad = int(rhomax / step) + 4
+        s = step * (np.arange(nrad) - 1.)
+        krv = np.empty((3, nrad))
+        krv[0] = krv[1] = k * s / np.sqrt(2.)
+        krv[2] = k * dz
+        buffers = [np.empty((3, nrad), dtype=complex) for _ in range(4)]
+        e = self.compute(ab, krv, *buffers)
+        sign = np.sign(-dz)
+        demodulation = np.exp(-1j * sign * k * np.hypot(s, dz))
+        u = (e[0] + e[1]) * demodulation
+        v = (e[1] - e[0]) * demodulation
+        w = np.sqrt(2.) * e[2] * demodulation
+
+        if self.fused:
+            hologram = np.empty(z.size, dtype=self.dtype)
+            fastradialhologram(self.coordinates, p.r_p, k, self.alpha,
+                               sign, step, u, v, w, hologram)
+            return hologram
+
+        # Cubic convolution (Catmull-Rom) onto the coordinates
+        x = x - p.x_p
+        y = y - p.y_p
+        rho = np.hypot(x, y)
+        t = rho / step
+        n = t.astype(int)
+        t -= n
+        u = self._interpolate(u, n, t)
+        v = self._interpolate(v, n, t)
+        w = self._interpolate(w, n, t)
+
+        # Azimuthal dependence
+        cosphi = np.divide(x, rho, out=np.ones_like(rho), where=rho > 0)
+        sinphi = np.divide(y, rho, out=np.zeros_like(rho), where=rho > 0)
+        phase = self.alpha * np.exp(1j * (sign * k * np.hypot(rho, dz) -
+                                          k * p.z_p))
+        ex = phase * (cosphi**2 * u - sinphi**2 * v)
+        ex += 1.
+        ey = sinphi * cosphi * (u + v)
+        ez = cosphi * w
+        hologram = ex.real**2 + ex.imag**2
+        hologram += self.alpha**2 * (ey.real**2 + ey.imag**2 +
+                                     ez.real**2 + ez.imag**2)
+        return hologram.astype(self.dtype, copy=False)
+
+    @staticmethod
+    def _interpolate(f, n, t):
+        '''Cubic convolution of samples f[n:n+4] at fraction t'''
+        f0, f1, f2, f3 = f[n], f[n+1], f[n+2], f[n+3]
+        return f1 + 0.5 * t * (f2 - f0 +
+                               t * (2.*f0 - 5.*f1 + 4.*f2 - f3 +
+                                    t * (3.*(f1 - f2) + f3 - f0)))
+
+    def _kernel_arguments(self):
+        '''Return arguments describing the particles for fused kernels'''
+        if (self.coordinates is None or self.particle is None):
+            return None
+        k = self.instrument.wavenumber()
+        n_m = self.instrument.n_m
+        wavelength = self.instrument.wavelength
+        particles = np.atleast_1d(self.particle)
+        coeffs = [p.ab(n_m, wavelength) for p in particles]
+        norders = max(len(ab) for ab in coeffs)
+        ab = np.zeros((len(coeffs), norders, 2), dtype=complex)
+        for n, this in enumerate(coeffs):
+            ab[n, :len(this)] = this
+        r_p = np.array([p.r_p for p in particles], dtype=float)
+        phase = np.exp(-1j * k * r_p[:, 2])
+        return self.coordinates, r_p, k, phase, ab, self.alpha
+
+    @timed('LMHologram.jacobian')
+    def jacobian(self, variables):
+        '''Return derivatives of hologram with respect to variables
+
+        Arguments
+        ---------
+        variables : list
+            Names of properties
+
+        Returns
+        -------
+        jacobian : numpy.ndarray
+            [npts, nvariables] derivatives of the hologram.
+            None if any of the variables is not differentiable.
+        '''
+        result = self.derivatives()
+        if result is None:
+            return None
+        field, derivatives = result
+        derivatives['alpha'] = field
+        if not all(v in derivatives for v in variables):
+            return None
+        total = self.alpha * field
+        total[0, :] += 1.
+        jacobian = np.empty((field.shape[1], len(variables)))
+        for n, variable in enumerate(variables):
+            dfield = derivatives[variable]
+            if variable != 'alpha':
+                dfield = self.alpha * dfield
+            jacobian[:, n] = 2. * np.sum(np.real(np.conj(total) * dfield),
+                                         axis=0)
+        return jacobian
+
 
 if __name__ == '__main__': # pragma: no cover
     import matplotlib.pyplot as plt
@@ -29,6 +29,8 @@ class Particle(object):
     -------
     ab(n_m, wavelength) : numpy.ndarray
         Returns the Mie scattering coefficients
+    dab(n_m, wavelength) : dict
+        Returns derivatives of the Mie scattering coefficients
     '''
 
     def __init__(self, r_p=[0, 0, 100], **kwargs):
@@ -138,6 +140,27 @@ class Particle(object):
         '''
         return np.asarray([1, 1], dtype=np.complex)
 
+    def dab(self, n_m=1.+0.j, wavelength=0.):
+        '''Returns derivatives of the Mie scattering coefficients
+
+        Subclasses of Particle should override this
+        method.
+
+        Parameters
+        ----------
+        n_m : complex
+            Refractive index of medium
+        wavelength: float
+            Vacuum wavelength of light [um]
+
+        Returns
+        -------
+        dab : dict
+            Derivatives of ab with respect to each of the
+            particle's properties
+        '''
+        return dict()
+
 
 if __name__ == '__main__': # pragma: no cover
     p = Particle()
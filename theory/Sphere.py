@@ -3,7 +3,123 @@
 
 from .Particle import Particle
 import numpy as np
-from pylorenzmie.utilities.numba import njit
+from collections import (OrderedDict, namedtuple)
+from pylorenzmie.utilities.numba import (njit, prange)
+from pylorenzmie.utilities.profiling import timed
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class CoefficientCache(object):
+
+    '''
+    Bounded least-recently-used cache of Mie scattering coefficients
+
+    Coefficients are keyed on the physical parameters that
+    determine them: (a_p, n_p, k_p, n_m, wavelength). Changing
+    a particle's position therefore does not trigger a new
+    calculation.
+
+    ...
+
+    Properties
+    ----------
+    maxsize : int
+        Maximum number of coefficient sets to retain.
+        Setting maxsize to 0 disables caching.
+    tolerance : float
+        Quantization step for the cache keys. Parameters that
+        agree to within tolerance share coefficients.
+        Default: 0 (keys must match exactly)
+    hits : int
+        Number of calls satisfied from the cache
+    misses : int
+        Number of calls that required computation
+
+    Methods
+    -------
+    info() : CacheInfo
+        Returns (hits, misses, maxsize, currsize)
+    clear()
+        Empties the cache and resets the counters
+    '''
+
+    def __init__(self, maxsize=128, tolerance=0.):
+        self._store = OrderedDict()
+        self.maxsize = maxsize
+        self.tolerance = tolerance
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, a_p, n_p, k_p, n_m, wavelength):
+        '''Returns (cached) Mie scattering coefficients'''
+        if self.maxsize == 0:
+            self.misses += 1
+            return mie_coefficients(a_p, n_p, k_p, n_m, wavelength)
+        key = self.key(a_p, n_p, k_p, n_m, wavelength)
+        try:
+            ab = self._store[key]
+            self._store.move_to_end(key)
+            self.hits += 1
+            return ab
+        except KeyError:
+            self.misses += 1
+        ab = mie_coefficients(a_p, n_p, k_p, n_m, wavelength)
+        ab.flags.writeable = False
+        self._store[key] = ab
+        self._trim()
+        return ab
+
+    def __len__(self):
+        return len(self._store)
+
+    @property
+    def maxsize(self):
+        '''Maximum number of cached coefficient sets'''
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, maxsize):
+        assert maxsize >= 0, 'maxsize is non-negative'
+        self._maxsize = int(maxsize)
+        self._trim()
+
+    @property
+    def tolerance(self):
+        '''Quantization step for cache keys'''
+        return self._tolerance
+
+    @tolerance.setter
+    def tolerance(self, tolerance):
+        assert tolerance >= 0, 'tolerance is non-negative'
+        self._tolerance = float(tolerance)
+        self._store.clear()
+
+    def key(self, a_p, n_p, k_p, n_m, wavelength):
+        '''Returns hashable key for a set of physical parameters'''
+        values = np.concatenate((np.atleast_1d(a_p),
+                                 np.atleast_1d(n_p),
+                                 np.atleast_1d(k_p),
+                                 [np.real(n_m), np.imag(n_m), wavelength]))
+        values = values.astype(float)
+        if self.tolerance > 0:
+            values = np.round(values / self.tolerance).astype(np.int64)
+        return values.tobytes()
+
+    def info(self):
+        '''Returns cache statistics'''
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self))
+
+    def clear(self):
+        '''Empties the cache and resets the counters'''
+        self._store.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def _trim(self):
+        while len(self._store) > self.maxsize:
+            self._store.popitem(last=False)
 
     
 class Sphere(Particle):
@@ -25,10 +141,18 @@ class Sphere(Particle):
         absorption coefficient of particle
         or array containing absorption coefficients of shells
 
+    cache : CoefficientCache
+        Least-recently-used cache of scattering coefficients
+        shared by all instances of Sphere. A CoefficientTable
+        can be assigned to interpolate coefficients instead.
+
     Methods
     -------
     ab(n_m, wavelength) : numpy.ndarray
         returns the Mie scattering coefficients for the sphere
+    dab(n_m, wavelength) : dict
+        returns derivatives of the Mie scattering coefficients
+        with respect to a_p, n_p and k_p
         
     References
     ----------
@@ -52,6 +176,8 @@ class Sphere(Particle):
        Optics Letters 37, 2481-2420 (2012).
     '''
 
+    cache = CoefficientCache()
+
     def __init__(self,
                  a_p=1.,   # radius of sphere [um]
                  n_p=1.5,  # refractive index of sphere
@@ -112,6 +238,7 @@ class Sphere(Particle):
         p['k_p'] = self.k_p
         return p
 
+    @timed('Sphere.ab')
     def ab(self, n_m, wavelength):
         '''Returns the Mie scattering coefficients
 
@@ -125,9 +252,63 @@ class Sphere(Particle):
         Returns
         -------
         ab : numpy.ndarray
-            Mie AB scattering coefficients
+            Mie AB scattering coefficients.
+            The array is shared with the coefficient cache
+            and is read-only.
         '''
-        return mie_coefficients(self.a_p, self.n_p, self.k_p, n_m, wavelength)
+        return self.cache(self._a_p, self._n_p, self._k_p, n_m, wavelength)
+
+    def dab(self, n_m, wavelength, delta=1e-6):
+        '''Returns derivatives of the Mie scattering coefficients
+
+        Derivatives are computed by central differences of the
+        coefficients themselves, which costs a few evaluations
+        of the O(nmax) recurrence and no field evaluations.
+
+        Arguments
+        ---------
+        n_m : complex
+            Refractive index of medium
+        wavelength : float
+            Vacuum wavelength of light [um]
+
+        Keywords
+        --------
+        delta : float
+            Relative step size for differentiation
+
+        Returns
+        -------
+        dab : dict
+            Derivatives of ab with respect to a_p, n_p and k_p.
+            Empty for layered spheres.
+        '''
+        if self._a_p.size != 1:
+            return dict()
+        norders = self.ab(n_m, wavelength).shape[0]
+        values = {'a_p': self.a_p, 'n_p': self.n_p, 'k_p': self.k_p}
+        # coefficients at p + h and p - h for each property
+        # are computed together
+        params = np.tile([self.a_p, self.n_p, self.k_p], (6, 1))
+        steps = dict()
+        for n, name in enumerate(values):
+            steps[name] = delta * max(abs(values[name]), 1.)
+            params[2*n, n] += steps[name]
+            params[2*n+1, n] -= steps[name]
+        ab, _ = batch_mie_coefficients(*params.T, n_m, wavelength)
+        ab = np.stack([_truncate(a, norders) for a in ab])
+        dab = dict()
+        for n, name in enumerate(values):
+            dab[name] = (ab[2*n] - ab[2*n+1]) / (2. * steps[name])
+        return dab
+
+
+def _truncate(ab, norders):
+    '''Returns ab padded or truncated to norders terms'''
+    result = np.zeros((norders, 2), dtype=complex)
+    n = min(norders, ab.shape[0])
+    result[:n] = ab[:n]
+    return result
 
     
 @njit(parallel=True, cache=True)
@@ -151,21 +332,51 @@ def wiscombe_yang(x, m):
         Number of terms to retain in the partial-wave expansion
     '''
 
-    # Wiscombe (1980)
-    xl = np.abs(x[-1])
-    if xl <= 8.:
-        ns = np.floor(xl + 4. * xl**(1. / 3.) + 1.)
-    elif xl <= 4200.:
-        ns = np.floor(xl + 4.05 * xl**(1. / 3.) + 2.)
-    else:
-        ns = np.floor(xl + 4. * xl**(1. / 3.) + 2.)
+    # Wiscombe (1980) for the outermost layer
+    ns = homogeneous_nmax(x[-1:], m[-1:])[0]
 
     # Yang (2003) Eq. (30)
     xm = np.abs(x * m)
     xm_1 = np.abs(np.roll(x, -1) * m)
-    nstop = max(ns, xm.max(), xm_1.max())
+    nstop = max(ns, int(xm.max()), int(xm_1.max()))
     return int(nstop)
 
+
+@njit(cache=True)
+def homogeneous_nmax(x, m):
+    '''Return the number of terms to keep for homogeneous spheres
+
+    This is the criterion of wiscombe_yang() for spheres
+    with one layer: the larger of Wiscombe's estimate and
+    the magnitude of the size parameter inside the sphere.
+
+    Arguments
+    ---------
+    x : numpy.ndarray
+        [nspheres] size parameters
+    m : numpy.ndarray
+        [nspheres] relative refractive indexes
+
+    Returns
+    -------
+    nmax : numpy.ndarray
+        [nspheres] Number of terms to retain in the partial-wave
+        expansion for each sphere
+    '''
+    nmax = np.empty(x.size, np.int64)
+    for j in range(x.size):
+        xj = np.abs(x[j])
+        # Wiscombe (1980)
+        if xj <= 8.:
+            ns = np.floor(xj + 4. * xj**(1. / 3.) + 1.)
+        elif xj <= 4200.:
+            ns = np.floor(xj + 4.05 * xj**(1. / 3.) + 2.)
+        else:
+            ns = np.floor(xj + 4. * xj**(1. / 3.) + 2.)
+        # Yang (2003) Eq. (30)
+        nmax[j] = int(max(ns, np.abs(x[j] * m[j])))
+    return nmax
+
 @njit(parallel=True, cache=True)
 def mie_coefficients(a_p, n_p, k_p, n_m, wavelength):
     '''Returns the Mie scattering coefficients for a sphere
@@ -300,6 +511,108 @@ def mie_coefficients(a_p, n_p, k_p, n_m, wavelength):
     return ab
 
 
+def batch_mie_coefficients(a_p, n_p, k_p, n_m, wavelength, nmax=None):
+    '''Returns the Mie scattering coefficients for many spheres
+
+    Coefficients for homogeneous spheres with the specified
+    radii, refractive indexes and absorption coefficients are
+    computed in parallel with the recurrences used by
+    mie_coefficients(). Each sphere's coefficients are padded
+    with zeros to the length required by the largest sphere,
+    unless nmax is specified.
+
+    Arguments
+    ---------
+    a_p : float or numpy.ndarray
+        [nspheres] radii of the spheres [um]
+    n_p : float or numpy.ndarray
+        [nspheres] refractive indexes of the spheres
+    k_p : float or numpy.ndarray
+        [nspheres] absorption coefficients of the spheres
+    n_m : complex
+        (complex) refractive index of medium
+    wavelength : float
+        wavelength of light [um]
+
+    Arguments are broadcast against each other.
+
+    Keywords
+    --------
+    nmax : int
+        Number of terms to compute for every sphere.
+        Terms that are too small to represent are set to zero.
+        Default: the number required by each sphere
+
+    Returns
+    -------
+    ab : numpy.ndarray
+        [nspheres, max(nmax)+1, 2] Mie AB coefficients
+    nmax : numpy.ndarray
+        [nspheres] Number of terms in the partial-wave
+        expansion for each sphere
+    '''
+    a_p, n_p, k_p = np.broadcast_arrays(np.atleast_1d(a_p),
+                                        np.atleast_1d(n_p),
+                                        np.atleast_1d(k_p))
+    a_p = np.ascontiguousarray(a_p, dtype=float).ravel()
+    n_p = np.ascontiguousarray(n_p, dtype=float).ravel()
+    k_p = np.ascontiguousarray(k_p, dtype=float).ravel()
+
+    k = 2.*np.pi/wavelength * np.real(n_m)  # wave number in medium
+    x = k * a_p                             # size parameters
+    m = (n_p + 1.j*k_p) / n_m               # relative refractive indexes
+
+    if nmax is None:
+        nmax = homogeneous_nmax(x, m)
+    else:
+        nmax = np.full(x.size, nmax, dtype=np.int64)
+
+    ab = np.zeros((x.size, nmax.max(initial=0) + 1, 2), np.complex128)
+    with np.errstate(all='ignore'):
+        _homogeneous_coefficients(x, m, nmax, ab)
+    ab[~np.isfinite(ab)] = 0.
+    return ab, nmax
+
+
+@njit(parallel=True, cache=True)
+def _homogeneous_coefficients(x, m, nmax, ab):
+    '''Fills ab with the coefficients of homogeneous spheres
+
+    Equation numbers refer to Yang (2003), as in mie_coefficients().
+    '''
+    for j in prange(x.size):
+        nj = nmax[j]
+        xj = x[j]
+        mj = m[j]
+        z1 = xj * mj
+        # downward recurrences for D1 in the sphere and in the medium
+        d1_z1 = np.zeros(nj+1, np.complex128)
+        d1_x = np.zeros(nj+1, np.complex128)
+        for n in range(nj, 0, -1):
+            d1_z1[n-1] = n/z1 - 1./(d1_z1[n] + n/z1)         # Eq. (16b)
+            d1_x[n-1] = n/xj - 1./(d1_x[n] + n/xj)
+
+        # upward recurrences for Psi, Zeta, PsiZeta and D3
+        psi = np.sin(xj) + 0.j                               # Eq. (20a)
+        zeta = -1.j * np.exp(1.j * xj)                       # Eq. (21a)
+        psizeta = 0.5 * (1. - np.exp(2.j * xj))              # Eq. (18a)
+        d3 = 1.j                                             # Eq. (18b)
+        for n in range(1, nj+1):
+            psi_nm1 = psi
+            zeta_nm1 = zeta
+            psi = psi_nm1 * (n/xj - d1_x[n-1])               # Eq. (20b)
+            zeta = zeta_nm1 * (n/xj - d3)                    # Eq. (21b)
+            psizeta *= (n/xj - d1_x[n-1]) * (n/xj - d3)      # Eq. (18c)
+            d3 = d1_x[n] + 1.j/psizeta                       # Eq. (18d)
+            # scattering coefficients with Ha = Hb = D1(z1)
+            fac = d1_z1[n]/mj + n/xj
+            ab[j, n, 0] = (fac * psi - psi_nm1) / \
+                (fac * zeta - zeta_nm1)                      # Eq. (5)
+            fac = d1_z1[n]*mj + n/xj
+            ab[j, n, 1] = (fac * psi - psi_nm1) / \
+                (fac * zeta - zeta_nm1)                      # Eq. (6)
+
+
 if __name__ == '__main__': # pragma: no cover
     from time import time
     s = Sphere(a_p=0.75, n_p=1.5)
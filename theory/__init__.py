@@ -1,5 +1,3 @@
-import pylorenzmie.utilities.configuration as config
-
 import logging
 logging.basicConfig()
 logger = logging.getLogger(__name__)
@@ -7,20 +5,14 @@ logger.setLevel(logging.WARNING)
 
 from .Particle import Particle
 from .Sphere import Sphere
+from .CoefficientTable import CoefficientTable
 
 from .Instrument import (Instrument, coordinates)
 
-try:
-    if not config.use_cupy:
-        raise ImportError('Cupy deselected in {}'.format(config.__file__))
-    from .cupyLorenzMie import cupyLorenzMie as LorenzMie
-except ImportError as ex:
-    logger.warn('Cannot import cupyLorenzMie:' +
-                '\n\t{}'.format(ex) +
-                '\n\tFalling back to LorenzMie')
-    from .LorenzMie import LorenzMie
+from . import backends
 
-from .LMHologram import LMHologram
+LorenzMie = backends.get()
+LMHologram = backends.get(hologram=True)
 
-__all__ = [Particle, Sphere, Instrument, coordinates,
-           LorenzMie, LMHologram]
+__all__ = [Particle, Sphere, CoefficientTable, Instrument, coordinates,
+           LorenzMie, LMHologram, backends]
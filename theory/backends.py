@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Registry of computational backends for Lorenz-Mie theory
+
+Each backend is a subclass of theory.LorenzMie that computes
+scattered fields with a particular accelerator. Backends are
+registered by name and imported only when they are requested,
+so that backends with missing dependencies do not prevent the
+others from being used.
+
+The default backend is selected by the PYLORENZMIE_BACKEND
+environment variable or, if that is not set, by the value of
+backend in utilities/configuration.py, which is 'numpy' by
+default. The value 'auto' selects the fastest available backend
+by timing each of them once. Timing compiles the numba kernels
+and takes about a second, so 'auto' has to be requested
+explicitly.
+Backends also can be requested explicitly for individual models:
+
+    >>> from pylorenzmie.theory import backends
+    >>> model = backends.get('numba', hologram=True)(coordinates=c)
+
+Functions
+---------
+register(name, module, classname, enabled=True)
+    Register a backend class
+available() : list
+    Names of backends that can be imported
+get(name=None, hologram=False) : class
+    LorenzMie or LMHologram class that uses the named backend
+default() : str
+    Name of the default backend
+benchmark(names=None, shape=(200, 200), nrepeat=3) : dict
+    Time required by each backend to compute a field
+'''
+
+import os
+import importlib
+from collections import OrderedDict
+from time import perf_counter
+from .Instrument import coordinates
+import pylorenzmie.utilities.configuration as config
+
+import logging
+logger = logging.getLogger(__name__)
+
+environment = 'PYLORENZMIE_BACKEND'
+
+_registry = OrderedDict()
+_classes = dict()
+_holograms = dict()
+_default = None
+
+
+def register(name, module, classname, enabled=True):
+    '''Register a backend
+
+    Arguments
+    ---------
+    name : str
+        Name of the backend
+    module : str
+        Module that defines the backend, relative to this package
+    classname : str
+        Name of the LorenzMie subclass in module
+    enabled : bool
+        If False, the backend is registered but not available
+    '''
+    _registry[name] = (module, classname, enabled)
+    _classes.pop(name, None)
+    _holograms.pop(name, None)
+
+
+def _load(name):
+    '''Return backend class, or raise ImportError'''
+    if name not in _registry:
+        raise ValueError('Unknown backend {}: choose from {}'.format(
+            name, list(_registry)))
+    if name not in _classes:
+        module, classname, enabled = _registry[name]
+        if not enabled:
+            raise ImportError('{} deselected in {}'.format(
+                name, config.__file__))
+        module = importlib.import_module(module, __package__)
+        _classes[name] = getattr(module, classname)
+    return _classes[name]
+
+
+def available():
+    '''Return names of backends that can be used'''
+    names = []
+    for name in _registry:
+        try:
+            _load(name)
+            names.append(name)
+        except ImportError as ex:
+            logger.debug('Backend {} is not available: {}'.format(name, ex))
+    return names
+
+
+def benchmark(names=None, shape=(200, 200), nrepeat=3):
+    '''Time the field calculation for each backend
+
+    Arguments
+    ---------
+    names : list, optional
+        Backends to time. Default: all available backends
+    shape : tuple
+        Dimensions of the test image [pixels]
+    nrepeat : int
+        Number of timed repetitions. The fastest is reported.
+
+    Returns
+    -------
+    times : dict
+        Time [s] to compute one field for each backend that
+        succeeded.
+    '''
+    names = names or available()
+    times = dict()
+    for name in names:
+        try:
+            model = _load(name)(coordinates=coordinates(shape),
+                                wavelength=0.447,
+                                magnification=0.048,
+                                n_m=1.34)
+            model.particle.r_p = [shape[1]/2, shape[0]/2, 100.]
+            model.particle.a_p = 1.
+            model.particle.n_p = 1.45
+            model.field()
+            elapsed = []
+            for _ in range(nrepeat):
+                start = perf_counter()
+                model.field()
+                elapsed.append(perf_counter() - start)
+            times[name] = min(elapsed)
+        except Exception as ex:
+            logger.warning('Could not benchmark {}: {}'.format(name, ex))
+    return times
+
+
+def default():
+    '''Return name of the default backend'''
+    global _default
+    if _default is None:
+        name = os.environ.get(environment, config.backend)
+        if name == 'auto':
+            times = benchmark()
+            name = min(times, key=times.get) if times else 'numpy'
+            logger.debug('Backend timings: {}'.format(times))
+        else:
+            try:
+                _load(name)
+            except (ValueError, ImportError) as ex:
+                logger.warning('Cannot use backend {}:'.format(name) +
+                               '\n\t{}'.format(ex) +
+                               '\n\tFalling back to numpy')
+                name = 'numpy'
+        _default = name
+    return _default
+
+
+def get(name=None, hologram=False):
+    '''Return class that computes fields with the named backend
+
+    Arguments
+    ---------
+    name : str, optional
+        Name of a registered backend. Default: default()
+    hologram : bool
+        If set, return a subclass of LMHologram that
+        uses the backend. Otherwise, return the backend's
+        subclass of LorenzMie.
+
+    Returns
+    -------
+    cls : class
+    '''
+    name = name or default()
+    cls = _load(name)
+    if not hologram:
+        return cls
+    from .LMHologram import LMHologram
+    if name not in _holograms:
+        if issubclass(LMHologram, cls):
+            _holograms[name] = LMHologram
+        else:
+            # Named so that instances can be pickled: see __getattr__
+            _holograms[name] = type(name + 'LMHologram', (cls, LMHologram),
+                                    dict(__doc__=LMHologram.__doc__,
+                                         __module__=__name__))
+    return _holograms[name]
+
+
+def __getattr__(attr):
+    '''Resolve hologram classes such as numbaLMHologram by name'''
+    suffix = 'LMHologram'
+    if attr.endswith(suffix) and attr[:-len(suffix)] in _registry:
+        return get(attr[:-len(suffix)], hologram=True)
+    raise AttributeError('module {} has no attribute {}'.format(
+        __name__, attr))
+
+
+register('numpy', '.LorenzMie', 'LorenzMie')
+register('numba', '.numbaLorenzMie', 'numbaLorenzMie',
+         enabled=config.use_numba)
+register('cupy', '.cupyLorenzMie', 'cupyLorenzMie',
+         enabled=config.use_cupy)
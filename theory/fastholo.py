@@ -1,14 +1,191 @@
 import numpy as np
 import math
 from numba import njit, prange
-from pylorenzmie.theory import Sphere
 
 # See https://llvm.org/docs/LangRef.html#fast-math-flags
 # for a list of fastmath flags for LLVM compiler
 safe_flags = {'nnan', 'ninf', 'arcp', 'nsz'}
 
 
-fast_mie_coefficients = njit(Sphere.mie_coefficients, cache=True)
+@njit(fastmath=False, cache=True)
+def scatteredfield(kx, ky, kz, ab, bohren, cartesian):
+    '''
+    Returns the field scattered by a particle at one point
+
+    The partial-wave sum is accumulated in registers so that
+    no intermediate arrays are allocated.
+
+    Arguments
+    ----------
+    kx, ky, kz : float
+        Displacement of the point from the center of the
+        scatterer, multiplied by the wavenumber of light
+        in the medium.
+    ab : numpy.ndarray of dtype numpy.complex128
+        [norders, 2] Mie scattering coefficients
+    bohren : bool
+        If set, use sign convention from Bohren and Huffman.
+        Otherwise, use opposite sign convention.
+    cartesian : bool
+        If set, return field projected onto Cartesian coordinates.
+        Otherwise, return polar projection.
+
+    Returns
+    -------
+    e0, e1, e2 : complex
+        Components of the scattered field
+    '''
+    norders = ab.shape[0]  # number of partial waves in sum
+
+    # GEOMETRY
+    # 1. particle displacement [pixel]
+    # Note: The sign convention used here is appropriate
+    # for illumination propagating in the -z direction.
+    # This means that a particle forming an image in the
+    # focal plane (z = 0) is located at positive z.
+    # Accounting for this by flipping the axial coordinate
+    # is equivalent to using a mirrored (left-handed)
+    # coordinate system.
+
+    # 2. geometric factors
+    kz *= -1.  # z convention
+    krho = math.sqrt(kx**2 + ky**2)
+    kr = math.sqrt(krho**2 + kz**2)
+
+    theta = math.atan2(krho, kz)
+    phi = math.atan2(ky, kx)
+    sintheta = math.sin(theta)
+    costheta = math.cos(theta)
+    sinphi = math.sin(phi)
+    cosphi = math.cos(phi)
+    sinkr = math.sin(kr)
+    coskr = math.cos(kr)
+
+    # SPECIAL FUNCTIONS
+    # starting points for recursive function evaluation ...
+    # 1. Riccati-Bessel radial functions, page 478.
+    # Particles above the focal plane create diverging waves
+    # described by Eq. (4.13) for $h_n^{(1)}(kr)$. These have z > 0.
+    # Those below the focal plane appear to be converging from the
+    # perspective of the camera. They are descrinbed by Eq. (4.14)
+    # for $h_n^{(2)}(kr)$, and have z < 0. We can select the
+    # appropriate case by applying the correct sign of the imaginary
+    # part of the starting functions...
+    if kz > 0:
+        factor = 1.*1.j
+    elif kz < 0:
+        factor = -1.*1.j
+    else:
+        factor = 0.*1.j
+    if not bohren:
+        factor = -1.*factor
+
+    xi_nm2 = coskr + factor * sinkr  # \xi_{-1}(kr)
+    xi_nm1 = sinkr - factor * coskr  # \xi_0(kr)
+
+    # 2. Angular functions (4.47), page 95
+    pi_nm1 = 0.     # \pi_0(\cos\theta)
+    pi_n = 1.                   # \pi_1(\cos\theta)
+
+    # 3. Vector spherical harmonics: [r,theta,phi]
+    mo1nr = 0.j
+    mo1nt = 0.j
+    mo1np = 0.j
+    ne1nr = 0.j
+    ne1nt = 0.j
+    ne1np = 0.j
+
+    # storage for scattered field
+    esr = 0.j
+    est = 0.j
+    esp = 0.j
+
+    # COMPUTE field by summing partial waves
+    for n in range(1, norders):
+        n = np.float64(n)
+        # upward recurrences ...
+        # 4. Legendre factor (4.47)
+        # Method described by Wiscombe (1980)
+
+        swisc = pi_n * costheta
+        twisc = swisc - pi_nm1
+        tau_n = pi_nm1 - n * twisc  # -\tau_n(\cos\theta)
+
+        # ... Riccati-Bessel function, page 478
+        xi_n = (2. * n - 1.) * \
+            (xi_nm1 / kr) - xi_nm2  # \xi_n(kr)
+
+        # ... Deirmendjian's derivative
+        dn = (n * xi_n) / kr - xi_nm1
+
+        # vector spherical harmonics (4.50)
+        mo1nt = pi_n * xi_n     # ... divided by cosphi/kr
+        mo1np = tau_n * xi_n    # ... divided by sinphi/kr
+
+        # ... divided by cosphi sintheta/kr^2
+        ne1nr = n * (n + 1.) * pi_n * xi_n
+        ne1nt = tau_n * dn      # ... divided by cosphi/kr
+        ne1np = pi_n * dn       # ... divided by sinphi/kr
+
+        mod = n % 4
+        if mod == 1:
+            fac = 1.j
+        elif mod == 2:
+            fac = -1.+0.j
+        elif mod == 3:
+            fac = -0.-1.j
+        else:
+            fac = 1.+0.j
+
+        # prefactor, page 93
+        en = fac * (2. * n + 1.) / \
+            n / (n + 1.)
+
+        # the scattered field in spherical coordinates (4.45)
+        esr += (1.j * en * ab[int(n), 0]) * ne1nr
+        est += (1.j * en * ab[int(n), 0]) * ne1nt
+        esp += (1.j * en * ab[int(n), 0]) * ne1np
+        esr -= (en * ab[int(n), 1]) * mo1nr
+        est -= (en * ab[int(n), 1]) * mo1nt
+        esp -= (en * ab[int(n), 1]) * mo1np
+
+        # upward recurrences ...
+        # ... angular functions (4.47)
+        # Method described by Wiscombe (1980)
+        pi_nm1 = pi_n
+        pi_n = swisc + ((n + 1.) / n) * twisc
+
+        # ... Riccati-Bessel function
+        xi_nm2 = xi_nm1
+        xi_nm1 = xi_n
+
+    # n: multipole sum
+
+    # geometric factors were divided out of the vector
+    # spherical harmonics for accuracy and efficiency ...
+    # ... put them back at the end.
+    radialfactor = 1. / kr
+    esr *= cosphi * sintheta * radialfactor**2
+    est *= cosphi * radialfactor
+    esp *= sinphi * radialfactor
+
+    # By default, the scattered wave is returned in spherical
+    # coordinates.  Project components onto Cartesian coordinates.
+    # Assumes that the incident wave propagates along z and
+    # is linearly polarized along x
+
+    if cartesian:
+        ecx = esr * sintheta * cosphi
+        ecx += est * costheta * cosphi
+        ecx -= esp * sinphi
+
+        ecy = esr * sintheta * sinphi
+        ecy += est * costheta * sinphi
+        ecy += esp * cosphi
+        ecz = (esr * costheta -
+               est * sintheta)
+        return ecx, ecy, ecz
+    return esr, est, esp
 
 
 @njit(parallel=True, fastmath=False, cache=True)
@@ -17,9 +194,16 @@ def fastfield(coordinates, r_p, k, phase,
     '''
     Returns the field scattered by the particle at each coordinate
 
+    Single-precision calculations are selected by passing
+    coordinates of dtype numpy.float32 and a result buffer of
+    dtype numpy.complex64. The partial-wave sum for each pixel
+    is accumulated in double-precision registers and rounded
+    once when it is stored, so that single precision halves
+    the memory traffic without compounding rounding errors.
+
     Arguments
     ----------
-    coordinates : numpy.ndarray of dtype numpy.complex128
+    coordinates : numpy.ndarray of dtype numpy.float64 or numpy.float32
         [3, npts] coordinate system for scattered field calculation
     r_p : numpy.ndarray
         [3] position of scatterer
@@ -30,7 +214,7 @@ def fastfield(coordinates, r_p, k, phase,
         function. See equation XXX
     ab : numpy.ndarray of dtype numpy.complex128
         [2, norders] Mie scattering coefficients
-    result : numpy.ndarray of dtype numpy.complex128
+    result : numpy.ndarray of dtype numpy.complex128 or numpy.complex64
         [3, npts] buffer for final scattered field
     cartesian : bool
         If set, return field projected onto Cartesian coordinates.
@@ -41,166 +225,169 @@ def fastfield(coordinates, r_p, k, phase,
     '''
     length = coordinates.shape[1]
 
-    norders = ab.shape[0]  # number of partial waves in sum
-
-    # GEOMETRY
-    # 1. particle displacement [pixel]
-    # Note: The sign convention used here is appropriate
-    # for illumination propagating in the -z direction.
-    # This means that a particle forming an image in the
-    # focal plane (z = 0) is located at positive z.
-    # Accounting for this by flipping the axial coordinate
-    # is equivalent to using a mirrored (left-handed)
-    # coordinate system.
-
     for idx in prange(length):
         kx = k * (coordinates[0, idx] - r_p[0])
         ky = k * (coordinates[1, idx] - r_p[1])
         kz = k * (coordinates[2, idx] - r_p[2])
-        # 2. geometric factors
-        kz *= -1.  # z convention
-        krho = math.sqrt(kx**2 + ky**2)
-        kr = math.sqrt(krho**2 + kz**2)
-
-        theta = math.atan2(krho, kz)
-        phi = math.atan2(ky, kx)
-        sintheta = math.sin(theta)
-        costheta = math.cos(theta)
-        sinphi = math.sin(phi)
-        cosphi = math.cos(phi)
-        sinkr = math.sin(kr)
-        coskr = math.cos(kr)
-
-        # SPECIAL FUNCTIONS
-        # starting points for recursive function evaluation ...
-        # 1. Riccati-Bessel radial functions, page 478.
-        # Particles above the focal plane create diverging waves
-        # described by Eq. (4.13) for $h_n^{(1)}(kr)$. These have z > 0.
-        # Those below the focal plane appear to be converging from the
-        # perspective of the camera. They are descrinbed by Eq. (4.14)
-        # for $h_n^{(2)}(kr)$, and have z < 0. We can select the
-        # appropriate case by applying the correct sign of the imaginary
-        # part of the starting functions...
-        if kz > 0:
-            factor = 1.*1.j
-        elif kz < 0:
-            factor = -1.*1.j
-        else:
-            factor = 0.*1.j
-        if not bohren:
-            factor = -1.*factor
-
-        xi_nm2 = coskr + factor * sinkr  # \xi_{-1}(kr)
-        xi_nm1 = sinkr - factor * coskr  # \xi_0(kr)
-
-        # 2. Angular functions (4.47), page 95
-        pi_nm1 = 0.     # \pi_0(\cos\theta)
-        pi_n = 1.                   # \pi_1(\cos\theta)
-
-        # 3. Vector spherical harmonics: [r,theta,phi]
-        mo1nr = 0.j
-        mo1nt = 0.j
-        mo1np = 0.j
-        ne1nr = 0.j
-        ne1nt = 0.j
-        ne1np = 0.j
-
-        # storage for scattered field
-        esr = 0.j
-        est = 0.j
-        esp = 0.j
-
-        # COMPUTE field by summing partial waves
-        for n in range(1, norders):
-            n = np.float64(n)
-            # upward recurrences ...
-            # 4. Legendre factor (4.47)
-            # Method described by Wiscombe (1980)
-
-            swisc = pi_n * costheta
-            twisc = swisc - pi_nm1
-            tau_n = pi_nm1 - n * twisc  # -\tau_n(\cos\theta)
-
-            # ... Riccati-Bessel function, page 478
-            xi_n = (2. * n - 1.) * \
-                (xi_nm1 / kr) - xi_nm2  # \xi_n(kr)
-
-            # ... Deirmendjian's derivative
-            dn = (n * xi_n) / kr - xi_nm1
-
-            # vector spherical harmonics (4.50)
-            mo1nt = pi_n * xi_n     # ... divided by cosphi/kr
-            mo1np = tau_n * xi_n    # ... divided by sinphi/kr
-
-            # ... divided by cosphi sintheta/kr^2
-            ne1nr = n * (n + 1.) * pi_n * xi_n
-            ne1nt = tau_n * dn      # ... divided by cosphi/kr
-            ne1np = pi_n * dn       # ... divided by sinphi/kr
-
-            mod = n % 4
-            if mod == 1:
-                fac = 1.j
-            elif mod == 2:
-                fac = -1.+0.j
-            elif mod == 3:
-                fac = -0.-1.j
-            else:
-                fac = 1.+0.j
-
-            # prefactor, page 93
-            en = fac * (2. * n + 1.) / \
-                n / (n + 1.)
-
-            # the scattered field in spherical coordinates (4.45)
-            esr += (1.j * en * ab[int(n), 0]) * ne1nr
-            est += (1.j * en * ab[int(n), 0]) * ne1nt
-            esp += (1.j * en * ab[int(n), 0]) * ne1np
-            esr -= (en * ab[int(n), 1]) * mo1nr
-            est -= (en * ab[int(n), 1]) * mo1nt
-            esp -= (en * ab[int(n), 1]) * mo1np
-
-            # upward recurrences ...
-            # ... angular functions (4.47)
-            # Method described by Wiscombe (1980)
-            pi_nm1 = pi_n
-            pi_n = swisc + ((n + 1.) / n) * twisc
-
-            # ... Riccati-Bessel function
-            xi_nm2 = xi_nm1
-            xi_nm1 = xi_n
-
-        # n: multipole sum
-
-        # geometric factors were divided out of the vector
-        # spherical harmonics for accuracy and efficiency ...
-        # ... put them back at the end.
-        radialfactor = 1. / kr
-        esr *= cosphi * sintheta * radialfactor**2
-        est *= cosphi * radialfactor
-        esp *= sinphi * radialfactor
-
-        # By default, the scattered wave is returned in spherical
-        # coordinates.  Project components onto Cartesian coordinates.
-        # Assumes that the incident wave propagates along z and
-        # is linearly polarized along x
-
-        if cartesian:
-            ecx = esr * sintheta * cosphi
-            ecx += est * costheta * cosphi
-            ecx -= esp * sinphi
-
-            ecy = esr * sintheta * sinphi
-            ecy += est * costheta * sinphi
-            ecy += esp * cosphi
-            ecz = (esr * costheta -
-                   est * sintheta)
-            result[0, idx] += ecx*phase
-            result[1, idx] += ecy*phase
-            result[2, idx] += ecz*phase
+        e0, e1, e2 = scatteredfield(kx, ky, kz, ab, bohren, cartesian)
+        result[0, idx] += e0*phase
+        result[1, idx] += e1*phase
+        result[2, idx] += e2*phase
+
+
+@njit(fastmath=False, cache=True)
+def intensity(coordinates, idx, r_p, k, phase, ab, alpha, bohren):
+    '''
+    Returns the intensity of the hologram at one coordinate
+
+    The field scattered by each particle is weighted by alpha
+    and superposed on the incident plane wave, which is
+    polarized along x and has unit amplitude.
+    '''
+    ex = 1.+0.j
+    ey = 0.j
+    ez = 0.j
+    for j in range(r_p.shape[0]):
+        kx = k * (coordinates[0, idx] - r_p[j, 0])
+        ky = k * (coordinates[1, idx] - r_p[j, 1])
+        kz = k * (coordinates[2, idx] - r_p[j, 2])
+        e0, e1, e2 = scatteredfield(kx, ky, kz, ab[j], bohren, True)
+        weight = alpha * phase[j]
+        ex += weight * e0
+        ey += weight * e1
+        ez += weight * e2
+    return (ex.real**2 + ex.imag**2 +
+            ey.real**2 + ey.imag**2 +
+            ez.real**2 + ez.imag**2)
+
+
+@njit(parallel=True, fastmath=False, cache=True)
+def fastlmhologram(coordinates, r_p, k, phase, ab, alpha,
+                   hologram, bohren):
+    '''
+    Computes the in-line hologram of particles at each coordinate
+
+    The scattered field is accumulated in registers for each
+    pixel and only the real intensity is written, so that
+    no [3, npts] complex field is allocated.
+
+    Arguments
+    ----------
+    coordinates : numpy.ndarray of dtype numpy.float64 or numpy.float32
+        [3, npts] coordinate system for hologram calculation
+    r_p : numpy.ndarray
+        [nparticles, 3] positions of scatterers
+    k : float
+        Wavenumber of the light in medium of refractive index n_m
+    phase : numpy.ndarray of dtype numpy.complex128
+        [nparticles] phase of each particle's scattered field
+        relative to the incident wave
+    ab : numpy.ndarray of dtype numpy.complex128
+        [nparticles, norders, 2] Mie scattering coefficients,
+        padded with zeros to a common number of orders
+    alpha : float
+        Weight of the scattered field in the superposition
+    hologram : numpy.ndarray
+        [npts] buffer for the computed hologram
+    bohren : bool
+        If set, use sign convention from Bohren and Huffman.
+        Otherwise, use opposite sign convention.
+    '''
+    for idx in prange(coordinates.shape[1]):
+        hologram[idx] = intensity(coordinates, idx, r_p, k, phase,
+                                  ab, alpha, bohren)
+
+
+@njit(parallel=True, fastmath=False, cache=True)
+def fastlmresiduals(coordinates, r_p, k, phase, ab, alpha,
+                    data, noise, residuals, bohren):
+    '''
+    Computes normalized residuals of a hologram at each coordinate
+
+    Same as fastlmhologram, but writes (hologram - data)/noise
+    so that the fitting loop needs no hologram buffer.
+
+    Arguments
+    ----------
+    data : numpy.ndarray
+        [npts] measured hologram
+    noise : float
+        Estimate for the additive noise value at each data pixel
+    residuals : numpy.ndarray
+        [npts] buffer for the residuals
+
+    See fastlmhologram for the remaining arguments.
+    '''
+    for idx in prange(coordinates.shape[1]):
+        holo = intensity(coordinates, idx, r_p, k, phase,
+                         ab, alpha, bohren)
+        residuals[idx] = (holo - data[idx]) / noise
+
+
+@njit(fastmath=False, cache=True)
+def cubic(f, n, t):
+    '''Cubic convolution (Catmull-Rom) of samples f[n:n+4] at fraction t'''
+    f0 = f[n]
+    f1 = f[n+1]
+    f2 = f[n+2]
+    f3 = f[n+3]
+    return f1 + 0.5 * t * (f2 - f0 +
+                           t * (2.*f0 - 5.*f1 + 4.*f2 - f3 +
+                                t * (3.*(f1 - f2) + f3 - f0)))
+
+
+@njit(parallel=True, fastmath=False, cache=True)
+def fastradialhologram(coordinates, r_p, k, alpha, sign,
+                       step, u, v, w, hologram):
+    '''
+    Computes the hologram of a sphere from radial profiles of its field
+
+    Arguments
+    ----------
+    coordinates : numpy.ndarray
+        [3, npts] coordinates in one plane
+    r_p : numpy.ndarray
+        [3] position of scatterer
+    k : float
+        Wavenumber of the light in medium of refractive index n_m
+    alpha : float
+        Weight of the scattered field in the superposition
+    sign : float
+        Sign of the phase exp(i sign k r) that was divided out
+        of the profiles
+    step : float
+        Spacing of the radial grid, which starts at -step
+    u, v, w : numpy.ndarray of dtype numpy.complex128
+        Radial profiles of the scattered field. See
+        LMHologram._radial_hologram
+    hologram : numpy.ndarray
+        [npts] buffer for the computed hologram
+    '''
+    dz = coordinates[2, 0] - r_p[2]
+    for idx in prange(coordinates.shape[1]):
+        x = coordinates[0, idx] - r_p[0]
+        y = coordinates[1, idx] - r_p[1]
+        rho = math.sqrt(x**2 + y**2)
+        t = rho / step
+        n = int(t)
+        t -= n
+        uu = cubic(u, n, t)
+        vv = cubic(v, n, t)
+        ww = cubic(w, n, t)
+        if rho > 0.:
+            cosphi = x / rho
+            sinphi = y / rho
         else:
-            result[0, idx] += esr*phase
-            result[1, idx] += est*phase
-            result[2, idx] += esp*phase
+            cosphi = 1.
+            sinphi = 0.
+        arg = sign * k * math.sqrt(rho**2 + dz**2) - k * r_p[2]
+        phase = alpha * (math.cos(arg) + 1.j * math.sin(arg))
+        ex = 1. + phase * (cosphi**2 * uu - sinphi**2 * vv)
+        ey = sinphi * cosphi * (uu + vv)
+        ez = cosphi * ww
+        hologram[idx] = (ex.real**2 + ex.imag**2 +
+                         alpha**2 * (ey.real**2 + ey.imag**2 +
+                                     ez.real**2 + ez.imag**2))
 
 
 @njit(parallel=True, fastmath=False, cache=True)
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from .LorenzMie import LorenzMie
+from .fastholo import fastfield
+
+
+class numbaLorenzMie(LorenzMie):
+    '''
+    Compute scattered light field with parallel numba kernels.
+
+    The partial-wave sum for each coordinate is accumulated in
+    registers by theory.fastholo.fastfield, and coordinates are
+    distributed over all available CPU cores. See LorenzMie for
+    properties and methods.
+
+    ...
+
+    Methods
+    -------
+    field(cartesian=True, bohren=True)
+        Returns the complex-valued field at each of the coordinates.
+    '''
+
+    method = 'numba'
+
+    def field(self, cartesian=True, bohren=True):
+        '''Return field scattered by particles in the system'''
+        if (self.coordinates is None or self.particle is None):
+            return None
+        self.result.fill(0.+0.j)
+        k = self.instrument.wavenumber()
+        n_m = self.instrument.n_m
+        wavelength = self.instrument.wavelength
+        for p in np.atleast_1d(self.particle):
+            ab = p.ab(n_m, wavelength)
+            phase = np.exp(-1.j * k * p.z_p)
+            fastfield(self.coordinates, p.r_p, k, phase,
+                      ab, self.result, bohren, cartesian)
+        return self.result
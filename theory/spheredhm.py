@@ -27,6 +27,10 @@ def spheredhm(rp, a_p, n_p, n_m, dim, mpp=0.135, lamb=.447, alpha=False,
         lamb:  vacuum wavelength of light [micrometers]
         mpp: micrometers per pixel
         precision: relative precision with which fields are calculated.
+        lut: if set, compute the hologram along a radial line and
+            interpolate, neglecting the azimuthal dependence due
+            to polarization. See LMHologram(lut=True) for an
+            exact treatment.
 
     Returns:
         dhm: [nx, ny] holographic image                
@@ -40,7 +44,7 @@ def spheredhm(rp, a_p, n_p, n_m, dim, mpp=0.135, lamb=.447, alpha=False,
 
     if lut:
         rho = np.sqrt(x**2 + y**2)
-        x = np.arange(np.fix(rho).max()+1)
+        x = np.arange(np.fix(rho).max()+2)
         y = 0. * x
 
     zp = float(rp[2])
@@ -58,7 +62,7 @@ def spheredhm(rp, a_p, n_p, n_m, dim, mpp=0.135, lamb=.447, alpha=False,
     image = np.sum(np.real(field*np.conj(field)), axis=0)
 
     if lut:
-        image = np.interpolate(image, rho, cubic=-0.5)
+        image = np.interp(rho, x, image)
 
     return image.reshape(int(ny), int(nx))
 
@@ -56,12 +56,15 @@
 # MODIFICATION HISTORY:
 # 08/18/13 Written in IDL by David G. Grier, New York University
 # 11/11/13 Translated to Python by Mark D. Hannel, New York University
+# Medians are computed by sorting pixels once with utilities.radial
+#    rather than by masking the image once for each radius.
+#    The center is [xc, yc] in column and row coordinates.
 #
 # Copyright (c) 2013 David G. Grier
 #-
 
 import numpy as np
-from builtins import range
+from pylorenzmie.utilities import radial
 
 default = np.array([])
 
@@ -75,8 +78,8 @@ def azimedian(a, center = default, rad = None, deinterlace = 0, weight = 0,
     data: two dimensional array of any type except string or complex
 
     Parameters:
-    center: coordinates of center: [xc, yc].  Default is to use data's
-        geometric center.
+    center: coordinates of center: [xc, yc], where xc is the column
+        and yc is the row.  Default is to use data's geometric center.
 
     rad: maximum radius of average [pixels]
         Default: half the minimum dimension of the image.
@@ -110,54 +113,14 @@ def azimedian(a, center = default, rad = None, deinterlace = 0, weight = 0,
 
    nx,ny = a.shape			# width, height 
 
-   #Set center. Default is the center of the image
-   if len(center) == 2 :
-      xc = float(center[0])
-      yc = float(center[1])
-   else:
-      xc = 0.5 * (nx-1)   # indices start at 0
-      yc = 0.5 * (ny-1)   # ... in y also
-
-
    #Set the maximum radius.  Default is the largest for an enscribed circle 
    rmax = rad if type(rad) == int else min(nx/2., ny/2.)
 
-   #Account for complex data
-   if type(a[0,0]) == complex: # complex data
-      med = np.zeros(int(rmax+1), complex)
-   else:                             # accumlate other types into double
-      med = np.zeros(int(rmax+1))
-
    #Add contrast to the image if desired
    if weight != 0: 
-      a *= weight
-
-   #Distance from center to each pixel
-   x = (np.arange(nx) - xc)**2
-   y = (np.arange(ny) - yc)**2
-   x,y = np.meshgrid(x,y)
-   r = np.sqrt(x+y)
-
-   #Deinterlace
-   if deinterlace != 0:
-      n0 = deinterlace % 2
-      a = a[n0::2, :]
-      rho = r[n0::2, :]
-   else:
-      rho = r
-
-   #Make an array n which has the points lying between
-   #r and r+1.  Evaluate the median of the image over these pixels
-   for i in range(int(rmax+1)):
-      n = (r>=i)*(r<(i+1))
-      med[i] = np.median(a[n])
-         
-
-
-   #if arg_present(values) : 
-   #   values = med[round(r)]
-      
-   #if arg_present(deviates) : 
-   #   deviates = a - med[round(r)]
-
-   return med
+      a = a * weight
+
+   #Median of the pixels lying between r and r+1 for each integer r
+   center = center if len(center) == 2 else None
+   return radial.azimedian(a, center=center, rad=int(rmax),
+                           deinterlace=deinterlace)
@@ -1,3 +1,9 @@
 # Configuration for optional components of pylorenzmie
 use_numba = True
 use_cupy = True
+
+# Backend for Lorenz-Mie calculations: 'numpy', 'numba', 'cupy'
+# or 'auto' to select the fastest available backend by timing
+# each of them when pylorenzmie.theory is imported.
+# Overridden by the PYLORENZMIE_BACKEND environment variable.
+backend = 'numpy'
@@ -12,6 +12,8 @@ except ImportError:
     from pylorenzmie.theory.LMHologram import LMHologram
 from pylorenzmie.theory.Instrument import coordinates
 from pylorenzmie.theory.Sphere import Sphere
+from pylorenzmie.utilities.radial import fringe_extent
+from functools import lru_cache
 import numpy as np
 
 import cv2
@@ -21,19 +23,39 @@ import shutil
 
 def feature_extent(sphere, config, nfringes=20, maxrange=300):
     '''Radius of holographic feature in pixels'''
+    return feature_extents([sphere], config, nfringes, maxrange)[0]
 
-    h = LMHologram(coordinates=np.arange(maxrange))
-    h.instrument.properties = config['instrument']
-    h.particle.a_p = sphere.a_p
-    h.particle.n_p = sphere.n_p
-    h.particle.z_p = sphere.z_p
+
+def feature_extents(sample, config, nfringes=20, maxrange=300):
+    '''Radii of holographic features of spheres in pixels'''
+    if len(sample) == 0:
+        return np.empty(0)
+    instrument = tuple(sorted(config['instrument'].items()))
+    profiles = [_profile(s.a_p, s.n_p, s.z_p, instrument, maxrange)
+                for s in sample]
     # roughly estimate radii of zero crossings
-    b = h.hologram() - 1.
-    ndx = np.where(np.diff(np.sign(b)))[0] + 1
-    if len(ndx) <= nfringes:
-        return maxrange
-    else:
-        return float(ndx[nfringes])
+    return fringe_extent(profiles, nfringes=nfringes, maxrange=maxrange)
+
+
+@lru_cache(maxsize=1024)
+def _profile(a_p, n_p, z_p, instrument, maxrange):
+    '''Radial profile of the hologram of a sphere'''
+    h = _profile_model(instrument, maxrange)
+    h.particle.a_p = a_p
+    h.particle.n_p = n_p
+    h.particle.z_p = z_p
+    profile = h.hologram()
+    profile.flags.writeable = False
+    return profile
+
+
+@lru_cache(maxsize=4)
+def _profile_model(instrument, maxrange):
+    '''Hologram along a radial line, shared by profiles'''
+    x = np.arange(maxrange, dtype=float)
+    h = LMHologram(coordinates=np.stack((x, np.zeros_like(x))))
+    h.instrument.properties = dict(instrument)
+    return h
 
 
 def format_yolo(sample, config):
@@ -42,8 +64,9 @@ def format_yolo(sample, config):
     type = 0  # one class for now
     fmt = '{}' + 4 * ' {:.6f}' + '\n'
     annotation = ''
-    for sphere in sample:
-        diameter = 2. * feature_extent(sphere, config)
+    extents = feature_extents(sample, config)
+    for sphere, extent in zip(sample, extents):
+        diameter = 2. * extent
         x_p = sphere.x_p / w
         y_p = sphere.y_p / h
         w_p = diameter / w
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Opt-in profiling of the hot paths of pylorenzmie
+
+Functions on the hot paths of the theory, fitting and detection
+packages are decorated with timed(). While profiling is enabled,
+each call of a timed function is counted and its duration is
+added to a registry. Memory tracing optionally records the peak
+number of bytes allocated by each call, including allocations
+by numpy. While profiling is disabled, the decorated functions
+only test one flag before calling the undecorated function.
+
+    >>> from pylorenzmie.utilities import profiling
+    >>> with profiling.profile(memory=True):
+    ...     feature.optimize()
+    >>> print(profiling.report())
+
+Functions
+---------
+timed(name=None)
+    Decorator that registers a function for profiling
+timer(name)
+    Context manager that profiles a block of code
+enable(memory=False)
+    Start recording
+disable()
+    Stop recording
+enabled() : bool
+    True if profiling is enabled
+profile(memory=False, reset=True)
+    Context manager that enables profiling within a block
+reset()
+    Clear the recorded statistics
+stats() : dict
+    Copy of the recorded statistics
+report() : pandas.DataFrame
+    Number of calls, cumulative and mean time [s] and
+    peak memory allocated [bytes] for each timed function
+'''
+
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter
+
+_enabled = False
+_memory = False
+_started_tracing = False
+_stats = dict()
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def timed(name=None):
+    '''Decorator that records calls of a function while profiling
+
+    Keywords
+    --------
+    name : str
+        Name of the entry in the report.
+        Default: qualified name of the function
+    '''
+    def decorator(func):
+        label = name or func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with timer(label):
+                return func(*args, **kwargs)
+        return wrapper
+    if callable(name):
+        func, name = name, None
+        return decorator(func)
+    return decorator
+
+
+@contextmanager
+def timer(name):
+    '''Context manager that records the execution of a block'''
+    if not _enabled:
+        yield
+        return
+    memory = _memory and tracemalloc.is_tracing()
+    if memory:
+        _enter_memory()
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = perf_counter() - start
+        allocated = _exit_memory() if memory else 0
+        _record(name, elapsed, allocated)
+
+
+def enable(memory=False):
+    '''Start recording calls of timed functions
+
+    Keywords
+    --------
+    memory : bool
+        If set, also record the peak memory allocated by each
+        call with tracemalloc. This slows down computations.
+    '''
+    global _enabled, _memory, _started_tracing
+    _memory = bool(memory)
+    if _memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracing = True
+    _enabled = True
+
+
+def disable():
+    '''Stop recording calls of timed functions'''
+    global _enabled, _memory, _started_tracing
+    _enabled = False
+    _memory = False
+    if _started_tracing:
+        tracemalloc.stop()
+        _started_tracing = False
+
+
+def enabled():
+    '''Returns True if profiling is enabled'''
+    return _enabled
+
+
+@contextmanager
+def profile(memory=False, reset=True):
+    '''Context manager that enables profiling within a block
+
+    Keywords
+    --------
+    memory : bool
+        If set, record peak memory allocations
+    reset : bool
+        If set (default), clear statistics before the block
+    '''
+    if reset:
+        _clear()
+    was_enabled, had_memory = _enabled, _memory
+    enable(memory=memory or had_memory)
+    try:
+        yield
+    finally:
+        disable()
+        if was_enabled:
+            enable(memory=had_memory)
+
+
+def reset():
+    '''Clear the recorded statistics'''
+    _clear()
+
+
+def stats():
+    '''Returns a copy of the recorded statistics
+
+    Returns
+    -------
+    stats : dict
+        [calls, time, bytes] for each timed function
+    '''
+    with _lock:
+        return {name: list(value) for name, value in _stats.items()}
+
+
+def report():
+    '''Returns recorded statistics as a pandas.DataFrame
+
+    Rows are sorted by cumulative time. Time is measured
+    in seconds, and includes the time spent in nested
+    timed functions.
+    '''
+    import pandas as pd
+    columns = ['calls', 'time', 'mean', 'bytes']
+    rows = {name: [calls, time, time/calls, nbytes]
+            for name, (calls, time, nbytes) in stats().items()}
+    df = pd.DataFrame.from_dict(rows, orient='index', columns=columns)
+    df = df.astype({'calls': int, 'bytes': int})
+    df.index.name = 'function'
+    return df.sort_values('time', ascending=False)
+
+
+def _clear():
+    with _lock:
+        _stats.clear()
+
+
+def _record(name, elapsed, allocated):
+    with _lock:
+        entry = _stats.get(name)
+        if entry is None:
+            _stats[name] = [1, elapsed, allocated]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] = max(entry[2], allocated)
+
+
+def _stack():
+    '''Memory at the start of each active timer in this thread'''
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _enter_memory():
+    current, peak = tracemalloc.get_traced_memory()
+    stack = _stack()
+    if stack:
+        # preserve the enclosing timer's peak before resetting
+        stack[-1][1] = max(stack[-1][1], peak)
+    tracemalloc.reset_peak()
+    stack.append([current, current])
+
+
+def _exit_memory():
+    _, peak = tracemalloc.get_traced_memory()
+    stack = _stack()
+    if not stack:
+        return 0
+    start, previous = stack.pop()
+    peak = max(peak, previous)
+    if stack:
+        stack[-1][1] = max(stack[-1][1], peak)
+    return max(peak - start, 0)
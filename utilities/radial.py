@@ -0,0 +1,181 @@
+'''Azimuthal statistics and radial profiles of images.'''
+
+import numpy as np
+from functools import lru_cache
+
+
+def aziavg(data, center=None, rad=None, linear=False, deinterlace=0):
+    '''
+    Azimuthal average and standard deviation of an image
+    about a center.
+
+    Pixels are grouped into bins of unit width in radius, so that
+    the pixel at radius r = R + dR from the center falls into bin R.
+    With linear binning, the pixel instead contributes to bin R with
+    weight 1-dR and to bin R+1 with weight dR.
+
+    Args:
+        data: [ny, nx] real-valued image
+    Keywords:
+        center: (x_p, y_p) coordinates of the center [pixels].
+            Default: geometric center of the image
+        rad: maximum radius [pixels]. Default: include all pixels
+        linear: if True, use linear binning. Default: False
+        deinterlace: if set to an even (odd) number, use only
+            even (odd) numbered rows. Default: 0 (use all rows)
+    Returns:
+        avg: azimuthal average in each bin
+        std: standard deviation about avg in each bin
+    '''
+    d, ndx, weight, norm = _prepare(data, center, rad, linear, deinterlace)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg = np.bincount(ndx, _weighted(d, weight), norm.size) / norm
+        dev = _weighted((d - avg[ndx])**2, weight)
+        std = np.sqrt(np.bincount(ndx, dev, norm.size) / norm)
+    return _truncate(avg, rad), _truncate(std, rad)
+
+
+def azistd(data, **kwargs):
+    '''
+    Azimuthal standard deviation of an image about a center.
+
+    Args and keywords are the same as for aziavg.
+
+    Returns:
+        std: standard deviation about the azimuthal average
+    '''
+    return aziavg(data, **kwargs)[1]
+
+
+def azimedian(data, center=None, rad=None, linear=False, deinterlace=0):
+    '''
+    Azimuthal median of an image about a center.
+
+    Pixels are binned as in aziavg. With linear binning, the
+    result is the weighted median of the values in each bin.
+
+    Args and keywords are the same as for aziavg.
+
+    Returns:
+        med: azimuthal median in each bin
+    '''
+    d, ndx, weight, norm = _prepare(data, center, rad, linear, deinterlace)
+    # sort values within bins, and bins by radius
+    order = np.lexsort((d, ndx))
+    values = d[order]
+    counts = np.bincount(ndx, minlength=norm.size)
+    first = np.cumsum(counts) - counts
+    if weight is None:
+        lo = first + (counts - 1)//2
+        hi = first + counts//2
+    else:
+        # first value whose cumulative weight reaches half
+        # of the total weight in its bin
+        cw = np.cumsum(weight[order])
+        lo = np.searchsorted(cw, np.cumsum(norm) - 0.5*norm)
+        hi = lo = np.clip(lo, first, first + counts - 1)
+    lo = np.clip(lo, 0, d.size - 1)
+    hi = np.clip(hi, 0, d.size - 1)
+    med = 0.5 * (values[lo] + values[hi])
+    med[norm == 0] = np.nan
+    return _truncate(med, rad)
+
+
+def _prepare(data, center, rad, linear, deinterlace):
+    '''Selected pixel values and cached bins'''
+    data = np.asarray(data, dtype=float)
+    if data.ndim != 2:
+        raise TypeError('data must be a two-dimensional array')
+    ny, nx = data.shape
+    if center is None:
+        center = (0.5 * (nx - 1), 0.5 * (ny - 1))
+    center = (float(center[0]), float(center[1]))
+    if rad is not None:
+        rad = int(rad)
+    n0 = deinterlace % 2 if deinterlace else None
+    pixels, ndx, weight, norm = _bins(data.shape, center, rad,
+                                      bool(linear), n0)
+    d = data.ravel()
+    if pixels is not None:
+        d = d[pixels]
+    if weight is not None:
+        d = np.concatenate((d, d))
+    return d, ndx, weight, norm
+
+
+@lru_cache(maxsize=32)
+def _bins(shape, center, rad, linear, n0):
+    '''
+    Bin index and weight of each selected pixel
+
+    Returns:
+        pixels: indexes of the selected pixels in the flattened
+            image, or None if all pixels are selected
+        ndx: bin index of each pixel. With linear binning,
+            indexes into the lower bins are followed by
+            indexes into the upper bins.
+        weight: weight of each entry in ndx, or None for
+            unit weights
+        norm: total weight in each bin
+    '''
+    ny, nx = shape
+    x_p, y_p = center
+    y, x = np.ogrid[0:ny, 0:nx]
+    r = np.hypot(x - x_p, y - y_p)
+    pixels = np.arange(ny * nx).reshape(shape)
+    if n0 is not None:
+        r = r[n0::2, :]
+        pixels = pixels[n0::2, :]
+    r = r.ravel()
+    pixels = pixels.ravel()
+    ndx = r.astype(int)
+    if rad is not None:
+        select = ndx <= rad
+        r, ndx, pixels = r[select], ndx[select], pixels[select]
+    if pixels.size == ny * nx:
+        pixels = None
+    if linear:
+        frac = r - ndx
+        ndx = np.concatenate((ndx, ndx + 1))
+        weight = np.concatenate((1. - frac, frac))
+    else:
+        weight = None
+    norm = np.bincount(ndx, weight, minlength=0 if rad is None else rad+1)
+    for a in (pixels, ndx, weight, norm):
+        if a is not None:
+            a.flags.writeable = False
+    return pixels, ndx, weight, norm
+
+
+def _weighted(d, weight):
+    return d if weight is None else d * weight
+
+
+def _truncate(result, rad):
+    return result if rad is None else result[:rad+1]
+
+
+def fringe_extent(profiles, nfringes=20, maxrange=400.):
+    '''
+    Radius at which normalized radial profiles cross 1
+    for the nfringes-th time.
+
+    Args:
+        profiles: [npts] radial profile of a normalized hologram
+            in unit steps of radius, or [nprofiles, npts] stack of
+            profiles. Crossings next to nan values are not counted.
+    Keywords:
+        nfringes: number of crossings to count
+        maxrange: value returned for profiles with too few crossings
+    Returns:
+        extent: radius of the crossing [pixels] for each profile
+    '''
+    profiles = np.asarray(profiles, dtype=float)
+    b = np.atleast_2d(profiles) - 1.
+    valid = np.isfinite(b)
+    crossing = np.diff(np.sign(b), axis=1) != 0
+    crossing &= valid[:, :-1] & valid[:, 1:]
+    count = np.cumsum(crossing, axis=1)
+    extent = np.argmax(count > nfringes, axis=1) + 1.
+    extent[count[:, -1] <= nfringes] = maxrange
+    return extent if profiles.ndim > 1 else extent[0]